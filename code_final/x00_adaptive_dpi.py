@@ -0,0 +1,116 @@
+"""
+Adaptive Auflösung für die Bild-Annotation.
+
+Alle Seiten werden zuerst mit niedriger DPI annotiert. Nur Seiten, bei denen
+das Modell unsicher ist (99 in einem Feld oder fehlende Werte in kritischen
+Feldern wie 'warning' oder 'prod_alc'), werden mit hoher DPI neu gerendert
+und erneut annotiert. Kleingedrucktes wie Warnhinweise bleibt so lesbar, ohne
+dass jede Seite die Bildkosten der hohen Auflösung verursacht.
+
+Die Bildkosten werden über die Pixelzahl geschätzt (proportional zu DPI²).
+"""
+import pandas as pd
+
+UNCERTAIN_VALUE = 99
+# Felder, bei denen ein fehlender Wert ebenfalls eine Neuauswertung auslöst
+UNCERTAIN_FIELDS = ('warning', 'prod_alc')
+
+
+def needs_escalation(result, fields=UNCERTAIN_FIELDS):
+    """
+    Prüft, ob ein Ergebnis mit höherer Auflösung wiederholt werden soll.
+
+    Fehlerergebnisse werden nicht eskaliert (sie sind kein Auflösungsproblem).
+    """
+    if not isinstance(result, dict) or result.get("error"):
+        return False
+    if any(_is_uncertain(value) for value in result.values()):
+        return True
+    return any(result.get(field) is None for field in fields)
+
+
+def _is_uncertain(value):
+    try:
+        return float(value) == UNCERTAIN_VALUE
+    except (TypeError, ValueError):
+        return False
+
+
+def relative_image_cost(n_pages, n_escalated, low_dpi, high_dpi):
+    """Bildkosten des adaptiven Laufs relativ zu 'alle Seiten mit hoher DPI'."""
+    if n_pages == 0:
+        return 0.0
+    ratio = (low_dpi / high_dpi) ** 2
+    return (n_pages * ratio + n_escalated) / n_pages
+
+
+def annotate_adaptive(jobs, annotate_fn, low_dpi, high_dpi, fields=UNCERTAIN_FIELDS):
+    """
+    Annotiert alle Jobs mit low_dpi und eskaliert unsichere Seiten auf high_dpi.
+
+    Args:
+        jobs (list): AnnotationJob-Einträge.
+        annotate_fn (callable): annotate_fn(jobs, dpi) -> {key: result}.
+        low_dpi (int): Auflösung des ersten Durchgangs.
+        high_dpi (int): Auflösung für unsichere Seiten.
+        fields (tuple): Felder, deren Fehlen eine Eskalation auslöst.
+
+    Returns:
+        tuple: (finale Ergebnisse, Ergebnisse des ersten Durchgangs,
+                {key: verwendete DPI}).
+    """
+    jobs = list(jobs)
+    low_results = annotate_fn(jobs, low_dpi)
+    escalated = [job for job in jobs if needs_escalation(low_results.get(job.key), fields)]
+    print(f"-> Adaptive DPI: {len(escalated)} von {len(jobs)} Seiten werden mit {high_dpi} DPI wiederholt.")
+
+    results = dict(low_results)
+    dpi_used = {job.key: low_dpi for job in jobs}
+    if escalated:
+        high_results = annotate_fn(escalated, high_dpi)
+        for key, result in high_results.items():
+            # Scheitert der zweite Versuch, bleibt das Ergebnis mit niedriger DPI stehen
+            if not result.get("error"):
+                results[key] = result
+                dpi_used[key] = high_dpi
+    return results, low_results, dpi_used
+
+
+def _accuracy(results, df, field, keys):
+    # Nur annotierte Jobs bewerten: übersprungene Seiten hätten keine Vorhersage und zählten als Fehler
+    gold = df.loc[df.index.isin(list(keys)), f"{field}_gold"]
+    valid = gold.notna() & ~gold.isin([98, 99])
+    pred = pd.Series({index: (results.get(index) or {}).get(field) for index in gold.index[valid]}, dtype='object')
+    if pred.empty:
+        return float('nan')
+    pred = pd.to_numeric(pred, errors='coerce')
+    return float((pred == gold[valid].astype(float)).mean())
+
+
+def adaptive_tradeoff_report(df, low_results, results, dpi_used, low_dpi, high_dpi, fields):
+    """
+    Vergleicht Kosten und Genauigkeit von 'nur niedrige DPI' und 'adaptiv'
+    gegen die Goldstandard-Spalten ('<feld>_gold') in df.
+
+    Die Ergebnisse müssen über den Index von df verschlüsselt sein. Bewertet
+    werden nur die Seiten in dpi_used (die annotierten Jobs), nicht beim
+    Fortsetzen übersprungene oder nie eingeplante Zeilen.
+
+    Returns:
+        pd.DataFrame: Eine Zeile pro Variante mit relativen Bildkosten
+            (1.0 = alle Seiten mit hoher DPI) und der Trefferquote je Feld.
+    """
+    fields = [field for field in fields if f"{field}_gold" in df.columns]
+    n_pages = len(dpi_used)
+    n_escalated = sum(1 for dpi in dpi_used.values() if dpi == high_dpi)
+    rows = []
+    for variant, variant_results, cost in [
+        (f'{low_dpi} DPI', low_results, relative_image_cost(n_pages, 0, low_dpi, high_dpi)),
+        (f'adaptiv {low_dpi}->{high_dpi} DPI', results, relative_image_cost(n_pages, n_escalated, low_dpi, high_dpi)),
+    ]:
+        row = {'variante': variant, 'seiten': n_pages, 'hohe_dpi': n_escalated if variant_results is results else 0,
+               'relative_bildkosten': round(cost, 3)}
+        for field in fields:
+            row[f'acc_{field}'] = round(_accuracy(variant_results, df, field, dpi_used), 4)
+        rows.append(row)
+    return pd.DataFrame(rows)
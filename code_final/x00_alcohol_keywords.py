@@ -0,0 +1,248 @@
+"""
+Deterministischer, mehrsprachiger Alkohol-Stichwortfilter vor dem LLM-Textfilter.
+
+Jede Seite wird anhand eines kompilierten Regex-Lexikons (DE/FR/PL/CZ/EST/EN)
+in eine von drei Klassen eingeteilt:
+
+    'positive'  eindeutiges Alkohol-Stichwort gefunden -> Flag 1 ohne LLM
+    'negative'  kein Stichwort und kein Zweifelsfall   -> Flag 0 ohne LLM
+    'ambiguous' Zweifelsfall (z.B. "alkoholfrei", "Kindersekt", "Punsch")
+                -> Entscheidung durch das LLM
+
+Deutsche Komposita werden über das Wortende erkannt ("Rotwein", "Weißbier"),
+damit Wörter wie "Weintrauben" oder "Bierschinken" nicht anschlagen; "Schwein"
+und "Weizen-Toast" sind ausdrücklich ausgenommen. Lebensmittel mit
+Alkohol-Stichwort ("Cognac-Sauce", "Rum-Rosinen Eis", "Bier-Senf") sind
+Zweifelsfälle. Eine Seite ohne Stichwort gilt nur dann als 'negative', wenn
+auch kein Getränkehinweis vorkommt ("% vol", Volumenangabe wie "0,5 l",
+"1,5 l" oder "70 cl", Kasten/Kiste): 'negative' überspringt das LLM, jeder
+Fehler dort ist eine stillschweigend verlorene Alkoholseite.
+"""
+import re
+
+import pandas as pd
+
+# Komposita auf "-wein" ohne "Schwein", "Weizen" ohne Backwaren ("Weizen-Toast", "Weizenmehl" scheitert am Wortende)
+WINE_TERM = r'\w*(?<!sch)wein(?:e|es|s)?'
+WHEAT_BEER_TERM = (r'\w*(?<!buch)(?<!hart)weizen(?:bier)?'
+                   r'(?![-\s]*(?:toast|mehl|brot|brötchen|wraps?|tortillas?|kleie|grieß))')
+# Rebsorten und Weinbezeichnungen, die ohne das Wort "Wein" beworben werden
+GRAPE_TERMS = [r'riesling', r'merlot', r'chardonnay', r'sauvignon', r'cabernet', r'pinot', r'primitivo',
+               r'lambrusco', r'chianti', r'rioja', r'tempranillo', r'montepulciano', r'sangiovese', r'shiraz',
+               r'malbec', r'zinfandel', r'dornfelder', r'grauburgunder', r'spätburgunder', r'weißburgunder',
+               r'müller-thurgau', r'silvaner', r'trollinger', r'bardolino', r'valpolicella', r'lugana']
+
+# Eindeutige Stichwörter als Regex-Fragmente, nach Sprache gruppiert
+STRONG_TERMS = {
+    'de': [r'\w*bier(?:e|es|s)?', WINE_TERM, r'\w*sekt(?:e|es|s)?', r'spirituosen?',
+           r'likör(?:e)?', r'\w*schnaps', r'weinbrand', r'glühwein', r'pils(?:ener|ner)?', WHEAT_BEER_TERM,
+           r'obstbrand', r'korn(?:brand)', r'doppelkorn', r'kräuterlikör', r'eierlikör', r'wodka', r'champagner',
+           r'wermut', r'\w*bowle', r'federweißer?'],
+    'fr': [r'bières?', r'vins?', r'champagnes?', r'crémants?', r'cidres?', r'apéritifs?', r'pastis',
+           r'rhums?', r'liqueurs?', r'spiritueux', r'bordeaux', r'calvados', r'cognac'],
+    'pl': [r'piw(?:o|a|em)?', r'win(?:o|a|em)', r'wódk(?:a|i|ę)', r'nalewk(?:a|i)', r'szampan',
+           r'whisky'],
+    'cz': [r'piv(?:o|a|em)', r'ležák', r'víno', r'vína', r'vodk(?:a|y)', r'rum', r'slivovice',
+           r'becherovka', r'lihovin(?:a|y)'],
+    'est': [r'õlu(?:t)?', r'õlle', r'vein(?:i|e)?', r'viin(?:a)?', r'siider', r'likööri?', r'kange alkohol'],
+    'en': [r'beers?', r'wines?', r'spirits', r'ciders?', r'vodka', r'whiske?y', r'gin', r'prosecco',
+           r'tequila', r'aperol', r'martini', r'cava', r'jägermeister', r'brandy', r'grappa', r'ouzo',
+           r'sherry', r'vermouth', r'sangria', r'\w*spritz', r'limoncello', r'amaretto', r'sambuca',
+           r'baileys', r'absinth?e?', r'caipirinha', r'mojito', r'glögg', r'sake'] + GRAPE_TERMS,
+    # Angaben zum Alkoholgehalt, sprachübergreifend
+    'vol': [r'\d+(?:[.,]\d+)?\s?%\s?vol\.?', r'vol\.?\s?%', r'alc\.?\s?\d+(?:[.,]\d+)?\s?%'],
+}
+
+# Zweifelsfälle: alkoholfreie Varianten und Wörter mit mehreren Bedeutungen
+AMBIGUOUS_TERMS = [
+    r'alkoholfrei\w*', r'0[.,]0\s?%', r'kinder(?:sekt|punsch)', r'\w*punsch', r'malzbier', r'traubensaft',
+    r'sans alcool', r'bezalkoholow\w*', r'nealko\w*', r'alkoholivaba', r'non-?alcoholic',
+    r'alcohol[- ]free', r'mousseux', r'rosé', r'radler', r'cocktail\w*', r'korn', r'alkohol', r'alcool',
+    r'mixgetränk\w*',
+]
+
+
+def _compile(fragments):
+    # Längere Fragmente zuerst, damit z.B. "weinbrand" vor "wein" versucht wird
+    ordered = sorted(set(fragments), key=len, reverse=True)
+    return re.compile(r'(?<!\w)(?:' + '|'.join(ordered) + r')(?!\w)', re.IGNORECASE)
+
+
+STRONG_FRAGMENTS = [term for terms in STRONG_TERMS.values() for term in terms]
+STRONG_PATTERN = _compile(STRONG_FRAGMENTS)
+AMBIGUOUS_PATTERN = _compile(AMBIGUOUS_TERMS)
+
+# Lebensmittel mit Alkohol-Stichwort ("Bordeaux-Sauce", "Bier-Senf", "Schinken Gin"): Zweifelsfall statt Flag
+FOOD_TERMS = [r'sauce', r'soße', r'senf', r'rosinen', r'eis', r'essig', r'kuchen', r'torte', r'pralinen?',
+              r'trüffel', r'kugeln', r'marinade', r'gebäck', r'teig', r'braten', r'gulasch', r'sauerkraut']
+FOOD_PREFIX_TERMS = [r'schinken', r'wurst', r'salami', r'käse']
+_STRONG_ALTERNATION = '|'.join(sorted(set(STRONG_FRAGMENTS), key=len, reverse=True))
+FOOD_COMPOUND_PATTERN = re.compile(
+    r'(?<!\w)(?:(?:' + _STRONG_ALTERNATION + r')[-\s]?(?:' + '|'.join(FOOD_TERMS) + r')'
+    r'|(?:' + '|'.join(FOOD_PREFIX_TERMS) + r')[-\s](?:' + _STRONG_ALTERNATION + r'))(?!\w)', re.IGNORECASE)
+
+# Hinweise auf ein Getränk ohne Stichwort ("Smirnoff 0,7 l", "6 x 0,5 l", "Kasten"): kein Flag,
+# aber kein sicheres 'negative'
+DRINK_HINT_TERMS = [r'(?<![\d.,])\d+(?:[.,]\d+)?\s?-?(?:l|ltr|liter|cl|ml)\.?', r'%\s?vol\.?',
+                    r'(?<!\w)(?:kasten|kiste|träger)\w*']
+DRINK_HINT_PATTERN = re.compile(r'(?:' + '|'.join(DRINK_HINT_TERMS) + r')(?!\w)', re.IGNORECASE)
+
+
+def strip_food_compounds(text):
+    """Entfernt Lebensmittel mit Alkohol-Stichwort, damit sie kein eindeutiger Treffer sind."""
+    return FOOD_COMPOUND_PATTERN.sub(' ', text)
+
+# Produktkategorien wie im Codebuch ('product'): 1 Bier, 2 Wein/Sekt, 3 Spirituosen, 4 Sonstiges
+PRODUCT_CATEGORY_TERMS = {
+    1: [r'\w*bier(?:e|es|s)?', r'pils(?:ener|ner)?', WHEAT_BEER_TERM, r'bières?', r'piw(?:o|a|em)?',
+        r'piv(?:o|a|em)', r'ležák', r'õlu(?:t)?', r'õlle', r'beers?'],
+    2: [WINE_TERM, r'\w*sekt(?:e|es|s)?', r'glühwein', r'vins?', r'champagnes?', r'champagner', r'crémants?',
+        r'bordeaux', r'win(?:o|a|em)', r'szampan', r'víno', r'vína', r'vein(?:i|e)?', r'wines?', r'prosecco',
+        r'cava', r'sherry', r'wermut', r'vermouth', r'sangria', r'\w*bowle', r'federweißer?', r'glögg'] + GRAPE_TERMS,
+    3: [r'spirituosen?', r'wodka', r'brandy', r'grappa', r'ouzo', r'limoncello', r'amaretto', r'sambuca',
+        r'baileys', r'absinth?e?', r'caipirinha', r'mojito', r'likör(?:e)?', r'\w*schnaps', r'weinbrand', r'obstbrand', r'korn(?:brand)', r'doppelkorn',
+        r'kräuterlikör', r'eierlikör', r'apéritifs?', r'pastis', r'rhums?', r'liqueurs?', r'spiritueux',
+        r'calvados', r'cognac', r'wódk(?:a|i|ę)', r'nalewk(?:a|i)', r'whisky', r'vodk(?:a|y)', r'rum',
+        r'slivovice', r'becherovka', r'lihovin(?:a|y)', r'viin(?:a)?', r'likööri?', r'kange alkohol',
+        r'spirits', r'whiske?y', r'gin', r'tequila', r'aperol', r'martini', r'jägermeister'],
+    4: [r'cidres?', r'siider', r'ciders?', r'\w*spritz', r'sake'],
+}
+PRODUCT_CATEGORY_PATTERNS = {category: _compile(terms) for category, terms in PRODUCT_CATEGORY_TERMS.items()}
+MIXED_PRODUCT_CATEGORY = 4
+
+# Gesetzliche Warnhinweise und Jugendschutz-Hinweise zu Alkohol
+WARNING_TERMS = [
+    r"l'abus d'alcool", r'consommer avec modération', r'drink responsibly', r'kein verkauf an (?:personen|jugendliche)\w*',
+    r'abgabe (?:nur )?ab 18', r'nicht an (?:personen )?unter 1[68]', r'alkohol (?:kann|schadet)\w*',
+    r'nadużywanie alkoholu', r'alkohol szkodzi', r'zákaz prodeje alkoholu', r'alkohol võib kahjustada',
+    r'ab 1[68] jahren',
+]
+WARNING_PATTERN = _compile(WARNING_TERMS)
+
+
+def classify_text(text):
+    """
+    Ordnet einen Seitentext 'positive', 'negative' oder 'ambiguous' zu.
+
+    Zweifelsfälle haben Vorrang: "alkoholfreies Bier" geht an das LLM.
+    Stichwörter in Lebensmitteln ("Cognac-Sauce") zählen nicht als eindeutig;
+    sie und Getränkehinweise ("0,5 l", "% vol") ergeben ohne weiteres
+    Stichwort ebenfalls einen Zweifelsfall.
+    """
+    if not isinstance(text, str) or not text.strip():
+        return 'negative'
+    if AMBIGUOUS_PATTERN.search(text):
+        return 'ambiguous'
+    if STRONG_PATTERN.search(strip_food_compounds(text)):
+        return 'positive'
+    if FOOD_COMPOUND_PATTERN.search(text) or DRINK_HINT_PATTERN.search(text):
+        return 'ambiguous'
+    return 'negative'
+
+
+def product_category(text):
+    """Produktkategorie nach Codebuch: 0 kein Alkohol, 1-3 eine Kategorie, 4 mehrere oder Sonstiges."""
+    if not isinstance(text, str):
+        return 0
+    text = strip_food_compounds(text)
+    categories = {category for category, pattern in PRODUCT_CATEGORY_PATTERNS.items() if pattern.search(text)}
+    if not categories:
+        return 0
+    if len(categories) == 1:
+        return categories.pop()
+    return MIXED_PRODUCT_CATEGORY
+
+
+def has_alcohol_warning(text):
+    """Prüft, ob ein Alkohol-Warnhinweis im Text steht."""
+    return isinstance(text, str) and WARNING_PATTERN.search(text) is not None
+
+
+def matched_terms(text):
+    """Alle eindeutigen und zweifelhaften Treffer eines Textes (zum Nachvollziehen)."""
+    if not isinstance(text, str):
+        return [], []
+    strong = [m.group(0) for m in STRONG_PATTERN.finditer(text)]
+    ambiguous = [m.group(0) for m in AMBIGUOUS_PATTERN.finditer(text)]
+    return strong, ambiguous
+
+
+def classify_texts(texts):
+    """Wendet classify_text() auf eine Series an und gibt die Klassen als Series zurück."""
+    return pd.Series([classify_text(text) for text in texts], index=getattr(texts, 'index', None))
+
+
+def evaluate_prefilter(decisions, gold):
+    """
+    Misst, wie gut der Vorfilter gegen den Goldstandard (z.B. 'alc_gold') abschneidet.
+
+    Args:
+        decisions (pd.Series): Klassen aus classify_texts().
+        gold (pd.Series): Goldstandard (1 = Alkohol, 0 = kein Alkohol; 98/99/NaN werden ignoriert).
+
+    Returns:
+        dict: recall (Anteil der Alkoholseiten, die NICHT als 'negative'
+            verworfen wurden), positive_precision (Anteil echter Alkoholseiten
+            unter den 'positive'-Entscheidungen), Anzahl ausgewerteter Seiten
+            und Anteil eingesparter LLM-Aufrufe.
+    """
+    valid = gold.isin([0, 1])
+    decisions, gold = decisions[valid], gold[valid].astype(int)
+    positives = gold == 1
+    decided_positive = decisions == 'positive'
+
+    recall = (decisions[positives] != 'negative').mean() if positives.any() else float('nan')
+    precision = gold[decided_positive].mean() if decided_positive.any() else float('nan')
+    return {
+        'pages': int(valid.sum()),
+        'recall': float(recall),
+        'positive_precision': float(precision),
+        'missed_alcohol_pages': int((decisions[positives] == 'negative').sum()),
+        'llm_calls_saved_share': float((decisions != 'ambiguous').mean()) if len(decisions) else 0.0,
+    }
+
+
+# Tabelle zur Selbstprüfung des Lexikons: (Text, erwartete Klasse)
+CLASSIFY_CASES = [
+    ("Smirnoff Wodka 0,7l 9,99 €", 'positive'),
+    ("Moët Champagner Brut", 'positive'),
+    ("Asbach Brandy 36% vol", 'positive'),
+    ("Spirituose aus Deutschland", 'positive'),
+    ("Primitivo di Manduria", 'positive'),
+    ("Lambrusco rosso, lieblich", 'positive'),
+    ("Franziskaner Weizen", 'positive'),
+    ("Rotwein aus Italien", 'positive'),
+    ("Hackfleisch Rind & Schwein 500 g", 'negative'),
+    ("Golden Toast Weizen-Toast 500 g", 'negative'),
+    ("Weintrauben hell, kernlos", 'negative'),
+    ("Bierschinken 100 g", 'negative'),
+    ("Coca-Cola Dose", 'negative'),
+    ("Smirnoff 0,7 l 9,99 €", 'ambiguous'),
+    ("Bacardi Carta Blanca 37,5 % Vol.", 'positive'),
+    ("Bacardi Carta Blanca 0,7-l-Flasche", 'ambiguous'),
+    ("Alkoholfreies Bier", 'ambiguous'),
+    ("Hefeweizen 0,5 l", 'positive'),
+    ("Sangria 1,5 l", 'positive'),
+    ("Hugo Spritz", 'positive'),
+    ("Eierpunsch", 'ambiguous'),
+    ("Bordeaux-Sauce zum Steak", 'ambiguous'),
+    ("Cognac-Sauce 250 ml", 'ambiguous'),
+    ("Rum-Rosinen Eis", 'ambiguous'),
+    ("Bier-Senf", 'ambiguous'),
+    ("Schinken Gin", 'ambiguous'),
+    ("Bier-Senf und Rotwein 0,75 l", 'positive'),
+    ("Buchweizen, Hartweizen-Nudeln", 'negative'),
+    ("Mineralwasser 6 x 1,5 l", 'ambiguous'),
+    ("Energy Drink 0,25 l", 'ambiguous'),
+    ("Eistee 6x0,5l", 'ambiguous'),
+    ("Kasten Erdinger", 'ambiguous'),
+]
+
+
+if __name__ == '__main__':
+    failures = [(text, expected, classify_text(text)) for text, expected in CLASSIFY_CASES
+                if classify_text(text) != expected]
+    for text, expected, got in failures:
+        print(f"FEHLER: {text!r}: erwartet {expected}, erhalten {got}")
+    print(f"{len(CLASSIFY_CASES) - len(failures)} von {len(CLASSIFY_CASES)} Fällen korrekt.")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,428 @@
+"""
+Einheitliche Schnittstelle für die Annotations-Engines.
+
+x04/x04.2 (Ollama-HTTP), x05 (Ollama) und x06 (Gemini) führen alle dieselbe
+Kette aus: Seite rendern -> Modell aufrufen -> JSON bereinigen -> Ergebnis
+speichern. Ein AnnotationBackend bündelt diese Kette; die Skripte rufen nur
+noch backend.run(jobs, on_result) auf. Gemeinsam für alle Engines sind
+
+    - Antwort-Cache (x00_llm_cache): Treffer werden vor dem Engine-Aufruf
+      beantwortet, erfolgreiche Antworten danach gespeichert,
+    - Batching (run(..., batch_size=n)),
+    - Zeitmessung je Schritt (StageTimings: render, encode, request, parse,
+      persist = Dauer des on_result-Callbacks).
+
+Die Nebenläufigkeit liefern die vorhandenen Runner: OllamaHTTPBackend nutzt
+den asynchronen Runner (x00_ollama_async), die übrigen Engines den
+Thread-Runner mit Rate-Limits und Backoff (x00_gemini_runner).
+
+    backend = OllamaHTTPBackend(MODEL, options={'temperature': 0}, render_options={'dpi': 96})
+    results, stats = backend.run(jobs, on_result=store_result)
+    print(stats.summary())
+
+    # Andere Auflösung (adaptive DPI, Kacheln) als Kopie mit geänderten Render-Optionen
+    backend.with_render_options(dpi=200).run(jobs)
+"""
+import copy
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from x00_gemini_runner import (GeminiRunner, RetryableError, clean_json_response, estimate_tokens,
+                               make_rest_send_fn, make_sdk_send_fn)
+from x00_llm_cache import get_response_cache, response_cache_key
+from x00_mock_model_server import DEFAULT_ANNOTATION
+from x00_ollama_async import OLLAMA_ENDPOINT, annotate_jobs
+from x00_render_cache import render_key, render_page_jpeg
+
+DEFAULT_RENDER_OPTIONS = {'dpi': 96, 'grayscale': True, 'quality': 80}
+
+
+class StageTimings:
+    """Summiert die Dauer je Verarbeitungsschritt (threadsicher)."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    @contextmanager
+    def measure(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def snapshot(self):
+        """Kopie des aktuellen Stands, z.B. für since()."""
+        snapshot = StageTimings()
+        with self._lock:
+            snapshot.seconds, snapshot.counts = dict(self.seconds), dict(self.counts)
+        return snapshot
+
+    def since(self, snapshot):
+        """Nur die seit snapshot() hinzugekommenen Zeiten (z.B. eines einzelnen Laufs)."""
+        delta = StageTimings()
+        with self._lock:
+            for stage, seconds in self.seconds.items():
+                count = self.counts[stage] - snapshot.counts.get(stage, 0)
+                if count > 0:
+                    delta.seconds[stage] = seconds - snapshot.seconds.get(stage, 0.0)
+                    delta.counts[stage] = count
+        return delta
+
+    def as_dict(self):
+        """{schritt: {'seconds', 'count', 'mean'}}."""
+        with self._lock:
+            return {stage: {'seconds': seconds, 'count': self.counts[stage],
+                            'mean': seconds / self.counts[stage]}
+                    for stage, seconds in self.seconds.items()}
+
+    def summary(self):
+        return ", ".join(f"{stage} {entry['seconds']:.1f}s ({entry['mean'] * 1000:.0f} ms/Aufruf)"
+                         for stage, entry in self.as_dict().items())
+
+
+class BackendStats:
+    """
+    Zähler eines Backend-Laufs; engine_stats enthält die Statistik der Runner je Batch.
+
+    timings enthält nur die Zeiten dieses Laufs, auch wenn die Zeitmessung des
+    Backends über mehrere Läufe geteilt wird.
+    """
+
+    def __init__(self, backend_name, timings):
+        self.backend = backend_name
+        self.pages = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.engine_stats = []
+        self.timings = timings
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        text = (f"[{self.backend}] {self.pages} Seiten in {self.elapsed:.1f}s "
+                f"({self.pages_per_sec:.2f} Seiten/s, {self.errors} Fehler, {self.cache_hits} aus Cache)")
+        stages = self.timings.summary()
+        return f"{text}; {stages}" if stages else text
+
+
+class AnnotationBackend:
+    """
+    Basisklasse: Cache, Batching und Zeitmessung; die Unterklassen liefern _run().
+
+    Args:
+        model (str): Modellname (auch Teil des Cache-Schlüssels).
+        options (dict, optional): Generierungsoptionen (temperature, seed, ...).
+        render_options (dict, optional): dpi, grayscale, quality für render_page_jpeg.
+        max_concurrency (int): Gleichzeitige Anfragen.
+        use_cache (bool): Antwort-Cache verwenden.
+        cache (ResponseCache, optional): Zu verwendender Cache; None = geteilter Cache.
+        timings (StageTimings, optional): Gemeinsame Zeitmessung, z.B. über mehrere Läufe.
+    """
+
+    name = 'backend'
+
+    def __init__(self, model, options=None, render_options=None, max_concurrency=4, use_cache=True,
+                 cache=None, timings=None):
+        self.model = model
+        self.options = options
+        self.render_options = {**DEFAULT_RENDER_OPTIONS, **(render_options or {})}
+        self.max_concurrency = max_concurrency
+        self.use_cache = use_cache
+        self.cache = cache
+        self.timings = timings if timings is not None else StageTimings()
+
+    def with_render_options(self, **changes):
+        """Kopie des Backends mit geänderten Render-Optionen (gleiche Zeitmessung)."""
+        backend = copy.copy(self)
+        backend.render_options = {**self.render_options, **changes}
+        return backend
+
+    def without_cache(self):
+        """Kopie des Backends ohne Antwort-Cache (z.B. für Laufzeitvergleiche)."""
+        backend = copy.copy(self)
+        backend.use_cache = False
+        return backend
+
+    def cache_key(self, job):
+        """Modell, Prompt, Optionen und Render-Schlüssel des Seitenbildes."""
+        input_hash = None
+        if job.page_ref is not None:
+            options = self.render_options
+            input_hash = render_key(job.page_ref, options['dpi'], options['grayscale'], options['quality'], job.clip)
+        return response_cache_key(self.model, job.prompt, self.options, input_hash)
+
+    def render(self, job):
+        """JPEG-Bytes der Seite (bzw. des Ausschnitts) eines Jobs; None für reine Text-Jobs."""
+        if job.page_ref is None:
+            return None
+        with self.timings.measure('render'):
+            return render_page_jpeg(job.page_ref, clip=job.clip, **self.render_options)
+
+    def parse(self, text):
+        """Bereinigt und parst eine Modellantwort; Fehler als {"error": ...}."""
+        with self.timings.measure('parse'):
+            try:
+                return clean_json_response(text)
+            except json.JSONDecodeError as e:
+                return {"error": f"JSON decode failed: {e}"}
+
+    def _run(self, jobs, on_result):
+        """Führt die Jobs mit der Engine aus -> (Ergebnisse, Runner-Statistik)."""
+        raise NotImplementedError
+
+    def run(self, jobs, on_result=None, batch_size=None):
+        """
+        Annotiert alle Jobs.
+
+        Args:
+            jobs (iterable): AnnotationJob-Einträge.
+            on_result (callable, optional): on_result(key, result) für jedes Ergebnis.
+            batch_size (int, optional): Jobs pro Engine-Aufruf (None = alle auf einmal).
+
+        Returns:
+            tuple: ({key: result}, BackendStats). Fehler stehen als {"error": ...} im Ergebnis.
+        """
+        started_timings = self.timings.snapshot()
+        stats = BackendStats(self.name, self.timings)
+        cache = None
+        if self.use_cache:
+            cache = self.cache if self.cache is not None else get_response_cache()
+        results, cache_keys, pending = {}, {}, []
+
+        def finish(key, result, from_cache=False):
+            results[key] = result
+            stats.pages += 1
+            stats.cache_hits += from_cache
+            if result.get("error"):
+                stats.errors += 1
+            elif not from_cache and key in cache_keys:
+                cache.put(cache_keys[key], self.model, result)
+            if on_result is not None:
+                with self.timings.measure('persist'):
+                    on_result(key, result)
+
+        for job in jobs:
+            if cache is not None:
+                try:
+                    cache_keys[job.key] = self.cache_key(job)
+                except OSError as e:
+                    finish(job.key, {"error": f"Image rendering failed: {e}"})
+                    continue
+                cached = cache.get(cache_keys[job.key])
+                if cached is not None:
+                    finish(job.key, cached, from_cache=True)
+                    continue
+            pending.append(job)
+
+        size = batch_size or len(pending) or 1
+        for start in range(0, len(pending), size):
+            _, engine_stats = self._run(pending[start:start + size], finish)
+            stats.engine_stats.append(engine_stats)
+        stats.finished = time.perf_counter()
+        stats.timings = self.timings.since(started_timings)
+        return results, stats
+
+
+class OllamaHTTPBackend(AnnotationBackend):
+    """
+    Ollama über /api/generate mit dem asynchronen Runner (x00_ollama_async).
+
+    Args:
+        endpoint (str): URL von /api/generate.
+        timeout (int): Timeout pro Anfrage in Sekunden.
+        keep_alive (str|int, optional): keep_alive der Anfragen (x00_ollama_residency).
+    """
+
+    name = 'ollama-http'
+
+    def __init__(self, model, endpoint=OLLAMA_ENDPOINT, timeout=300, keep_alive=None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+
+    def _run(self, jobs, on_result):
+        # Den Cache übernimmt run(), der Runner fragt ihn nicht noch einmal ab
+        return annotate_jobs(jobs, self.model, endpoint=self.endpoint, max_in_flight=self.max_concurrency,
+                             options=self.options, timeout=self.timeout, render_options=self.render_options,
+                             on_result=on_result, use_cache=False, keep_alive=self.keep_alive,
+                             timings=self.timings)
+
+
+class _ThreadRunnerBackend(AnnotationBackend):
+    """Gemeinsame Ausführung über GeminiRunner: prepare_fn rendert, _send ruft das Modell auf."""
+
+    api_name = None
+
+    def __init__(self, model, max_retries=2, rpm=None, tpm=None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.max_retries = max_retries
+        self.rpm = rpm
+        self.tpm = tpm
+
+    def _prepare(self, job):
+        return job.prompt, self.render(job)
+
+    def _tokens(self, request):
+        return 0
+
+    def _send(self, request):
+        raise NotImplementedError
+
+    def _run(self, jobs, on_result):
+        runner = GeminiRunner(self._send, prepare_fn=self._prepare, token_fn=self._tokens,
+                              max_concurrency=self.max_concurrency, rpm=self.rpm, tpm=self.tpm,
+                              max_retries=self.max_retries, api_name=self.api_name, timings=self.timings,
+                              prepare_stage=None)
+        return runner.run(jobs, on_result=on_result)
+
+
+class OllamaClientBackend(_ThreadRunnerBackend):
+    """
+    Ollama über die Python-Bibliothek (ollama.Client.chat).
+
+    Args:
+        host (str, optional): Adresse des Servers (None = Standard des Clients).
+        client (ollama.Client, optional): Vorhandener Client.
+        keep_alive (str|int, optional): keep_alive der Anfragen.
+    """
+
+    name = 'ollama-client'
+    api_name = 'Ollama'
+
+    def __init__(self, model, host=None, client=None, keep_alive=None, **kwargs):
+        super().__init__(model, **kwargs)
+        if client is None:
+            import ollama  # nur für dieses Backend nötig
+            client = ollama.Client(host=host)
+        self.client = client
+        self.keep_alive = keep_alive
+
+    def _send(self, request):
+        prompt, image_bytes = request
+        message = {'role': 'user', 'content': prompt}
+        if image_bytes is not None:
+            message['images'] = [image_bytes]
+        response = self.client.chat(model=self.model, messages=[message], format='json',
+                                    options=self.options, keep_alive=self.keep_alive)
+        return self.parse(response['message']['content']), 0
+
+
+class GeminiBackend(_ThreadRunnerBackend):
+    """
+    Gemini über das google.generativeai-SDK oder die REST-API.
+
+    Args:
+        model (str): Modellname, z.B. "gemini-2.0-flash".
+        generative_model (genai.GenerativeModel, optional): SDK-Modell; ohne
+            dieses wird die REST-API unter base_url verwendet.
+        base_url (str, optional): REST-Basis-URL (z.B. x00_mock_model_server).
+        api_key (str, optional): API-Key für die REST-API.
+        rpm, tpm (int, optional): Quoten pro Minute.
+        max_retries (int): Wiederholungen pro Seite bei 429/5xx/Timeout.
+    """
+
+    name = 'gemini'
+    api_name = 'Gemini'
+
+    def __init__(self, model, generative_model=None, base_url=None, api_key=None, max_retries=5, **kwargs):
+        super().__init__(model, max_retries=max_retries, **kwargs)
+        options = self.options or {}
+        if generative_model is not None:
+            self.send_fn = make_sdk_send_fn(generative_model, options)
+            self.as_image = True
+        else:
+            self.send_fn = make_rest_send_fn(base_url, model, api_key, options)
+            self.as_image = False
+
+    def _prepare(self, job):
+        image_bytes = self.render(job)
+        if self.as_image:
+            from io import BytesIO
+            from PIL import Image
+            with self.timings.measure('encode'):
+                return job.prompt, Image.open(BytesIO(image_bytes))
+        return job.prompt, image_bytes
+
+    def _tokens(self, request):
+        return estimate_tokens(request[0])
+
+    def _send(self, request):
+        return self.send_fn(request)
+
+
+class FakeBackend(_ThreadRunnerBackend):
+    """
+    Lokaler Fake ohne Modell und ohne Netz, z.B. für Tests und Benchmarks der
+    Pipeline (Rendern, Speichern) ohne Modellkosten.
+
+    Args:
+        response (dict | callable, optional): Antwort oder response(request) -> dict.
+        latency (float): Simulierte Antwortzeit in Sekunden.
+        error_rate (float): Anteil der Anfragen mit vorübergehendem Fehler (wird wiederholt).
+        render_pages (bool): Seiten wirklich rendern (sonst nur den Prompt weitergeben).
+        seed (int, optional): Seed für die Fehlerauswahl.
+    """
+
+    name = 'fake'
+    api_name = 'Fake'
+
+    def __init__(self, model='fake', response=None, latency=0.0, error_rate=0.0, render_pages=True,
+                 seed=None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.response = response if response is not None else DEFAULT_ANNOTATION
+        self.latency = latency
+        self.error_rate = error_rate
+        self.render_pages = render_pages
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _prepare(self, job):
+        return job.prompt, self.render(job) if self.render_pages else None
+
+    def _send(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._rng_lock:
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            raise RetryableError("injected error")
+        response = self.response(request) if callable(self.response) else self.response
+        return self.parse(json.dumps(response)), 0
+
+
+BACKENDS = {
+    OllamaHTTPBackend.name: OllamaHTTPBackend,
+    OllamaClientBackend.name: OllamaClientBackend,
+    GeminiBackend.name: GeminiBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def make_backend(name, model, **kwargs):
+    """Erzeugt ein Backend über seinen Namen ('ollama-http', 'ollama-client', 'gemini', 'fake')."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unbekanntes Backend '{name}', erwartet: {', '.join(BACKENDS)}")
+    return backend_class(model, **kwargs)
@@ -0,0 +1,239 @@
+"""
+Bootstrap-Konfidenzintervalle und gepaarte Modellvergleiche für die Kennzahlen
+aus x00_evaluation.
+
+Statt sklearn pro Replikat aufzurufen, wird jede Auswertung als Matrix
+"Seite x (modell, variable, zelle)" kodiert: bei kategorialen Variablen eine
+One-Hot-Spalte pro Zelle der Konfusionsmatrix, bei metrischen Variablen die
+absoluten und quadrierten Fehler. Ein Block von B Replikaten ist dann eine
+einzige Matrixmultiplikation:
+
+    gewichte [B x seite] @ design [seite x ...] -> Konfusionsmatrizen bzw. Fehlersummen
+
+Die Gewichte entstehen aus einer Indexmatrix gezogener Seiten (Bootstrap) bzw.
+aus zufälligen Vertauschungen der beiden Modelle pro Seite (Permutationstest).
+Blöcke können in einem Prozess-Pool gerechnet werden; die Seeds der Blöcke
+hängen nur von seed ab, das Ergebnis also nicht von der Anzahl der Prozesse.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from x00_evaluation import (ANNOTATION_VARIABLES, GOLD_SUFFIX, METRIC_VARIABLES, MISSING_CODES, encode_labels,
+                            load_aligned, metrics_from_confusion)
+
+CATEGORICAL_METRICS = ['cohen_kappa', 'f1_macro', 'f1_weighted', 'accuracy']
+ERROR_METRICS = ['mae', 'rmse']
+# Kennzahlen, bei denen ein kleinerer Wert besser ist
+LOWER_IS_BETTER = {'mae', 'rmse'}
+
+
+def build_design(y_true, y_pred, valid, variables=ANNOTATION_VARIABLES, metric_variables=METRIC_VARIABLES):
+    """
+    Kodiert ausgerichtete Daten (siehe align_to_gold) als Design-Matrizen.
+
+    Returns:
+        dict: 'confusion' [seite x modell x variable*k*k] für kategoriale und
+            'errors' [seite x modell x 3*variable] (gültig, |fehler|, fehler²) für metrische Variablen.
+    """
+    n_models, n_pages, _ = y_pred.shape
+    categorical = [v for v, var in enumerate(variables) if var not in metric_variables]
+    metric = [v for v, var in enumerate(variables) if var in metric_variables]
+    design = {'n_pages': n_pages, 'n_models': n_models, 'n_variables': len(variables),
+              'categorical': categorical, 'metric': metric}
+
+    if categorical:
+        cat_valid = valid[:, :, categorical]
+        true_codes, pred_codes, n_labels = encode_labels(y_true[:, categorical], y_pred[:, :, categorical], cat_valid)
+        cell = true_codes[None] * n_labels + pred_codes
+        onehot = np.zeros((n_pages, n_models, len(categorical), n_labels * n_labels))
+        model_idx, page_idx, var_idx = np.nonzero(cat_valid)
+        onehot[page_idx, model_idx, var_idx, cell[model_idx, page_idx, var_idx]] = 1.0
+        design['confusion'] = onehot.reshape(n_pages, n_models, -1)
+        design['n_labels'] = n_labels
+
+    if metric:
+        met_valid = valid[:, :, metric]
+        diff = np.where(met_valid, y_pred[:, :, metric] - y_true[None, :, metric], 0.0)
+        errors = np.stack([met_valid.astype(float), np.abs(diff), diff ** 2], axis=2)  # modell x seite x 3 x variable
+        design['errors'] = errors.transpose(1, 0, 2, 3).reshape(n_pages, n_models, -1)
+    return design
+
+
+def _weighted_sums(matrix, weights, swaps=None):
+    """
+    weights [B x seite] @ matrix [seite x modell x spalten] -> [B x modell x spalten].
+
+    Mit swaps [B x seite] (nur zwei Modelle) werden auf den markierten Seiten die
+    Vorhersagen beider Modelle vertauscht.
+    """
+    n_pages, n_models, n_cols = matrix.shape
+    flat = matrix.reshape(n_pages, n_models * n_cols)
+    if swaps is None:
+        return (weights @ flat).reshape(-1, n_models, n_cols)
+    kept = ((weights * ~swaps) @ flat).reshape(-1, n_models, n_cols)
+    swapped = ((weights * swaps) @ flat).reshape(-1, n_models, n_cols)
+    return kept + swapped[:, ::-1]
+
+
+def replicate_metrics(design, weights, swaps=None):
+    """
+    Kennzahlen für B Gewichtungen der Seiten auf einmal.
+
+    Args:
+        design (dict): Aus build_design().
+        weights (np.ndarray): [B x seite], wie oft jede Seite im Replikat zählt.
+        swaps (np.ndarray, optional): [B x seite] bool, Vertauschung zweier Modelle (Permutationstest).
+
+    Returns:
+        dict: Kennzahl -> [B x modell x variable] (NaN, wo die Kennzahl nicht zum Variablentyp passt).
+    """
+    shape = (weights.shape[0], design['n_models'], design['n_variables'])
+    result = {name: np.full(shape, np.nan) for name in ['n'] + CATEGORICAL_METRICS + ERROR_METRICS}
+    if design['categorical']:
+        k = design['n_labels']
+        confusion = _weighted_sums(design['confusion'], weights, swaps)
+        scores = metrics_from_confusion(confusion.reshape(*shape[:2], len(design['categorical']), k, k))
+        for name in ['n'] + CATEGORICAL_METRICS:
+            result[name][:, :, design['categorical']] = scores[name]
+    if design['metric']:
+        sums = _weighted_sums(design['errors'], weights, swaps).reshape(*shape[:2], 3, len(design['metric']))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n = sums[:, :, 0]
+            result['n'][:, :, design['metric']] = n
+            result['mae'][:, :, design['metric']] = sums[:, :, 1] / n
+            result['rmse'][:, :, design['metric']] = np.sqrt(sums[:, :, 2] / n)
+    return result
+
+
+def resample_weights(rng, n_replicates, n_pages):
+    """Bootstrap: Indexmatrix gezogener Seiten [B x seite] -> Häufigkeiten pro Seite [B x seite]."""
+    index = rng.integers(0, n_pages, size=(n_replicates, n_pages))
+    offsets = np.arange(n_replicates)[:, None] * n_pages
+    return np.bincount((index + offsets).ravel(), minlength=n_replicates * n_pages) \
+        .reshape(n_replicates, n_pages).astype(float)
+
+
+def _run_batch(kind, design, seed, size):
+    """Worker: ein Block von Replikaten ('bootstrap') oder Permutationen ('permutation')."""
+    rng = np.random.default_rng(seed)
+    if kind == 'bootstrap':
+        return replicate_metrics(design, resample_weights(rng, size, design['n_pages']))
+    swaps = rng.random((size, design['n_pages'])) < 0.5
+    return replicate_metrics(design, np.ones((size, design['n_pages'])), swaps)
+
+
+def run_replicates(kind, design, n_replicates, seed=0, batch_size=1000, max_workers=1):
+    """
+    Rechnet n_replicates Replikate in Blöcken, optional in einem Prozess-Pool.
+
+    Returns:
+        dict: Kennzahl -> [n_replicates x modell x variable].
+    """
+    sizes = [min(batch_size, n_replicates - start) for start in range(0, n_replicates, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(kind, design, batch_seed, size) for batch_seed, size in zip(seeds, sizes)]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(args))
+    if max_workers == 1:
+        batches = [_run_batch(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            batches = list(executor.map(_run_batch, *zip(*args)))
+    return {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+
+
+def _metric_names(design, v):
+    return CATEGORICAL_METRICS if v in design['categorical'] else ERROR_METRICS
+
+
+def bootstrap_evaluation(model_sources, gold=None, n_boot=10000, alpha=0.05, seed=0, batch_size=1000,
+                         max_workers=1, variables=ANNOTATION_VARIABLES, metric_variables=METRIC_VARIABLES,
+                         gold_suffix=GOLD_SUFFIX, missing_codes=MISSING_CODES, common_only=False):
+    """
+    Punktschätzer und Perzentil-Bootstrap-Intervalle für alle (Modell, Variable, Kennzahl).
+
+    Gezogen werden Seiten; alle Modelle verwenden dieselben Ziehungen.
+
+    Args:
+        model_sources (dict): Modellname -> CSV-Pfad oder DataFrame (siehe evaluate_models).
+        gold (optional): Goldstandard wie in evaluate_models.
+        n_boot (int): Anzahl Bootstrap-Replikate.
+        alpha (float): Irrtumswahrscheinlichkeit, z.B. 0.05 für 95%-Intervalle.
+        seed (int): Seed der Ziehungen.
+        batch_size (int): Replikate pro Matrixmultiplikation bzw. Worker-Auftrag.
+        max_workers (int, optional): Prozesse (1 = ohne Pool, None = alle Kerne).
+
+    Returns:
+        pd.DataFrame: Spalten model, variable, metric, n, estimate, ci_low, ci_high.
+    """
+    models, y_true, y_pred, valid, _ = load_aligned(model_sources, gold, variables, gold_suffix, missing_codes,
+                                                    common_only)
+    keep = valid.any(axis=(0, 2))  # Seiten ohne gültiges Paar tragen nichts bei
+    design = build_design(y_true[keep], y_pred[:, keep], valid[:, keep], variables, metric_variables)
+    estimate = replicate_metrics(design, np.ones((1, design['n_pages'])))
+    replicates = run_replicates('bootstrap', design, n_boot, seed, batch_size, max_workers)
+
+    rows = []
+    for m, model in enumerate(models):
+        for v, var in enumerate(variables):
+            n = estimate['n'][0, m, v]
+            if not n > 0:
+                continue
+            for name in _metric_names(design, v):
+                low, high = np.nanpercentile(replicates[name][:, m, v], [100 * alpha / 2, 100 * (1 - alpha / 2)])
+                rows.append({'model': model, 'variable': var, 'metric': name, 'n': int(n),
+                             'estimate': estimate[name][0, m, v], 'ci_low': low, 'ci_high': high})
+    return pd.DataFrame(rows, columns=['model', 'variable', 'metric', 'n', 'estimate', 'ci_low', 'ci_high'])
+
+
+def paired_model_tests(model_sources, gold=None, n_boot=10000, n_perm=10000, alpha=0.05, seed=0, batch_size=1000,
+                       max_workers=1, variables=ANNOTATION_VARIABLES, metric_variables=METRIC_VARIABLES,
+                       gold_suffix=GOLD_SUFFIX, missing_codes=MISSING_CODES):
+    """
+    Gepaarte Vergleiche aller Modellpaare auf den Seiten, die beide annotiert haben.
+
+    Für jede Kennzahl: Differenz (A - B), Bootstrap-Intervall der Differenz und
+    zweiseitiger p-Wert eines Permutationstests, der pro Seite die Vorhersagen
+    von A und B zufällig vertauscht.
+
+    Returns:
+        pd.DataFrame: Spalten model_a, model_b, variable, metric, n, diff, ci_low, ci_high,
+            p_value, better (Modell mit dem besseren Wert, nur bei p_value < alpha;
+            sonst 'n.s.').
+    """
+    models, y_true, y_pred, valid, _ = load_aligned(model_sources, gold, variables, gold_suffix, missing_codes)
+    rows = []
+    for a, b in combinations(range(len(models)), 2):
+        pair_valid = np.broadcast_to(valid[a] & valid[b], (2,) + valid.shape[1:])
+        keep = pair_valid.any(axis=(0, 2))
+        if not keep.any():
+            continue
+        design = build_design(y_true[keep], y_pred[[a, b]][:, keep], pair_valid[:, keep], variables, metric_variables)
+        observed = replicate_metrics(design, np.ones((1, design['n_pages'])))
+        boot = run_replicates('bootstrap', design, n_boot, seed, batch_size, max_workers)
+        perm = run_replicates('permutation', design, n_perm, seed + 1, batch_size, max_workers)
+        for v, var in enumerate(variables):
+            n = observed['n'][0, 0, v]
+            if not n > 0:
+                continue
+            for name in _metric_names(design, v):
+                diff = observed[name][0, 0, v] - observed[name][0, 1, v]
+                boot_diff = boot[name][:, 0, v] - boot[name][:, 1, v]
+                perm_diff = perm[name][:, 0, v] - perm[name][:, 1, v]
+                perm_diff = perm_diff[~np.isnan(perm_diff)]
+                low, high = np.nanpercentile(boot_diff, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+                # Kleine Toleranz, damit exakt gleiche Differenzen trotz Rundung mitzählen
+                extreme = np.sum(np.abs(perm_diff) >= abs(diff) - 1e-12)
+                p_value = (extreme + 1) / (len(perm_diff) + 1) if not np.isnan(diff) else np.nan
+                # Gewinner nur bei signifikanter Differenz, sonst 'n.s.'
+                better = 'n.s.'
+                if diff != 0 and p_value < alpha:
+                    better = models[a] if (diff < 0) == (name in LOWER_IS_BETTER) else models[b]
+                rows.append({'model_a': models[a], 'model_b': models[b], 'variable': var, 'metric': name,
+                             'n': int(n), 'diff': diff, 'ci_low': low, 'ci_high': high, 'p_value': p_value,
+                             'better': better})
+    return pd.DataFrame(rows, columns=['model_a', 'model_b', 'variable', 'metric', 'n', 'diff', 'ci_low',
+                                       'ci_high', 'p_value', 'better'])
@@ -0,0 +1,90 @@
+"""
+Gemeinsame Kommandozeilen-Optionen der Annotations-Skripte.
+
+Alle Skripte laufen ohne Rückfragen durch (kein input()), damit sie unbeaufsichtigt
+z.B. über Nacht oder per Scheduler gestartet werden können:
+
+    python x06_api_approach_annotation_run_v01.py --subsets "subsets_for_annotation/subset_1.csv"
+    python x05_vision_colab_v03.py --model qwen2.5vl:7b --concurrency 8 --dpi 120 --fresh
+"""
+import argparse
+import glob
+
+
+def add_run_arguments(parser, model, prompt, subsets, concurrency, dpi):
+    """
+    Fügt die gemeinsamen Optionen mit den Standardwerten des Skripts hinzu.
+
+    Args:
+        parser (argparse.ArgumentParser): Zu erweiternder Parser.
+        model (str): Standardmodell.
+        prompt (str): Standardpfad der Prompt-Datei.
+        subsets (str): Standard-Glob der Subset-CSVs.
+        concurrency (int): Standardanzahl gleichzeitiger Anfragen.
+        dpi (int): Standardauflösung beim Rendern.
+    """
+    parser.add_argument('--model', default=model, help=f"Modellname (Standard: {model})")
+    parser.add_argument('--prompt', default=prompt, help="Pfad der Prompt-Datei")
+    parser.add_argument('--subsets', default=subsets,
+                        help="Glob der zu annotierenden Subset-CSVs, mehrere durch Komma getrennt")
+    parser.add_argument('--concurrency', type=int, default=concurrency,
+                        help=f"Gleichzeitige Anfragen (Standard: {concurrency})")
+    parser.add_argument('--dpi', type=int, default=dpi, help=f"Render-Auflösung (Standard: {dpi})")
+    parser.add_argument('--fresh', dest='resume', action='store_false',
+                        help="Vorhandene Ergebnisse/Journale ignorieren und alle Seiten neu annotieren")
+    return parser
+
+
+def parse_run_arguments(parser, argv=None, ignore_unknown=False):
+    """
+    Liest die Optionen. Mit ignore_unknown werden fremde Argumente übergangen
+    (z.B. '-f kernel.json', wenn das Skript in Colab/Jupyter läuft).
+    """
+    if ignore_unknown:
+        args, _ = parser.parse_known_args(argv)
+        return args
+    return parser.parse_args(argv)
+
+
+def expand_subsets(pattern):
+    """Löst einen oder mehrere (kommagetrennte) Globs in eine sortierte Dateiliste auf."""
+    paths = set()
+    for part in pattern.split(','):
+        if part.strip():
+            paths.update(glob.glob(part.strip()))
+    return sorted(paths)
+
+
+def make_parser(description):
+    return argparse.ArgumentParser(description=description)
+
+
+def positive_int(value):
+    """Ganze Zahl >= 1, z.B. für Seitenzahlen."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ungültige Zahl '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"Erwartet mindestens 1, erhalten {number}")
+    return number
+
+
+def parse_grid(value):
+    """Liest ein Kachelraster wie '2x2' oder '3x2' (zeilen x spalten)."""
+    try:
+        rows, cols = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ungültiges Raster '{value}', erwartet z.B. 2x2")
+    if rows < 1 or cols < 1:
+        raise argparse.ArgumentTypeError(f"Ungültiges Raster '{value}'")
+    return rows, cols
+
+
+def add_tiling_arguments(parser, grid=None, compare=False):
+    """Optionen für die Kachelung dichter Seiten (x00_tiling) mit den Standardwerten des Skripts."""
+    parser.add_argument('--tiles', type=parse_grid, default=grid,
+                        help="Seiten in überlappende Kacheln zerlegen, z.B. 2x2")
+    parser.add_argument('--compare-tiling', action='store_true', default=compare,
+                        help="Zusätzlich ganze Seite und Kacheln vergleichen (Latenz, Genauigkeit)")
+    return parser
@@ -0,0 +1,306 @@
+"""
+Vergleich beliebig vieler Modelle mit dem Goldstandard.
+
+Die Ergebnisdateien der Modelle werden einmal über die Seiten-ID (oder, wenn
+eine Datei nur 'filename' hat, über die Seitenbezeichnung) an den
+Goldstandard ausgerichtet und in ein Array (modell x seite x variable)
+überführt. Alle Kennzahlen entstehen danach in einem Durchgang:
+
+    kategoriale Variablen: Cohen's Kappa, Macro-/Weighted-F1, Accuracy
+                           (aus einem Konfusions-Tensor modell x variable x k x k)
+    metrische Variablen:   MAE und RMSE
+
+evaluate_models() liefert eine Tabelle im Long-Format mit einer Zeile pro
+(Modell, Variable). Die Kennzahlen stimmen mit cohen_kappa_score, f1_score
+(zero_division=0), mean_absolute_error und mean_squared_error aus sklearn
+überein.
+"""
+import numpy as np
+import pandas as pd
+
+from x00_page_access import page_id_from_row, page_label
+
+ANNOTATION_VARIABLES = ['alc', 'product', 'warning', 'reduc', 'child', 'prod_pp', 'prod_alc']
+METRIC_VARIABLES = ['prod_pp', 'prod_alc']
+# Codes im Goldstandard für "nicht bestimmbar"; diese Seiten zählen nicht
+MISSING_CODES = (98, 99)
+GOLD_SUFFIX = '_gold'
+
+
+def _has_page_ids(df):
+    return 'page_id' in df.columns or {'original_pdf_path', 'page_number'} <= set(df.columns)
+
+
+def _has_page_labels(df):
+    return _has_page_ids(df) or 'filename' in df.columns or 'page_pdf_path' in df.columns
+
+
+def alignment_key(frames):
+    """
+    Wählt den Schlüssel, über den alle Dateien ausgerichtet werden.
+
+    'page_id', wenn jede Datei Seiten-IDs hat (Spalte 'page_id' oder PDF-Pfad
+    und Seitennummer), sonst 'filename' (Seitenbezeichnung wie in x04, aus den
+    Seiten-Spalten berechnet, wo sie fehlt).
+
+    Args:
+        frames (dict): Name -> DataFrame aller beteiligten Dateien (Modelle und Gold).
+
+    Raises:
+        ValueError: Wenn eine Datei keine der Spalten hat.
+    """
+    if all(_has_page_ids(df) for df in frames.values()):
+        return 'page_id'
+    unusable = [name for name, df in frames.items() if not _has_page_labels(df)]
+    if unusable:
+        raise ValueError(f"Keine Spalte zum Ausrichten (page_id, original_pdf_path + page_number oder filename) "
+                         f"in: {unusable}")
+    return 'filename'
+
+
+def _page_label_from_row(row):
+    filename = row.get('filename')
+    if isinstance(filename, str) and filename:
+        return filename
+    page_pdf_path = row.get('page_pdf_path')
+    if isinstance(page_pdf_path, str) and page_pdf_path:
+        return page_label((page_pdf_path, 0))
+    page_index = row.get('page_index')
+    if page_index is None or pd.isna(page_index):
+        page_index = int(row['page_number']) - 1
+    return page_label((row['original_pdf_path'], int(page_index)))
+
+
+def page_ids(df, key='page_id'):
+    """
+    Schlüssel aller Zeilen für die Ausrichtung (siehe alignment_key).
+
+    key='page_id': vorhandene 'page_id' oder aus PDF-Pfad und Seitennummer
+    berechnet; key='filename': Seitenbezeichnung. Zeilen ohne Seitennummer
+    erhalten None.
+    """
+    key_from_row = page_id_from_row if key == 'page_id' else _page_label_from_row
+    ids = []
+    for row in df.to_dict('records'):
+        try:
+            ids.append(key_from_row(row))
+        except (KeyError, TypeError, ValueError):
+            ids.append(None)
+    return pd.Index(ids, name=key)
+
+
+def _read(source):
+    return pd.read_csv(source) if isinstance(source, str) else source
+
+
+def _by_page(df, columns, source_name=None, key='page_id'):
+    """
+    Spalten einer Ergebnisdatei mit Seitenschlüssel als Index; bei doppelten Schlüsseln gilt die letzte Zeile.
+
+    Zeilen ohne Seitennummer werden übersprungen und gemeldet.
+    """
+    table = df.reindex(columns=columns).apply(pd.to_numeric, errors='coerce')
+    table.index = page_ids(df, key)
+    missing = table.index.isna()
+    if missing.any():
+        print(f"WARNUNG: {int(missing.sum())} Zeilen ohne Seitennummer in '{source_name}' übersprungen.")
+        table = table[~missing]
+    return table[~table.index.duplicated(keep='last')]
+
+
+def collect_gold(sources, variables=ANNOTATION_VARIABLES, gold_suffix=GOLD_SUFFIX, key='page_id'):
+    """
+    Goldstandard aus den '<variable><gold_suffix>'-Spalten einer oder mehrerer Dateien.
+
+    Args:
+        sources (list|dict): CSV-Pfade oder DataFrames, als dict mit Namen (für
+            Meldungen). Bei mehrfach annotierten Seiten gewinnt die erste
+            Quelle mit einem Wert.
+        variables (list): Auszuwertende Variablen.
+        gold_suffix (str): Suffix der Goldstandard-Spalten (z.B. '_gold' oder '_hum').
+        key (str): Ausrichtungsschlüssel aus alignment_key().
+
+    Returns:
+        pd.DataFrame: Eine Zeile pro Seiten-ID, eine Spalte pro Variable.
+    """
+    gold = None
+    for name, source in (sources.items() if isinstance(sources, dict) else enumerate(sources)):
+        df = _read(source)
+        table = _by_page(df, [f"{var}{gold_suffix}" for var in variables], name, key)
+        table.columns = variables
+        table = table.dropna(how='all')
+        gold = table if gold is None else gold.combine_first(table)
+    return gold.reindex(columns=variables)
+
+
+def align_to_gold(model_sources, gold, variables=ANNOTATION_VARIABLES, missing_codes=MISSING_CODES,
+                  common_only=False, key='page_id'):
+    """
+    Richtet die Vorhersagen aller Modelle über die Seiten-ID am Goldstandard aus.
+
+    Args:
+        model_sources (dict): Modellname -> CSV-Pfad oder DataFrame mit den Variablen-Spalten.
+        gold (pd.DataFrame): Goldstandard aus collect_gold().
+        variables (list): Auszuwertende Variablen.
+        missing_codes (tuple): Goldwerte, die als fehlend gelten.
+        common_only (bool): Nur Seiten werten, die alle Modelle für die Variable vorhergesagt haben
+            (gleiche Seiten für alle Modelle, nötig für gepaarte Vergleiche).
+        key (str): Ausrichtungsschlüssel aus alignment_key() (wie bei collect_gold).
+
+    Returns:
+        tuple: (modellnamen, y_true [seite x variable], y_pred [modell x seite x variable],
+            valid [modell x seite x variable], seiten_ids)
+    """
+    gold = gold.reindex(columns=variables)
+    y_true = gold.to_numpy(dtype=float)
+    predictions = []
+    for name, source in model_sources.items():
+        table = _by_page(_read(source), variables, name, key)
+        if not table.index.isin(gold.index).any():
+            print(f"WARNUNG: Keine Seite von '{name}' im Goldstandard gefunden.")
+        predictions.append(table.reindex(gold.index).to_numpy(dtype=float))
+    y_pred = np.stack(predictions)
+    gold_valid = ~np.isnan(y_true) & ~np.isin(y_true, missing_codes)
+    valid = gold_valid[np.newaxis] & ~np.isnan(y_pred)
+    if common_only:
+        valid = np.broadcast_to(valid.all(axis=0), valid.shape).copy()
+    return list(model_sources), y_true, y_pred, valid, gold.index
+
+
+def encode_labels(y_true, y_pred, valid):
+    """
+    Kodiert die Labels jeder Variable als 0..k-1 (gemeinsam über Gold und alle Modelle).
+
+    Returns:
+        tuple: (true_codes [seite x variable], pred_codes [modell x seite x variable], k)
+    """
+    true_codes = np.zeros(y_true.shape, dtype=np.int64)
+    pred_codes = np.zeros(y_pred.shape, dtype=np.int64)
+    n_labels = 1
+    for v in range(y_true.shape[1]):
+        gold_valid = valid[:, :, v].any(axis=0)
+        labels = np.union1d(y_true[gold_valid, v], y_pred[:, :, v][valid[:, :, v]])
+        if len(labels) == 0:
+            continue
+        n_labels = max(n_labels, len(labels))
+        true_codes[:, v] = np.searchsorted(labels, np.where(gold_valid, y_true[:, v], labels[0]))
+        pred_codes[:, :, v] = np.searchsorted(labels, np.where(valid[:, :, v], y_pred[:, :, v], labels[0]))
+    return true_codes, pred_codes, n_labels
+
+
+def confusion_tensor(true_codes, pred_codes, weights, n_labels):
+    """
+    Konfusionsmatrizen für alle (Modell, Variable) mit einem einzigen np.bincount.
+
+    Args:
+        true_codes (np.ndarray): [seite x variable].
+        pred_codes (np.ndarray): [modell x seite x variable].
+        weights (np.ndarray): [modell x seite x variable], 0/1 für gültig oder Häufigkeiten
+            (z.B. Bootstrap-Ziehungen).
+        n_labels (int): Anzahl Klassen k.
+
+    Returns:
+        np.ndarray: [modell x variable x k x k], Zeilen = Gold, Spalten = Vorhersage.
+    """
+    n_models, _, n_vars = pred_codes.shape
+    group = (np.arange(n_models)[:, None, None] * n_vars + np.arange(n_vars)[None, None, :])
+    cell = (group * n_labels + true_codes[None]) * n_labels + pred_codes
+    counts = np.bincount(cell.ravel(), weights=weights.ravel(),
+                         minlength=n_models * n_vars * n_labels * n_labels)
+    return counts.reshape(n_models, n_vars, n_labels, n_labels)
+
+
+def metrics_from_confusion(confusion):
+    """
+    Kappa, Macro-/Weighted-F1 und Accuracy aus Konfusionsmatrizen [... x k x k].
+
+    Klassen, die weder im Gold noch in der Vorhersage vorkommen, zählen nicht
+    (wie in sklearn); ohne Fälle oder ohne Varianz ist Kappa NaN.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = confusion.sum(axis=(-2, -1))
+        true_counts = confusion.sum(axis=-1)
+        pred_counts = confusion.sum(axis=-2)
+        true_positive = np.diagonal(confusion, axis1=-2, axis2=-1)
+        observed = true_positive.sum(axis=-1) / n
+        expected = (true_counts * pred_counts).sum(axis=-1) / n ** 2
+        kappa = (observed - expected) / (1 - expected)
+
+        f1_denominator = true_counts + pred_counts
+        f1 = np.where(f1_denominator > 0, 2 * true_positive / np.where(f1_denominator > 0, f1_denominator, 1), 0.0)
+        present = f1_denominator > 0
+        f1_macro = (f1 * present).sum(axis=-1) / present.sum(axis=-1)
+        f1_weighted = (f1 * true_counts).sum(axis=-1) / n
+    return {'n': n, 'cohen_kappa': kappa, 'f1_macro': f1_macro, 'f1_weighted': f1_weighted, 'accuracy': observed}
+
+
+def error_metrics(y_true, y_pred, weights):
+    """MAE und RMSE [modell x variable] über die gewichteten Seiten."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        diff = np.where(weights > 0, y_pred - y_true[None], 0.0)
+        n = weights.sum(axis=1)
+        mae = (weights * np.abs(diff)).sum(axis=1) / n
+        rmse = np.sqrt((weights * diff ** 2).sum(axis=1) / n)
+    return {'n': n, 'mae': mae, 'rmse': rmse}
+
+
+def load_aligned(model_sources, gold=None, variables=ANNOTATION_VARIABLES, gold_suffix=GOLD_SUFFIX,
+                 missing_codes=MISSING_CODES, common_only=False):
+    """
+    Liest Modelldateien und Goldstandard und richtet sie aus (siehe align_to_gold).
+
+    Args:
+        gold (optional): CSV-Pfad oder DataFrame mit Goldspalten (z.B. ein mit x02 annotiertes
+            Subset); None = aus den Goldspalten der Modelldateien zusammenführen.
+    """
+    model_sources = {name: _read(source) for name, source in model_sources.items()}
+    gold_sources = model_sources if gold is None else {'gold': _read(gold)}
+    key = alignment_key({**model_sources, **gold_sources})
+    gold = collect_gold(gold_sources, variables, gold_suffix, key)
+    return align_to_gold(model_sources, gold, variables, missing_codes, common_only, key)
+
+
+def evaluate_models(model_sources, gold=None, variables=ANNOTATION_VARIABLES, metric_variables=METRIC_VARIABLES,
+                    gold_suffix=GOLD_SUFFIX, missing_codes=MISSING_CODES, common_only=False):
+    """
+    Kennzahlen aller Modelle für alle Variablen in einer Tabelle.
+
+    Args:
+        model_sources (dict): Modellname -> CSV-Pfad oder DataFrame mit Vorhersagen.
+        gold (optional): CSV-Pfad oder DataFrame mit Goldspalten (z.B. ein mit x02 annotiertes
+            Subset); None = aus den Goldspalten der Modelldateien zusammenführen.
+        variables (list): Auszuwertende Variablen.
+        metric_variables (list): Davon metrisch (MAE/RMSE statt Kappa/F1).
+        gold_suffix (str): Suffix der Goldstandard-Spalten.
+        missing_codes (tuple): Goldwerte, die als fehlend gelten.
+        common_only (bool): Alle Modelle auf denselben Seiten werten.
+
+    Returns:
+        pd.DataFrame: Spalten model, variable, typ, n, cohen_kappa, f1_macro, f1_weighted,
+            accuracy, mae, rmse (nicht zutreffende Kennzahlen NaN).
+    """
+    models, y_true, y_pred, valid, _ = load_aligned(model_sources, gold, variables, gold_suffix, missing_codes,
+                                                    common_only)
+
+    categorical = [v for v, var in enumerate(variables) if var not in metric_variables]
+    metric = [v for v, var in enumerate(variables) if var in metric_variables]
+    rows = {}
+    if categorical:
+        true_codes, pred_codes, n_labels = encode_labels(y_true[:, categorical], y_pred[:, :, categorical],
+                                                         valid[:, :, categorical])
+        scores = metrics_from_confusion(confusion_tensor(true_codes, pred_codes, valid[:, :, categorical].astype(float),
+                                                         n_labels))
+        for j, v in enumerate(categorical):
+            for m, model in enumerate(models):
+                rows[(model, variables[v])] = {'typ': 'kategorial', **{key: value[m, j] for key, value in scores.items()}}
+    if metric:
+        scores = error_metrics(y_true[:, metric], y_pred[:, :, metric], valid[:, :, metric].astype(float))
+        for j, v in enumerate(metric):
+            for m, model in enumerate(models):
+                rows[(model, variables[v])] = {'typ': 'metrisch', **{key: value[m, j] for key, value in scores.items()}}
+
+    table = pd.DataFrame([{'model': model, 'variable': var, **rows[(model, var)]}
+                          for model in models for var in variables])
+    table['n'] = table['n'].astype(int)
+    return table.reindex(columns=['model', 'variable', 'typ', 'n', 'cohen_kappa', 'f1_macro', 'f1_weighted',
+                                  'accuracy', 'mae', 'rmse'])
@@ -0,0 +1,130 @@
+"""
+Paralleles Rendern von Grafiken aus vorberechneten Tabellen.
+
+Die Analyse-Skripte berechnen ihre Aggregat-Tabellen einmal im Hauptprozess
+und beschreiben jede Grafik als FigureJob (Dateiname, Plot-Funktion, Tabelle).
+render_figures() zeichnet die Grafiken in einem Prozess-Pool mit dem
+Agg-Backend. Eine Grafik wird übersprungen, wenn die Datei existiert und der
+Hash aus Tabelle, Plot-Funktion und Optionen seit dem letzten Lauf gleich
+geblieben ist. Die Hashes liegen in FIGURE_MANIFEST im Ausgabeordner.
+
+Plot-Funktionen müssen auf Modulebene definiert sein (picklebar) und die
+Signatur plot(table, path, **options) haben.
+"""
+import hashlib
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+FIGURE_MANIFEST = '.figure_hashes.json'
+
+FigureJob = namedtuple('FigureJob', ['filename', 'plot', 'table', 'options'], defaults=[None])
+
+
+def table_hash(table, *params):
+    """
+    Stabiler Hash einer Tabelle (Werte, Index, Spalten) plus beliebiger Parameter.
+
+    Args:
+        table (pd.DataFrame | pd.Series): Eingabetabelle der Grafik.
+        *params: Weitere Werte, die das Bild beeinflussen (werden per repr() gehasht).
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(table, index=True).values.tobytes())
+    columns = table.columns if isinstance(table, pd.DataFrame) else [table.name]
+    digest.update(repr((list(columns), list(table.index.names), params)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def figure_hash(job, salt=None):
+    """Hash eines FigureJob; Änderungen am Code der Plot-Funktion zählen mit."""
+    code = job.plot.__code__
+    return table_hash(job.table, job.plot.__module__, job.plot.__name__, code.co_code, code.co_consts,
+                      sorted((job.options or {}).items()), salt)
+
+
+def _load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render(job, path):
+    """Worker: zeichnet eine Grafik."""
+    job.plot(job.table, path, **(job.options or {}))
+    return job.filename
+
+
+def render_figures(jobs, output_folder, max_workers=None, force=False, salt=None):
+    """
+    Zeichnet alle geänderten Grafiken, bei mehreren Workern parallel.
+
+    Args:
+        jobs (list): FigureJob-Einträge.
+        output_folder (str): Zielordner der Bilder und des Manifests.
+        max_workers (int, optional): Anzahl Prozesse (None = alle Kerne, 1 = ohne Pool).
+        force (bool): Alle Grafiken neu zeichnen, auch wenn sich nichts geändert hat.
+        salt (optional): Zusätzlicher Wert für alle Hashes (z.B. Schriftgrößen, DPI).
+
+    Returns:
+        dict: Listen 'rendered', 'skipped' und 'failed' mit Dateinamen.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    manifest_path = os.path.join(output_folder, FIGURE_MANIFEST)
+    manifest = _load_manifest(manifest_path)
+    summary = {'rendered': [], 'skipped': [], 'failed': []}
+
+    pending = []
+    for job in jobs:
+        path = os.path.join(output_folder, job.filename)
+        digest = figure_hash(job, salt)
+        if not force and manifest.get(job.filename) == digest and os.path.exists(path):
+            summary['skipped'].append(job.filename)
+        else:
+            pending.append((job, path, digest))
+
+    def finish(job, digest, error):
+        if error is None:
+            manifest[job.filename] = digest
+            summary['rendered'].append(job.filename)
+        else:
+            manifest.pop(job.filename, None)
+            summary['failed'].append(job.filename)
+            print(f"Warnung: Grafik {job.filename} konnte nicht erstellt werden. Fehler: {error}")
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(pending) or 1)
+    if max_workers == 1:
+        for job, path, digest in pending:
+            try:
+                _render(job, path)
+                finish(job, digest, None)
+            except Exception as e:
+                finish(job, digest, e)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(_render, job, path): (job, digest) for job, path, digest in pending}
+            for future in as_completed(futures):
+                job, digest = futures[future]
+                finish(job, digest, future.exception())
+
+    _save_manifest(manifest_path, manifest)
+    print(f"Grafiken: {len(summary['rendered'])} erstellt, {len(summary['skipped'])} unverändert übersprungen, "
+          f"{len(summary['failed'])} fehlgeschlagen.")
+    return summary
@@ -0,0 +1,359 @@
+"""
+Nebenläufige Gemini-Annotation mit Rate-Limits und Wiederholungen.
+
+Der Runner verteilt Seiten auf mehrere Threads, hält dabei die Quoten für
+Anfragen pro Minute (RPM) und Tokens pro Minute (TPM) über zwei Token-Buckets
+ein und wiederholt vorübergehende Fehler (429, 5xx, Timeouts) mit
+exponentiellem Backoff und Jitter. Fehlgeschlagene Seiten werden wieder in die
+Warteschlange gestellt, statt sofort als Fehlerzeile zu enden.
+
+Die eigentliche Anfrage ist austauschbar (send_fn): über das
+google.generativeai-SDK oder über die REST-API, z.B. gegen den lokalen
+Fake-Server aus x00_mock_model_server.
+
+Mit cache und cache_key_fn werden bereits bekannte Antworten aus dem
+Antwort-Cache (x00_llm_cache) beantwortet, ohne Quote zu verbrauchen.
+
+Der Runner ist nicht an Gemini gebunden: x00_annotation_backend nutzt ihn
+auch für den Ollama-Client und den Fake-Backend (ohne RPM/TPM-Limits).
+"""
+import base64
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+# Grobe Schätzung für ein Bild bis 768x768 px (Gemini rechnet 258 Tokens pro Kachel)
+IMAGE_TOKEN_ESTIMATE = 258 * 4
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTION_NAMES = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable',
+                             'InternalServerError', 'DeadlineExceeded', 'GatewayTimeout'}
+
+
+class RetryableError(Exception):
+    """Vorübergehender Fehler, nach dem die Anfrage wiederholt werden soll."""
+
+
+def is_retryable(error):
+    """Prüft, ob ein Fehler vorübergehend ist (Quote, Serverfehler, Timeout)."""
+    if isinstance(error, (RetryableError, requests.ConnectionError, requests.Timeout)):
+        return True
+    if type(error).__name__ in RETRYABLE_EXCEPTION_NAMES:
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_STATUS_CODES
+
+
+def clean_json_response(text):
+    """Entfernt Markdown-Codeblöcke um die JSON-Antwort und parst sie."""
+    cleaned = text.strip().replace("```json", "").replace("```", "").strip()
+    return json.loads(cleaned)
+
+
+def estimate_tokens(prompt, n_images=1):
+    """Schätzt die Eingabe-Tokens einer Anfrage (ca. 4 Zeichen pro Token)."""
+    return len(prompt) // 4 + n_images * IMAGE_TOKEN_ESTIMATE
+
+
+class TokenBucket:
+    """
+    Token-Bucket für Quoten pro Minute.
+
+    Args:
+        per_minute (float): Erlaubte Menge pro Minute (None = unbegrenzt).
+        clock (callable): Zeitquelle, austauschbar für Tests.
+        sleep (callable): Wartefunktion, austauschbar für Tests.
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0 if per_minute else None
+        self.available = per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """Sekunden, bis 'amount' verfügbar ist (0 = sofort)."""
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            self._refill()
+            # Anfragen größer als die Kapazität dürfen den Bucket ins Minus ziehen
+            needed = min(amount, self.capacity) - self.available
+            return max(0.0, needed / self.rate)
+
+    def consume(self, amount):
+        """Zieht 'amount' ab (darf negativ werden, z.B. bei Nachkorrektur)."""
+        if self.rate is None:
+            return
+        with self._lock:
+            self._refill()
+            self.available -= amount
+
+    def acquire(self, amount=1):
+        """Wartet, bis 'amount' verfügbar ist, und zieht es ab."""
+        while True:
+            delay = self.wait_time(amount)
+            if delay <= 0:
+                self.consume(amount)
+                return
+            self.sleep(delay)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, rng=random):
+    """Exponentielles Backoff mit vollem Jitter: uniform(0, min(cap, base * 2^attempt))."""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RunnerStats:
+    """Zähler eines Runner-Laufs."""
+
+    def __init__(self):
+        self.pages = 0
+        self.errors = 0
+        self.retries = 0
+        self.tokens = 0
+        self.cache_hits = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def summary(self):
+        rate = self.pages / self.elapsed if self.elapsed > 0 else 0.0
+        return (f"{self.pages} Seiten in {self.elapsed:.1f}s ({rate:.2f} Seiten/s), "
+                f"{self.retries} Wiederholungen, {self.errors} Fehler, {self.tokens} Tokens, "
+                f"{self.cache_hits} aus Cache")
+
+
+class GeminiRunner:
+    """
+    Verteilt Anfragen auf Threads unter Einhaltung von RPM/TPM-Limits.
+
+    Args:
+        send_fn (callable): send_fn(request) -> (result_dict, tokens_used).
+            Wirft bei Fehlern eine Exception; vorübergehende Fehler werden
+            über is_retryable() erkannt.
+        prepare_fn (callable, optional): prepare_fn(job) -> request. Läuft im
+            steuernden Thread (z.B. Rendern mit PyMuPDF, das nicht threadsicher ist).
+        token_fn (callable, optional): token_fn(request) -> geschätzte Tokens.
+        max_concurrency (int): Maximale Anzahl gleichzeitiger Anfragen.
+        rpm (int, optional): Anfragen pro Minute (None = unbegrenzt).
+        tpm (int, optional): Tokens pro Minute (None = unbegrenzt).
+        max_retries (int): Maximale Wiederholungen pro Seite.
+        backoff_base (float): Basis des Backoffs in Sekunden.
+        backoff_cap (float): Obergrenze des Backoffs in Sekunden.
+        rng (random.Random, optional): Zufallsquelle für den Jitter.
+        cache (ResponseCache, optional): Antwort-Cache aus x00_llm_cache.
+        cache_key_fn (callable, optional): cache_key_fn(job) -> Cache-Schlüssel.
+            Nur mit cache zusammen wirksam.
+        model_name (str): Modellname, der im Cache mitgespeichert wird.
+        api_name (str): Name der API in Fehlermeldungen.
+        timings (StageTimings, optional): Erfasst die Dauer von prepare_fn
+            (prepare_stage) und send_fn ('request'), siehe x00_annotation_backend.
+        prepare_stage (str, optional): Schritt für prepare_fn; None = prepare_fn
+            misst seine Schritte selbst (z.B. 'render' und 'encode' getrennt).
+    """
+
+    def __init__(self, send_fn, prepare_fn=None, token_fn=None, max_concurrency=8, rpm=None,
+                 tpm=None, max_retries=5, backoff_base=1.0, backoff_cap=60.0, rng=None,
+                 cache=None, cache_key_fn=None, model_name=None, api_name='Gemini', timings=None,
+                 prepare_stage='render'):
+        self.send_fn = send_fn
+        self.prepare_fn = prepare_fn or (lambda job: job)
+        self.token_fn = token_fn or (lambda request: 0)
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rng = rng or random.Random()
+        self.cache = cache if cache_key_fn is not None else None
+        self.cache_key_fn = cache_key_fn
+        self.model_name = model_name
+        self.api_name = api_name
+        self.timings = timings
+        self.prepare_stage = prepare_stage
+
+    def _acquire_quota(self, tokens):
+        # Beide Quoten gleichzeitig freigeben, damit keine nur halb reserviert wird
+        while True:
+            delay = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+            if delay <= 0:
+                self.request_bucket.consume(1)
+                self.token_bucket.consume(tokens)
+                return
+            time.sleep(delay)
+
+    def _timed(self, stage, fn, arg):
+        if self.timings is None or stage is None:
+            return fn(arg)
+        started = time.perf_counter()
+        try:
+            return fn(arg)
+        finally:
+            self.timings.record(stage, time.perf_counter() - started)
+
+    def run(self, jobs, on_result=None):
+        """
+        Führt alle Jobs aus. Jeder Job braucht ein Attribut/Element 'key'
+        (z.B. AnnotationJob aus x00_ollama_async).
+
+        Args:
+            jobs (iterable): Auszuführende Jobs.
+            on_result (callable, optional): on_result(key, result) für jedes
+                endgültige Ergebnis (Erfolg oder Fehler nach allen Versuchen).
+
+        Returns:
+            tuple: (Dict {key: result}, RunnerStats).
+        """
+        stats = RunnerStats()
+        results = {}
+        sequence = itertools.count()
+        pending = {}
+        cache_keys = {}
+
+        def finish(job, result):
+            results[job.key] = result
+            stats.pages += 1
+            if result.get("error"):
+                stats.errors += 1
+            elif job.key in cache_keys:
+                self.cache.put(cache_keys[job.key], self.model_name, result)
+            if on_result is not None:
+                on_result(job.key, result)
+
+        # Warteschlange nach frühestem Startzeitpunkt: (ready_at, seq, job, attempt, request)
+        queue = []
+        for job in jobs:
+            if self.cache is not None:
+                try:
+                    cache_keys[job.key] = self.cache_key_fn(job)
+                except OSError as e:
+                    finish(job, {"error": f"Image rendering failed: {e}"})
+                    continue
+                cached = self.cache.get(cache_keys[job.key])
+                if cached is not None:
+                    # Treffer nicht erneut in den Cache schreiben
+                    stats.cache_hits += 1
+                    del cache_keys[job.key]
+                    finish(job, cached)
+                    continue
+            queue.append((0.0, next(sequence), job, 0, None))
+        heapq.heapify(queue)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while queue or pending:
+                now = time.monotonic()
+                while queue and len(pending) < self.max_concurrency and queue[0][0] <= now:
+                    _, _, job, attempt, request = heapq.heappop(queue)
+                    if request is None:
+                        try:
+                            request = self._timed(self.prepare_stage, self.prepare_fn, job)
+                        except Exception as e:
+                            finish(job, {"error": f"Image rendering failed: {e}"})
+                            continue
+                    estimate = self.token_fn(request)
+                    self._acquire_quota(estimate)
+                    future = executor.submit(self._timed, 'request', self.send_fn, request)
+                    pending[future] = (job, attempt, request, estimate)
+                    now = time.monotonic()
+
+                if not pending:
+                    if queue:
+                        time.sleep(max(0.0, queue[0][0] - time.monotonic()))
+                    continue
+
+                timeout = max(0.0, queue[0][0] - time.monotonic()) if queue else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, attempt, request, estimate = pending.pop(future)
+                    try:
+                        result, tokens_used = future.result()
+                    except Exception as e:
+                        if is_retryable(e) and attempt < self.max_retries:
+                            stats.retries += 1
+                            ready_at = time.monotonic() + backoff_delay(
+                                attempt, self.backoff_base, self.backoff_cap, self.rng)
+                            heapq.heappush(queue, (ready_at, next(sequence), job, attempt + 1, request))
+                        else:
+                            finish(job, {"error": f"{self.api_name} API call failed: {e}"})
+                        continue
+
+                    if tokens_used:
+                        # Schätzung durch den tatsächlichen Verbrauch ersetzen
+                        self.token_bucket.consume(tokens_used - estimate)
+                        stats.tokens += tokens_used
+                    finish(job, result)
+
+        stats.finished = time.perf_counter()
+        return results, stats
+
+
+# --- Anfrage-Funktionen --------------------------------------------------------
+
+def make_sdk_send_fn(model, generation_config):
+    """
+    send_fn über das google.generativeai-SDK.
+
+    request ist ein Tupel (prompt, PIL.Image).
+    """
+    def send(request):
+        prompt, image = request
+        response = model.generate_content([prompt, image], generation_config=generation_config)
+        usage = getattr(response, 'usage_metadata', None)
+        tokens_used = getattr(usage, 'total_token_count', 0) if usage is not None else 0
+        try:
+            return clean_json_response(response.text), tokens_used
+        except json.JSONDecodeError as e:
+            return {"error": f"JSON decode failed: {e}"}, tokens_used
+    return send
+
+
+def make_rest_send_fn(base_url, model_name, api_key, generation_config, timeout=120):
+    """
+    send_fn über die REST-API (generateContent), z.B. gegen den lokalen
+    Fake-Server. Nutzt eine gemeinsame requests.Session.
+
+    request ist ein Tupel (prompt, jpeg_bytes).
+    """
+    session = requests.Session()
+    url = f"{base_url.rstrip('/')}/v1beta/models/{model_name}:generateContent"
+
+    def send(request):
+        prompt, image_bytes = request
+        payload = {
+            "contents": [{"parts": [
+                {"text": prompt},
+                {"inline_data": {"mime_type": "image/jpeg",
+                                 "data": base64.b64encode(image_bytes).decode('utf-8')}},
+            ]}],
+            "generationConfig": generation_config,
+        }
+        response = session.post(url, params={"key": api_key}, json=payload, timeout=timeout)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableError(f"HTTP {response.status_code}: {response.text[:200]}")
+        response.raise_for_status()
+        body = response.json()
+        tokens_used = body.get('usageMetadata', {}).get('totalTokenCount', 0)
+        text = body['candidates'][0]['content']['parts'][0]['text']
+        try:
+            return clean_json_response(text), tokens_used
+        except json.JSONDecodeError as e:
+            return {"error": f"JSON decode failed: {e}"}, tokens_used
+    return send
@@ -0,0 +1,128 @@
+"""
+Persistenter Antwort-Cache für alle Modellaufrufe (SQLite).
+
+Der Schlüssel einer Antwort setzt sich zusammen aus Modell, vollständigem
+Prompt-Text, Optionen (temperature, seed, ...) und dem Hash der Eingabe
+(z.B. dem Render-Schlüssel des Seitenbildes aus x00_render_cache). Ein
+erneuter Lauf bezahlt damit nur für Seiten, deren Eingaben sich geändert
+haben. Gespeichert werden nur erfolgreiche Antworten (ohne "error").
+
+Die Größe ist über max_entries begrenzt; verdrängt werden die am längsten
+nicht benutzten Einträge.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+LLM_CACHE_PATH = 'llm_cache.sqlite'
+LLM_CACHE_MAX_ENTRIES = 200_000
+
+
+def response_cache_key(model, prompt, options=None, input_hash=None):
+    """
+    Berechnet den Cache-Schlüssel eines Modellaufrufs.
+
+    Args:
+        model (str): Modellname.
+        prompt (str): Vollständiger Prompt (enthält bei Text-Anfragen den Seitentext).
+        options (dict, optional): Generierungsoptionen.
+        input_hash (str, optional): Hash zusätzlicher Eingaben, z.B. des Bildes.
+    """
+    payload = json.dumps({'model': model, 'prompt': prompt, 'options': options or {},
+                          'input': input_hash}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-Cache für Modellantworten mit Treffer-Statistik und LRU-Verdrängung.
+
+    Args:
+        path (str): Pfad der SQLite-Datei.
+        max_entries (int): Maximale Anzahl gespeicherter Antworten.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, last_used REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Gibt die gespeicherte Antwort (dict) zurück oder None."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, model, result):
+        """Speichert eine erfolgreiche Antwort. Fehlerantworten werden ignoriert."""
+        if not isinstance(result, dict) or result.get("error"):
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(result, ensure_ascii=False), now, now))
+            self._conn.commit()
+            self._puts_since_evict += 1
+            # Verdrängung nur gelegentlich prüfen, nicht bei jedem Schreiben
+            if self._puts_since_evict >= 100:
+                self._evict()
+
+    def _evict(self):
+        self._puts_since_evict = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)", (excess,))
+            self._conn.commit()
+
+    def stats(self):
+        """Treffer, Fehlzugriffe, Trefferquote und Anzahl gespeicherter Antworten."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0, 'entries': entries}
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+
+_shared_cache = None
+
+
+def get_response_cache():
+    """Gibt den prozessweit geteilten ResponseCache zurück."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ResponseCache()
+    return _shared_cache
+
+
+def configure_response_cache(path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES):
+    """Setzt Pfad und Größe des geteilten Caches (z.B. auf Google Drive in Colab)."""
+    global _shared_cache
+    _shared_cache = ResponseCache(path, max_entries)
+    return _shared_cache
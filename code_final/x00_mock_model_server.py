@@ -0,0 +1,161 @@
+"""
+Lokaler Fake-Server für Modell-APIs (ohne Netz, ohne GPU, ohne Quote).
+
+Bildet den REST-Endpunkt generateContent der Gemini-API sowie /api/generate
+und /api/chat von Ollama nach, mit einstellbarer Latenz, zufällig
+eingestreuten Fehlern und einem eigenen RPM-Limit, das mit HTTP 429
+antwortet. Damit lassen sich Rate-Limits, Backoff und Wiederholungen der
+Runner sowie der Durchsatz der Pipelines lokal prüfen (x07_annotation_benchmark):
+
+    with MockModelServer(latency=0.2, error_rate=0.1, rpm_limit=60) as server:
+        send = make_rest_send_fn(server.url, "gemini-2.0-flash", "fake", {})
+        backend = OllamaHTTPBackend("qwen2.5vl:3b", endpoint=f"{server.url}/api/generate")
+        ...
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANNOTATION = {'alc': 0, 'product': 0, 'warning': 0, 'reduc': 0, 'child': 0, 'prod_pp': 0, 'prod_alc': 0}
+GEMINI_PATH = re.compile(r'^/v1beta/models/(?P<model>[^/:]+):generateContent')
+OLLAMA_PATHS = ('/api/generate', '/api/chat')
+NS_PER_SECOND = 10 ** 9
+
+
+class MockModelServer:
+    """
+    Fake-Server im Hintergrund-Thread.
+
+    Args:
+        host (str): Adresse zum Binden.
+        port (int): Port (0 = freien Port wählen).
+        latency (float): Antwortzeit pro Anfrage in Sekunden.
+        error_rate (float): Anteil der Anfragen, die mit error_status scheitern.
+        error_status (int): HTTP-Status der eingestreuten Fehler.
+        rpm_limit (int, optional): Anfragen pro gleitender Minute, darüber HTTP 429.
+        response (dict | callable, optional): Antwort-JSON oder Funktion
+            response(request_body) -> dict.
+        seed (int, optional): Seed für die Fehlerauswahl.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, error_status=500,
+                 rpm_limit=None, response=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rpm_limit = rpm_limit
+        self.response = response if response is not None else DEFAULT_ANNOTATION
+        self.status_counts = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._request_times = deque()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return sum(self.status_counts.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _decide_status(self):
+        """Bestimmt den Status der nächsten Anfrage (Rate-Limit, Fehler oder 200)."""
+        with self._lock:
+            now = time.monotonic()
+            while self._request_times and now - self._request_times[0] > 60:
+                self._request_times.popleft()
+            if self.rpm_limit is not None and len(self._request_times) >= self.rpm_limit:
+                return 429
+            self._request_times.append(now)
+            if self._rng.random() < self.error_rate:
+                return self.error_status
+            return 200
+
+    def _annotation_for(self, body):
+        return self.response(body) if callable(self.response) else self.response
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass  # keine Zugriffslogs auf der Konsole
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_ollama(self, path, body, text, seconds):
+                payload = {"model": body.get('model'), "done": True, "load_duration": 0,
+                           "total_duration": int(seconds * NS_PER_SECOND), "eval_count": len(text) // 4}
+                if path == '/api/chat':
+                    payload["message"] = {"role": "assistant", "content": text}
+                else:
+                    payload["response"] = text
+                self._send_json(200, payload)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                path = self.path.split('?')[0]
+                if not GEMINI_PATH.match(path) and path not in OLLAMA_PATHS:
+                    self._send_json(404, {"error": f"unknown path {self.path}"})
+                    return
+                if path in OLLAMA_PATHS and not body.get('prompt') and not body.get('messages'):
+                    # Vorladen/Entladen eines Modells (leere Anfrage mit keep_alive)
+                    self._send_json(200, {"model": body.get('model'), "response": "", "done": True,
+                                          "load_duration": 0, "total_duration": 0})
+                    return
+                started = time.perf_counter()
+                if server.latency:
+                    time.sleep(server.latency)
+
+                status = server._decide_status()
+                with server._lock:
+                    server.status_counts[status] += 1
+                if status != 200:
+                    self._send_json(status, {"error": {"code": status, "message": "injected error"}})
+                    return
+
+                text = json.dumps(server._annotation_for(body))
+                if path in OLLAMA_PATHS:
+                    self._send_ollama(path, body, text, time.perf_counter() - started)
+                    return
+                prompt_tokens = sum(len(part.get('text', '')) // 4 + (258 if 'inline_data' in part else 0)
+                                    for content in body.get('contents', []) for part in content.get('parts', []))
+                output_tokens = len(text) // 4
+                self._send_json(200, {
+                    "candidates": [{"content": {"parts": [{"text": f"```json\n{text}\n```"}], "role": "model"}}],
+                    "usageMetadata": {"promptTokenCount": prompt_tokens,
+                                      "candidatesTokenCount": output_tokens,
+                                      "totalTokenCount": prompt_tokens + output_tokens},
+                })
+
+        return Handler
@@ -0,0 +1,251 @@
+"""
+Asynchroner Annotations-Runner für die Ollama-HTTP-API.
+
+Statt eine Anfrage nach der anderen zu senden (und dazwischen zu schlafen),
+hält der Runner bis zu max_in_flight Anfragen gleichzeitig offen. Rendern und
+Base64-Kodierung laufen in einem Hintergrund-Thread, während der Server
+bereits andere Seiten verarbeitet. Alle Anfragen teilen sich eine
+HTTP-Session (Keep-Alive).
+
+Vor jeder Anfrage wird der Antwort-Cache (x00_llm_cache) befragt; bei einem
+Treffer entfallen Rendern und Modellaufruf.
+
+Lade- und Inferenzzeit der Antworten (load_duration/total_duration) werden
+getrennt gezählt; mit keep_alive bleibt das Modell zwischen den Aufrufen
+geladen (siehe x00_ollama_residency).
+
+Damit der Ollama-Server Anfragen wirklich parallel abarbeitet, muss er mit
+genügend Slots gestartet sein, z.B. OLLAMA_NUM_PARALLEL=4 ollama serve.
+"""
+import asyncio
+import base64
+import json
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from x00_gemini_runner import clean_json_response
+from x00_llm_cache import get_response_cache, response_cache_key
+from x00_ollama_residency import response_timings
+from x00_page_access import AnnotationJob
+from x00_render_cache import render_key, render_page_jpeg
+
+OLLAMA_ENDPOINT = "http://localhost:11434/api/generate"
+
+
+class ThroughputStats:
+    """Zählt verarbeitete Seiten und Fehler und berechnet Seiten pro Sekunde."""
+
+    def __init__(self):
+        self.pages = 0
+        self.errors = 0
+        self.cache_hits = 0
+        # Summen aus load_duration/total_duration der Antworten
+        self.timed_requests = 0
+        self.load_seconds = 0.0
+        self.inference_seconds = 0.0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    def add_timings(self, timings):
+        if timings is None:
+            return
+        self.timed_requests += 1
+        self.load_seconds += timings[0]
+        self.inference_seconds += timings[1]
+
+    def summary(self):
+        text = (f"{self.pages} Seiten in {self.elapsed:.1f}s "
+                f"({self.pages_per_sec:.2f} Seiten/s, {self.errors} Fehler, {self.cache_hits} aus Cache)")
+        if self.timed_requests:
+            text += (f", Inferenz {self.inference_seconds / self.timed_requests:.2f}s/Anfrage"
+                     f", Modell-Laden {self.load_seconds:.1f}s")
+        return text
+
+
+def _measure(timings, stage):
+    return timings.measure(stage) if timings is not None else nullcontext()
+
+
+def _encode_page(page_ref, clip, render_options, timings=None):
+    """Rendert eine Seite und kodiert sie für die Ollama-API (läuft im Render-Thread)."""
+    with _measure(timings, 'render'):
+        image_bytes = render_page_jpeg(page_ref, clip=clip, **render_options)
+    with _measure(timings, 'encode'):
+        return base64.b64encode(image_bytes).decode('utf-8')
+
+
+def job_cache_key(job, model, options, render_options):
+    """Cache-Schlüssel eines Jobs: Modell, Prompt, Optionen und Render-Schlüssel des Bildes."""
+    input_hash = None
+    if job.page_ref is not None:
+        dpi = render_options.get('dpi', 96)
+        grayscale = render_options.get('grayscale', True)
+        quality = render_options.get('quality', 80)
+        input_hash = render_key(job.page_ref, dpi, grayscale, quality, job.clip)
+    return response_cache_key(model, job.prompt, options, input_hash)
+
+
+async def _annotate_job(job, session, endpoint, model, options, timeout,
+                        render_executor, render_options, prefetch, in_flight, cache, keep_alive=None,
+                        timings=None):
+    """
+    Führt einen Job aus: Cache -> Rendern (Thread) -> Anfrage (Session) -> JSON parsen.
+
+    Returns:
+        tuple: (key, result, aus_cache, (ladezeit, inferenzzeit) oder None).
+    """
+    cache_key = None
+    if cache is not None:
+        try:
+            cache_key = job_cache_key(job, model, options, render_options)
+        except OSError as e:
+            return job.key, {"error": f"Image rendering failed: {e}"}, False, None
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return job.key, cached, True, None
+
+    # prefetch begrenzt, wie viele gerenderte Bilder gleichzeitig im Speicher liegen
+    async with prefetch:
+        payload = {"model": model, "prompt": job.prompt, "format": "json", "stream": False}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        if job.page_ref is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                encoded = await loop.run_in_executor(render_executor, _encode_page, job.page_ref, job.clip,
+                                                     render_options, timings)
+            except Exception as e:
+                return job.key, {"error": f"Image rendering failed: {e}"}, False, None
+            payload["images"] = [encoded]
+
+        async with in_flight:
+            started = time.perf_counter()
+            try:
+                async with session.post(endpoint, json=payload,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    response.raise_for_status()
+                    body = await response.json()
+            # ValueError: abgeschnittener oder ungültiger JSON-Body (json.JSONDecodeError)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                return job.key, {"error": f"Ollama API call failed: {e!r}"}, False, None
+            if not isinstance(body, dict):
+                return job.key, {"error": f"Ollama API call failed: unexpected body {body!r:.200}"}, False, None
+            if timings is not None:
+                timings.record('request', time.perf_counter() - started)
+
+    model_timings = response_timings(body)
+    with _measure(timings, 'parse'):
+        try:
+            result = clean_json_response(body.get('response', '{}'))
+        except json.JSONDecodeError as e:
+            return job.key, {"error": f"JSON decode failed: {e}"}, False, model_timings
+    if cache is not None:
+        cache.put(cache_key, model, result)
+    return job.key, result, False, model_timings
+
+
+async def run_annotation_jobs(jobs, model, endpoint=OLLAMA_ENDPOINT, max_in_flight=4,
+                              options=None, timeout=660, render_options=None, on_result=None,
+                              use_cache=True, cache=None, keep_alive=None, timings=None):
+    """
+    Annotiert alle Jobs nebenläufig.
+
+    Args:
+        jobs (iterable): AnnotationJob-Einträge.
+        model (str): Ollama-Modellname.
+        endpoint (str): URL von /api/generate.
+        max_in_flight (int): Maximale Anzahl gleichzeitig offener Anfragen.
+        options (dict, optional): Ollama-Optionen (temperature, seed, ...).
+        timeout (int): Timeout pro Anfrage in Sekunden.
+        render_options (dict, optional): dpi, grayscale, quality für render_page_jpeg.
+        on_result (callable, optional): Wird für jedes Ergebnis mit (key, result)
+            aufgerufen, sobald es vorliegt (z.B. zum Zwischenspeichern).
+        use_cache (bool): Antwort-Cache verwenden.
+        cache (ResponseCache, optional): Zu verwendender Cache; None = geteilter Cache.
+        keep_alive (str|int, optional): keep_alive jeder Anfrage (z.B. "30m"),
+            damit das Modell zwischen den Anfragen geladen bleibt.
+        timings (StageTimings, optional): Erfasst die Dauer von render, encode,
+            request und parse (x00_annotation_backend).
+
+    Returns:
+        tuple: (Dict {key: result}, ThroughputStats). Fehler stehen als
+            {"error": ...} im Ergebnis.
+    """
+    render_options = render_options or {}
+    if use_cache and cache is None:
+        cache = get_response_cache()
+    elif not use_cache:
+        cache = None
+    prefetch = asyncio.Semaphore(max_in_flight * 2)
+    in_flight = asyncio.Semaphore(max_in_flight)
+    stats = ThroughputStats()
+    results = {}
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    # Ein einziger Render-Thread: PyMuPDF-Dokumente sind nicht threadsicher
+    with ThreadPoolExecutor(max_workers=1) as render_executor:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [
+                asyncio.ensure_future(_annotate_job(job, session, endpoint, model, options, timeout,
+                                                    render_executor, render_options, prefetch, in_flight, cache,
+                                                    keep_alive, timings))
+                for job in jobs
+            ]
+            for finished in asyncio.as_completed(tasks):
+                key, result, from_cache, timings = await finished
+                results[key] = result
+                stats.pages += 1
+                stats.cache_hits += from_cache
+                stats.add_timings(timings)
+                if result.get("error"):
+                    stats.errors += 1
+                if on_result is not None:
+                    on_result(key, result)
+
+    stats.finished = time.perf_counter()
+    return results, stats
+
+
+def annotate_jobs(jobs, model, **kwargs):
+    """
+    Synchroner Einstieg für run_annotation_jobs().
+
+    Läuft bereits eine Event-Loop (z.B. in Colab/Jupyter), wird der Runner in
+    einem eigenen Thread mit eigener Loop ausgeführt.
+    """
+    coroutine = run_annotation_jobs(list(jobs), model, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    outcome = {}
+
+    def _run():
+        try:
+            outcome['value'] = asyncio.run(coroutine)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=_run)
+    thread.start()
+    thread.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['value']
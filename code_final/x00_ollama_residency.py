@@ -0,0 +1,168 @@
+"""
+Modell-Residenz für den lokalen Ollama-Server.
+
+Wechseln sich zwei Modelle ab (z.B. Text- und Bildmodell in x04.2), lädt
+Ollama bei jedem Wechsel das Modell neu. Diese Ladezeit steckte bisher in den
+großzügigen Timeouts der ersten Anfragen. Der ModelResidencyManager
+
+    - lädt ein Modell vor der ersten Anfrage explizit vor (leere Anfrage an
+      /api/generate) und setzt keep_alive, damit es zwischen den Anfragen
+      geladen bleibt,
+    - entlädt beim Wechsel auf Wunsch das vorherige Modell (keep_alive=0),
+      damit beide nicht gleichzeitig im (Grafik-)Speicher liegen,
+    - misst Ladezeit und Inferenzzeit getrennt. Die Anfragen selbst melden
+      load_duration und total_duration (Nanosekunden); ein Modell, das
+      mitten im Lauf neu geladen wird, taucht damit als Ladezeit auf.
+
+Die Skripte gruppieren ihre Arbeit nach Modell (erst alle Text-, dann alle
+Bild-Anfragen) und rufen ensure() vor dem ersten Aufruf eines Modells auf,
+sodass jedes Modell pro Lauf nur einmal geladen wird:
+
+    residency = ModelResidencyManager(OLLAMA_ENDPOINT)
+    residency.ensure(TEXT_MODEL)       # lädt das Modell nur, wenn es nicht schon aktiv ist
+    results, stats = annotate_jobs(text_jobs, TEXT_MODEL, keep_alive=residency.keep_alive, ...)
+    residency.record(TEXT_MODEL, stats)
+    ...
+    print(residency.report())
+"""
+import time
+
+import requests
+
+DEFAULT_KEEP_ALIVE = "30m"
+# Vorladen darf lange dauern (Modell von der Platte lesen), die eigentlichen Anfragen nicht mehr
+LOAD_TIMEOUT = 600
+NS_PER_SECOND = 1e9
+
+
+def response_timings(body):
+    """
+    Lade- und Inferenzzeit einer Ollama-Antwort in Sekunden.
+
+    Returns:
+        tuple: (ladezeit, inferenzzeit) oder None, wenn die Antwort keine
+            Zeitangaben enthält (z.B. Cache-Treffer oder Fehler).
+    """
+    if not isinstance(body, dict) or 'total_duration' not in body:
+        return None
+    load = body.get('load_duration', 0) / NS_PER_SECOND
+    total = body['total_duration'] / NS_PER_SECOND
+    return load, max(0.0, total - load)
+
+
+class ModelTimings:
+    """Summiert Lade- und Inferenzzeiten je Modell."""
+
+    def __init__(self):
+        self.models = {}
+
+    def _entry(self, model):
+        return self.models.setdefault(model, {'loads': 0, 'load_seconds': 0.0, 'requests': 0,
+                                              'inference_seconds': 0.0, 'reload_seconds': 0.0})
+
+    def add_load(self, model, seconds):
+        entry = self._entry(model)
+        entry['loads'] += 1
+        entry['load_seconds'] += seconds
+
+    def add_request(self, model, load_seconds, inference_seconds):
+        """Zeiten einer Anfrage; Ladezeit innerhalb einer Anfrage gilt als ungeplantes Nachladen."""
+        entry = self._entry(model)
+        entry['requests'] += 1
+        entry['inference_seconds'] += inference_seconds
+        entry['reload_seconds'] += load_seconds
+
+    def add_stats(self, model, stats):
+        """Übernimmt die Summen einer ThroughputStats aus x00_ollama_async."""
+        entry = self._entry(model)
+        entry['requests'] += stats.timed_requests
+        entry['inference_seconds'] += stats.inference_seconds
+        entry['reload_seconds'] += stats.load_seconds
+
+    def report(self):
+        lines = []
+        for model, entry in self.models.items():
+            per_request = entry['inference_seconds'] / entry['requests'] if entry['requests'] else 0.0
+            lines.append(f"{model}: {entry['loads']}x geladen ({entry['load_seconds']:.1f}s), "
+                         f"{entry['requests']} Anfragen mit {entry['inference_seconds']:.1f}s Inferenz "
+                         f"({per_request:.2f}s/Anfrage), {entry['reload_seconds']:.1f}s Nachladen während des Laufs")
+        return "\n".join(lines) if lines else "Keine Modellzeiten erfasst."
+
+
+class ModelResidencyManager:
+    """
+    Hält Ollama-Modelle für die Dauer eines Laufs geladen.
+
+    Args:
+        endpoint (str): URL von /api/generate.
+        keep_alive (str|int): Wie lange Ollama das Modell nach der letzten
+            Anfrage geladen hält (z.B. "30m", -1 = unbegrenzt).
+        exclusive (bool): Beim Wechsel auf ein anderes Modell das vorherige entladen.
+        load_timeout (int): Timeout für das Vorladen in Sekunden.
+    """
+
+    def __init__(self, endpoint, keep_alive=DEFAULT_KEEP_ALIVE, exclusive=True, load_timeout=LOAD_TIMEOUT):
+        self.endpoint = endpoint
+        self.keep_alive = keep_alive
+        self.exclusive = exclusive
+        self.load_timeout = load_timeout
+        self.timings = ModelTimings()
+        self.current = None
+
+    def preload(self, model):
+        """
+        Lädt ein Modell (leere Anfrage mit keep_alive) und misst die Ladezeit.
+
+        Returns:
+            float: Ladezeit in Sekunden (0, wenn das Modell schon geladen war).
+        """
+        started = time.perf_counter()
+        try:
+            response = requests.post(self.endpoint, json={"model": model, "keep_alive": self.keep_alive},
+                                     timeout=self.load_timeout)
+            response.raise_for_status()
+            body = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"  -> Modell {model} konnte nicht vorgeladen werden: {e}")
+            return 0.0
+        # load_duration des Servers bevorzugen; die Wanduhr enthält auch den HTTP-Aufwand
+        seconds = body.get('load_duration', 0) / NS_PER_SECOND if 'load_duration' in body \
+            else time.perf_counter() - started
+        self.timings.add_load(model, seconds)
+        print(f"-> Modell {model} geladen in {seconds:.1f}s (keep_alive={self.keep_alive}).")
+        return seconds
+
+    def unload(self, model):
+        """Entlädt ein Modell sofort (keep_alive=0)."""
+        try:
+            requests.post(self.endpoint, json={"model": model, "keep_alive": 0}, timeout=60).raise_for_status()
+        except requests.RequestException as e:
+            print(f"  -> Modell {model} konnte nicht entladen werden: {e}")
+
+    def ensure(self, model):
+        """Macht model zum aktuellen Modell; lädt es nur, wenn es nicht schon aktiv ist."""
+        if model == self.current:
+            return
+        if self.exclusive and self.current is not None:
+            self.unload(self.current)
+        self.preload(model)
+        self.current = model
+
+    def record(self, model, stats):
+        """Übernimmt Lade-/Inferenzzeiten aus einer ThroughputStats von annotate_jobs()."""
+        self.timings.add_stats(model, stats)
+
+    def record_response(self, model, body):
+        """Übernimmt Lade-/Inferenzzeit aus einer einzelnen Ollama-Antwort."""
+        timings = response_timings(body)
+        if timings is not None:
+            self.timings.add_request(model, *timings)
+
+    def report(self):
+        return self.timings.report()
+
+    def close(self):
+        """Entlädt das zuletzt verwendete Modell (nur im exklusiven Modus)."""
+        if self.exclusive and self.current is not None:
+            self.unload(self.current)
+            self.current = None
@@ -0,0 +1,130 @@
+"""
+Gemeinsamer Seitenzugriff für alle Annotations-Skripte.
+
+Eine Seite im Dataset wird entweder über eine materialisierte Einzelseiten-PDF
+('page_pdf_path', Seite 0) oder virtuell über das Original-Prospekt
+('original_pdf_path' + 'page_index') referenziert. Der PageAccessor öffnet
+jedes Prospekt nur einmal und liefert die Seiten daraus.
+"""
+import os
+import hashlib
+from collections import OrderedDict, namedtuple
+
+import fitz  # PyMuPDF
+
+# Arbeitsauftrag für eine Annotation. key: beliebiger Schlüssel (z.B. DataFrame-Index),
+# page_ref: (pdf_pfad, seitenindex) oder None für reine Text-Anfragen,
+# clip: optionaler Ausschnitt (x0, y0, x1, y1) als Anteil der Seite, z.B. für Kacheln
+AnnotationJob = namedtuple('AnnotationJob', ['key', 'prompt', 'page_ref', 'clip'], defaults=[None])
+
+
+def page_ref_from_row(row):
+    """
+    Ermittelt die Seitenreferenz (pdf_pfad, seitenindex) einer Dataset-Zeile.
+
+    Args:
+        row (pd.Series | dict): Zeile aus dem Seiten-Dataset.
+
+    Returns:
+        tuple: (pdf_path, page_index). Materialisierte Einzelseiten haben
+            immer den Index 0.
+    """
+    page_pdf_path = row.get('page_pdf_path')
+    if isinstance(page_pdf_path, str) and page_pdf_path:
+        return page_pdf_path, 0
+    return row['original_pdf_path'], int(row['page_index'])
+
+
+def make_page_id(original_pdf_path, page_index):
+    """
+    Erzeugt eine stabile Seiten-ID aus Prospekt-Pfad und Seitenindex.
+
+    Die ID hängt nur von der Quelle der Seite ab, nicht davon, ob eine
+    Einzelseiten-PDF existiert oder in welchem Subset die Seite landet.
+    """
+    key = f"{original_pdf_path.replace(os.sep, '/')}#{int(page_index)}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def page_id_from_row(row):
+    """Liest die Seiten-ID einer Zeile oder berechnet sie für ältere Datasets."""
+    page_id = row.get('page_id')
+    if isinstance(page_id, str) and page_id:
+        return page_id
+    return make_page_id(row['original_pdf_path'], int(row['page_number']) - 1)
+
+
+def page_label(page_ref):
+    """Kurze, lesbare Bezeichnung einer Seitenreferenz für Log-Ausgaben."""
+    pdf_path, page_index = page_ref
+    name = os.path.basename(pdf_path)
+    if page_index == 0 and '_page_' in name:
+        return name
+    return f"{name} [Seite {page_index + 1}]"
+
+
+class PageAccessor:
+    """
+    Hält die zuletzt benutzten Prospekte geöffnet und liefert Seiten daraus.
+
+    Seiten-Objekte sind nur gültig, solange ihr Dokument geöffnet ist. Sie
+    sollten deshalb direkt verarbeitet und nicht über weitere Aufrufe von
+    load_page() hinweg aufbewahrt werden.
+
+    Args:
+        max_open_docs (int): Maximale Anzahl gleichzeitig geöffneter PDFs.
+    """
+
+    def __init__(self, max_open_docs=16):
+        self.max_open_docs = max_open_docs
+        self._docs = OrderedDict()
+
+    def document(self, pdf_path):
+        """Gibt das (ggf. bereits geöffnete) Dokument für einen Pfad zurück."""
+        doc = self._docs.get(pdf_path)
+        if doc is not None:
+            self._docs.move_to_end(pdf_path)
+            return doc
+
+        doc = fitz.open(pdf_path)
+        self._docs[pdf_path] = doc
+        while len(self._docs) > self.max_open_docs:
+            _, oldest = self._docs.popitem(last=False)
+            oldest.close()
+        return doc
+
+    def load_page(self, page_ref):
+        """Lädt die Seite zu einer Referenz (pdf_pfad, seitenindex)."""
+        pdf_path, page_index = page_ref
+        return self.document(pdf_path).load_page(page_index)
+
+    def export_page(self, page_ref, output_path):
+        """Schreibt die Seite zu einer Referenz als einseitige PDF (z.B. zum Ansehen beim Kodieren)."""
+        pdf_path, page_index = page_ref
+        with fitz.open() as page_doc:
+            page_doc.insert_pdf(self.document(pdf_path), from_page=page_index, to_page=page_index)
+            page_doc.save(output_path)
+        return output_path
+
+    def close(self):
+        """Schließt alle geöffneten Dokumente."""
+        while self._docs:
+            _, doc = self._docs.popitem()
+            doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_shared_accessor = None
+
+
+def get_page_accessor():
+    """Gibt den prozessweit geteilten PageAccessor zurück."""
+    global _shared_accessor
+    if _shared_accessor is None:
+        _shared_accessor = PageAccessor()
+    return _shared_accessor
@@ -0,0 +1,203 @@
+"""
+Spaltenbasierter Seitenspeicher (Parquet) als Ersatz für die CSV-Übergaben.
+
+Aufbau eines Speicher-Ordners:
+    pages.parquet                  Stammdaten aller Seiten (eine Zeile pro page_id)
+    results/<stufe>/part-*.parquet Ergebnisse einer Stufe, nur angehängt
+
+Jede Stufe liest nur die Spalten, die sie braucht, und hängt ihre Ergebnisse
+als neue Part-Datei an, statt eine große CSV komplett neu zu schreiben. Bei
+mehreren Ergebnissen für dieselbe page_id gewinnt das zuletzt geschriebene.
+"""
+import glob
+import os
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from x00_page_access import page_id_from_row
+
+# Feste Typen für die bekannten Spalten des Seiten-Datasets
+PAGE_DTYPES = {
+    'page_id': 'string',
+    'country': 'category',
+    'supermarket': 'category',
+    'year': 'Int16',
+    'date': 'string',
+    'original_pdf_path': 'string',
+    'file_size': 'Int64',
+    'page_number': 'Int32',
+    'page_index': 'Int32',
+    'page_count': 'Int32',
+    'page_width': 'float32',
+    'page_height': 'float32',
+    'has_text_layer': 'boolean',
+    'page_pdf_path': 'string',
+}
+
+
+NUMERIC_PAGE_COLUMNS = [col for col, dtype in PAGE_DTYPES.items() if dtype.startswith(('Int', 'float'))]
+
+
+def _apply_page_dtypes(df):
+    """
+    Wandelt die bekannten Spalten in ihre festen Typen um.
+
+    Zahlenspalten werden vorher mit pd.to_numeric vereinheitlicht: der
+    inkrementelle Lauf in x01 mischt Zeilen aus der CSV (year = 2025) mit neuen
+    Zeilen (year = '2025'), was astype('Int16') sonst ablehnt.
+    """
+    df = df.copy()
+    for col in NUMERIC_PAGE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    present = {col: dtype for col, dtype in PAGE_DTYPES.items() if col in df.columns}
+    return df.astype(present)
+
+
+class PageStore:
+    """
+    Parquet-Seitenspeicher mit stabiler page_id.
+
+    Args:
+        root (str): Ordner des Speichers (wird bei Bedarf angelegt).
+        compression (str): Parquet-Kompression, z.B. 'zstd' oder 'snappy'.
+    """
+
+    def __init__(self, root, compression='zstd'):
+        self.root = root
+        self.compression = compression
+        os.makedirs(os.path.join(root, 'results'), exist_ok=True)
+
+    @property
+    def pages_path(self):
+        return os.path.join(self.root, 'pages.parquet')
+
+    def _stage_folder(self, stage):
+        return os.path.join(self.root, 'results', stage)
+
+    def _stage_parts(self, stage):
+        # Dateinamen beginnen mit time_ns -> alphabetisch = zeitlich sortiert
+        return sorted(glob.glob(os.path.join(self._stage_folder(stage), 'part-*.parquet')))
+
+    # --- Stammdaten ---------------------------------------------------------
+
+    def write_pages(self, df):
+        """
+        Schreibt die Stammdaten aller Seiten. Fehlt 'page_id', wird sie ergänzt.
+
+        Returns:
+            pd.DataFrame: Die geschriebenen (typisierten) Stammdaten.
+        """
+        df = df.copy()
+        if 'page_id' not in df.columns:
+            df.insert(0, 'page_id', [page_id_from_row(row) for _, row in df.iterrows()])
+        if df['page_id'].duplicated().any():
+            raise ValueError("page_id ist nicht eindeutig – Seiten-Dataset enthält Duplikate.")
+
+        df = _apply_page_dtypes(df)
+        df.to_parquet(self.pages_path, index=False, compression=self.compression)
+        return df
+
+    def read_pages(self, columns=None, page_ids=None):
+        """
+        Liest die Stammdaten, optional nur bestimmte Spalten und Seiten.
+
+        Args:
+            columns (list, optional): Zu lesende Spalten ('page_id' wird immer gelesen).
+            page_ids (iterable, optional): Nur diese Seiten zurückgeben.
+        """
+        if columns is not None and 'page_id' not in columns:
+            columns = ['page_id'] + list(columns)
+        filters = [('page_id', 'in', list(page_ids))] if page_ids is not None else None
+        return pd.read_parquet(self.pages_path, columns=columns, filters=filters)
+
+    # --- Ergebnisse pro Stufe -----------------------------------------------
+
+    def append_results(self, stage, df):
+        """
+        Hängt Ergebnisse einer Stufe als neue Part-Datei an.
+
+        Args:
+            stage (str): Name der Stufe, z.B. 'text' oder 'gemini_2.0_flash'.
+            df (pd.DataFrame): Ergebnisse, muss die Spalte 'page_id' enthalten.
+
+        Returns:
+            str | None: Pfad der geschriebenen Part-Datei (None bei leerem df).
+        """
+        if 'page_id' not in df.columns:
+            raise ValueError("Ergebnisse benötigen eine Spalte 'page_id'.")
+        if df.empty:
+            return None
+
+        folder = self._stage_folder(stage)
+        os.makedirs(folder, exist_ok=True)
+        part_path = os.path.join(folder, f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet")
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        pq.write_table(table, part_path, compression=self.compression)
+        return part_path
+
+    def read_results(self, stage, columns=None):
+        """
+        Liest die Ergebnisse einer Stufe (pro page_id nur das letzte).
+
+        Args:
+            stage (str): Name der Stufe.
+            columns (list, optional): Zu lesende Spalten ('page_id' wird immer gelesen).
+
+        Returns:
+            pd.DataFrame: Ergebnisse, leer wenn die Stufe noch nichts geschrieben hat.
+        """
+        if columns is not None and 'page_id' not in columns:
+            columns = ['page_id'] + list(columns)
+
+        frames = []
+        for part_path in self._stage_parts(stage):
+            part_columns = None
+            if columns is not None:
+                available = pq.read_schema(part_path).names
+                part_columns = [col for col in columns if col in available]
+            frames.append(pq.read_table(part_path, columns=part_columns).to_pandas())
+
+        if not frames:
+            return pd.DataFrame(columns=columns or ['page_id'])
+        results = pd.concat(frames, ignore_index=True)
+        return results.drop_duplicates('page_id', keep='last').reset_index(drop=True)
+
+    def done_page_ids(self, stage):
+        """Menge der page_ids, für die eine Stufe bereits Ergebnisse hat."""
+        return set(self.read_results(stage, columns=['page_id'])['page_id'])
+
+    def compact(self, stage):
+        """Fasst alle Part-Dateien einer Stufe zu einer einzigen zusammen."""
+        old_parts = self._stage_parts(stage)
+        if len(old_parts) <= 1:
+            return
+        merged = self.read_results(stage)
+        self.append_results(stage, merged)
+        for part_path in old_parts:
+            os.remove(part_path)
+
+    def read_joined(self, stage, page_columns=None, result_columns=None):
+        """Stammdaten links mit den Ergebnissen einer Stufe verbunden (über page_id)."""
+        pages = self.read_pages(columns=page_columns)
+        results = self.read_results(stage, columns=result_columns)
+        return pages.merge(results, on='page_id', how='left')
+
+
+if __name__ == '__main__':
+    # Regressionstest: gemischte alte (aus der CSV gelesene) und neue Zeilen schreiben
+    import tempfile
+
+    old_rows = pd.DataFrame({'page_id': ['a'], 'country': ['de'], 'year': [2025], 'page_number': [1]})
+    new_rows = pd.DataFrame({'page_id': ['b'], 'country': ['fr'], 'year': ['2025'], 'page_number': ['2']})
+    with tempfile.TemporaryDirectory() as root:
+        store = PageStore(root)
+        store.write_pages(pd.concat([old_rows, new_rows], ignore_index=True))
+        pages = store.read_pages()
+    assert pages['year'].tolist() == [2025, 2025] and str(pages['year'].dtype) == 'Int16', pages.dtypes
+    assert pages['page_number'].tolist() == [1, 2], pages
+    print("Gemischte Zeilen korrekt geschrieben.")
@@ -0,0 +1,187 @@
+"""
+Gemeinsames Rendern von PDF-Seiten als JPEG mit Festplatten-Cache.
+
+Alle Annotations-Skripte rendern ihre Seiten über render_page_jpeg(). Das
+Ergebnis wird inhaltsadressiert unter einem Schlüssel aus (Seiten-Hash, DPI,
+Farbraum, JPEG-Qualität) abgelegt. Ein zweiter Lauf mit anderem Modell oder
+Prompt über dasselbe Subset rendert dadurch keine Seite neu.
+
+Der Seiten-Hash basiert auf Pfad, Größe und Änderungszeit des Quell-PDFs sowie
+dem Seitenindex. Ändert sich das PDF, ändert sich der Schlüssel automatisch.
+"""
+import hashlib
+import os
+import threading
+from io import BytesIO
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from x00_page_access import get_page_accessor
+
+RENDER_CACHE_DIR = 'render_cache'
+RENDER_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+
+def page_fingerprint(page_ref):
+    """Hash einer Seite aus Pfad, Größe, Änderungszeit des PDFs und Seitenindex."""
+    pdf_path, page_index = page_ref
+    stat = os.stat(pdf_path)
+    key = f"{os.path.abspath(pdf_path)}|{stat.st_size}|{stat.st_mtime_ns}|{page_index}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def render_key(page_ref, dpi, grayscale, quality, clip=None):
+    """Cache-Schlüssel für eine gerenderte Seite (bzw. einen Ausschnitt)."""
+    colorspace = 'gray' if grayscale else 'rgb'
+    key = f"{page_fingerprint(page_ref)}|{dpi}|{colorspace}|{quality}"
+    if clip is not None:
+        key += "|clip=" + ",".join(f"{value:.4f}" for value in clip)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Inhaltsadressierter JPEG-Cache auf der Festplatte mit LRU-Verdrängung.
+
+    Die Zugriffsreihenfolge wird über die Änderungszeit der Dateien geführt
+    (bei jedem Treffer aktualisiert). Überschreitet der Cache max_bytes,
+    werden die am längsten nicht benutzten Einträge gelöscht.
+
+    Args:
+        cache_dir (str): Ordner des Caches.
+        max_bytes (int): Maximale Gesamtgröße in Bytes.
+    """
+
+    def __init__(self, cache_dir=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+    def _entries(self):
+        """(pfad, mtime, größe) aller Cache-Dateien."""
+        entries = []
+        for sub_entry in os.scandir(self.cache_dir):
+            if not sub_entry.is_dir():
+                continue
+            for file_entry in os.scandir(sub_entry.path):
+                if file_entry.name.endswith('.jpg'):
+                    stat = file_entry.stat()
+                    entries.append((file_entry.path, stat.st_mtime_ns, stat.st_size))
+        return entries
+
+    def get(self, key):
+        """Gibt die gecachten JPEG-Bytes zurück oder None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        os.utime(path)  # als zuletzt benutzt markieren
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Legt JPEG-Bytes im Cache ab (atomar) und verdrängt bei Bedarf."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            # Überschreibt put() einen Eintrag, zählt nur die Differenz zur alten Größe
+            try:
+                old_size = os.stat(path).st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Löscht die ältesten Einträge, bis der Cache auf 90 % von max_bytes ist."""
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Treffer, Fehlzugriffe und aktuelle Größe des Caches."""
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self._size}
+
+
+def render_page_uncached(page_ref, dpi, grayscale, quality, clip=None):
+    """Rendert eine Seite (oder den Ausschnitt clip als Seitenanteil) als JPEG-Bytes (ohne Cache)."""
+    page = get_page_accessor().load_page(page_ref)
+    clip_rect = None
+    if clip is not None:
+        rect = page.rect
+        x0, y0, x1, y1 = clip
+        clip_rect = fitz.Rect(rect.x0 + x0 * rect.width, rect.y0 + y0 * rect.height,
+                              rect.x0 + x1 * rect.width, rect.y0 + y1 * rect.height)
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB, clip=clip_rect)
+    img = Image.frombytes("L" if grayscale else "RGB", [pix.width, pix.height], pix.samples)
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+_shared_cache = None
+
+
+def get_render_cache():
+    """Gibt den prozessweit geteilten RenderCache zurück."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = RenderCache()
+    return _shared_cache
+
+
+def configure_render_cache(cache_dir=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES):
+    """Setzt Ordner und Größe des geteilten Caches (z.B. auf Google Drive in Colab)."""
+    global _shared_cache
+    _shared_cache = RenderCache(cache_dir, max_bytes)
+    return _shared_cache
+
+
+def render_page_jpeg(page_ref, dpi=96, grayscale=True, quality=80, cache=None, clip=None):
+    """
+    Rendert eine Seite (pdf_pfad, seitenindex) als JPEG-Bytes, mit Cache.
+
+    Args:
+        page_ref (tuple): Seitenreferenz aus x00_page_access.page_ref_from_row().
+        dpi (int): Auflösung.
+        grayscale (bool): Graustufen statt RGB.
+        quality (int): JPEG-Qualität.
+        cache (RenderCache, optional): Zu verwendender Cache; None = geteilter Cache.
+        clip (tuple, optional): Ausschnitt (x0, y0, x1, y1) als Anteil der Seite (0..1).
+
+    Returns:
+        bytes: Das JPEG-Bild.
+    """
+    cache = cache if cache is not None else get_render_cache()
+    key = render_key(page_ref, dpi, grayscale, quality, clip)
+    data = cache.get(key)
+    if data is None:
+        data = render_page_uncached(page_ref, dpi, grayscale, quality, clip)
+        cache.put(key, data)
+    return data
@@ -0,0 +1,154 @@
+"""
+Absturzsicheres Ergebnis-Journal (JSONL, nur anhängen).
+
+Jede annotierte Seite wird sofort als eine Zeile angehängt:
+
+    {"page_id": "...", "result": {...}, "ts": 1718000000.0}
+
+Die Zeilen werden nach jedem Eintrag geflusht und in Gruppen per fsync auf die
+Platte gebracht (alle fsync_every Einträge oder nach fsync_seconds). Ein
+Absturz kostet damit höchstens die letzten, noch nicht synchronisierten
+Einträge statt bis zu 49 bezahlter Anfragen, und die Kosten pro Eintrag
+wachsen nicht mit der Dateigröße. Die CSV wird erst am Ende einmal aus dem
+Journal bzw. dem DataFrame geschrieben.
+
+Bei mehreren Einträgen für dieselbe page_id gilt der letzte.
+"""
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+
+def journal_path_for(csv_path):
+    """Journal-Pfad neben einer Ergebnis-CSV: 'x.csv' -> 'x.journal.jsonl'."""
+    return os.path.splitext(csv_path)[0] + '.journal.jsonl'
+
+
+def load_journal(path):
+    """
+    Liest ein Journal ein.
+
+    Returns:
+        dict: {page_id: result}, letzter Eintrag gewinnt. Eine abgeschnittene
+            letzte Zeile (Absturz während des Schreibens) wird übersprungen.
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[record['page_id']] = record['result']
+    return results
+
+
+def _ends_without_newline(path):
+    if os.path.getsize(path) == 0:
+        return False
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+
+def completed_page_ids(results):
+    """page_ids mit erfolgreichem Ergebnis (ohne "error") aus load_journal()."""
+    return {page_id for page_id, result in results.items() if not result.get("error")}
+
+
+class ResultJournal:
+    """
+    Schreibt Ergebnisse zeilenweise in ein JSONL-Journal (threadsicher).
+
+    Args:
+        path (str): Pfad der Journal-Datei (wird angelegt oder fortgesetzt).
+        fsync_every (int): fsync nach so vielen Einträgen.
+        fsync_seconds (float): fsync spätestens nach so vielen Sekunden.
+    """
+
+    def __init__(self, path, fsync_every=16, fsync_seconds=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        if _ends_without_newline(path):
+            # Abgeschnittene letzte Zeile eines Absturzes abschließen
+            self._file.write('\n')
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, page_id, result):
+        """Hängt das Ergebnis einer Seite an."""
+        line = json.dumps({'page_id': page_id, 'result': result, 'ts': time.time()},
+                          ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_seconds):
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Erzwingt ein fsync aller bisher geschriebenen Einträge."""
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def apply_results(df, page_ids, results, annotation_cols, error_col=None):
+    """
+    Überträgt Journal-Ergebnisse in einen DataFrame (z.B. vor dem Fortsetzen
+    oder zum Erzeugen der finalen CSV).
+
+    Args:
+        df (pd.DataFrame): Ziel-DataFrame.
+        page_ids (pd.Series): page_id je Zeile von df (gleicher Index).
+        results (dict): {page_id: result} aus load_journal().
+        annotation_cols (list): Zu übertragende Felder.
+        error_col (str, optional): Spalte für Fehlermeldungen.
+
+    Returns:
+        int: Anzahl übertragener Zeilen.
+    """
+    applied = 0
+    for index, page_id in page_ids.items():
+        result = results.get(page_id)
+        if result is None:
+            continue
+        if result.get("error"):
+            if error_col is not None:
+                df.loc[index, error_col] = result["error"]
+        else:
+            if error_col is not None:
+                df.loc[index, error_col] = None
+            for col in annotation_cols:
+                df.loc[index, col] = result.get(col, pd.NA)
+        applied += 1
+    return applied
@@ -0,0 +1,129 @@
+"""
+Streamende Textextraktion mit mehreren Prozessen.
+
+Die Seiten werden nach PDF sortiert in Pakete (chunk_size Seiten) aufgeteilt,
+damit ein Worker ein Dokument nur einmal öffnet. Es sind höchstens
+2 * max_workers Pakete gleichzeitig unterwegs; fertige Pakete werden sofort an
+eine Senke (sink) weitergegeben. Der Speicherbedarf bleibt damit unabhängig von
+der Gesamtzahl der Seiten begrenzt.
+
+Pro Seite entsteht ein Datensatz:
+    key, extracted_text, char_count, n_blocks, n_lines, text_area_share, error
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from x00_page_access import get_page_accessor, page_label
+
+TEXT_RECORD_COLUMNS = ['extracted_text', 'char_count', 'n_blocks', 'n_lines', 'text_area_share', 'error']
+
+
+def extract_page_record(key, page_ref):
+    """
+    Extrahiert Text und Layout-Kennzahlen einer Seite (pdf_pfad, seitenindex).
+
+    Text und Blöcke werden aus derselben TextPage gelesen, die Seite wird also
+    nur einmal analysiert.
+    """
+    try:
+        page = get_page_accessor().load_page(page_ref)
+        textpage = page.get_textpage()
+        text = page.get_text("text", textpage=textpage)
+        blocks = [block for block in page.get_text("blocks", textpage=textpage) if block[6] == 0]
+    except Exception as e:
+        return {'key': key, 'extracted_text': "", 'char_count': 0, 'n_blocks': 0, 'n_lines': 0,
+                'text_area_share': 0.0, 'error': f"{page_label(page_ref)}: {e}"}
+
+    page_area = page.rect.width * page.rect.height
+    block_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1, *_ in blocks)
+    return {
+        'key': key,
+        'extracted_text': text,
+        'char_count': len(text.strip()),
+        'n_blocks': len(blocks),
+        'n_lines': text.count('\n'),
+        'text_area_share': round(block_area / page_area, 4) if page_area else 0.0,
+        'error': None,
+    }
+
+
+def _extract_chunk(chunk):
+    """Worker: extrahiert ein Paket [(key, page_ref), ...]."""
+    return [extract_page_record(key, page_ref) for key, page_ref in chunk]
+
+
+def _make_chunks(items, chunk_size):
+    # Nach PDF und Seite sortieren, damit ein Paket möglichst nur ein Dokument berührt
+    ordered = sorted(items, key=lambda item: (item[1][0], item[1][1]))
+    return [ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size)]
+
+
+def iter_extracted_chunks(items, max_workers=None, chunk_size=64):
+    """
+    Liefert die extrahierten Seiten paketweise, sobald sie fertig sind.
+
+    Args:
+        items (iterable): Paare (key, page_ref), z.B. (page_id, page_ref_from_row(row)).
+        max_workers (int, optional): Anzahl Prozesse (None = alle Kerne, 1 = ohne Pool).
+        chunk_size (int): Seiten pro Paket.
+
+    Yields:
+        list: Datensätze eines Pakets (Reihenfolge der Pakete nicht garantiert).
+    """
+    chunks = _make_chunks(list(items), chunk_size)
+    if max_workers == 1:
+        for chunk in chunks:
+            yield _extract_chunk(chunk)
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    remaining = iter(chunks)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for chunk in remaining:
+            pending.add(executor.submit(_extract_chunk, chunk))
+            if len(pending) >= max_workers * 2:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                next_chunk = next(remaining, None)
+                if next_chunk is not None:
+                    pending.add(executor.submit(_extract_chunk, next_chunk))
+
+
+def extract_texts_to_sink(items, sink, max_workers=None, chunk_size=64, flush_rows=5000, progress=None):
+    """
+    Extrahiert alle Seiten und übergibt sie in DataFrames von höchstens
+    flush_rows Zeilen an sink(df).
+
+    Args:
+        items (iterable): Paare (key, page_ref).
+        sink (callable): Empfängt DataFrames mit der Spalte 'key' und TEXT_RECORD_COLUMNS,
+            z.B. zum Anhängen an den PageStore.
+        max_workers (int, optional): Anzahl Prozesse.
+        chunk_size (int): Seiten pro Paket.
+        flush_rows (int): Maximale Zeilen pro Übergabe an die Senke.
+        progress (callable, optional): progress(n_fertig) nach jedem Paket.
+
+    Returns:
+        dict: pages, errors, chars (Summe der Zeichen).
+    """
+    buffer = []
+    totals = {'pages': 0, 'errors': 0, 'chars': 0}
+    for records in iter_extracted_chunks(items, max_workers=max_workers, chunk_size=chunk_size):
+        buffer.extend(records)
+        totals['pages'] += len(records)
+        totals['errors'] += sum(1 for record in records if record['error'])
+        totals['chars'] += sum(record['char_count'] for record in records)
+        if progress is not None:
+            progress(totals['pages'])
+        if len(buffer) >= flush_rows:
+            sink(pd.DataFrame(buffer))
+            buffer = []
+    if buffer:
+        sink(pd.DataFrame(buffer))
+    return totals
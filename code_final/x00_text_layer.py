@@ -0,0 +1,215 @@
+"""
+Strukturierte Annotation direkt aus der Textebene des PDFs (ohne Modell).
+
+Aus den Wortpositionen von PyMuPDF werden abgeleitet:
+
+    alc          Alkohol-Stichwörter (x00_alcohol_keywords), 2 bei Warnhinweis
+    product      Produktkategorie nach Codebuch
+    reduc        Rabatt-Stichwörter (z.B. "-25%", "statt", "Aktion") oder
+                 Produkte mit zwei Preisen (alter und neuer Preis)
+    child        immer 8 (unklar): Kinderansprache (Süßigkeiten, Comic-Verpackung)
+                 lässt sich aus dem Text nicht beurteilen
+    prod_pp      Anzahl Preis-Cluster: nahe beieinander liegende Preise
+                 gehören zu einem Produkt, Grundpreise ("1 kg = 3,98") zählen
+                 nur, wenn im Cluster kein anderer Preis steht (lose Ware)
+    prod_pp_alc  Preis-Cluster mit Alkohol-Stichwort in der Nähe
+
+Ist die Textebene leer oder das Ergebnis unplausibel (zweifelhafte
+Alkohol-Stichwörter, keine Preise auf einer bildlastigen Seite, Alkohol ohne
+zugehörigen Preis, Flaschengröße oder "% vol" am Preis ohne Stichwort), wird
+die Seite mit Begründung als nicht verwendbar markiert und geht an das
+Vision-Modell.
+"""
+import re
+
+from x00_alcohol_keywords import (AMBIGUOUS_PATTERN, DRINK_HINT_PATTERN, STRONG_PATTERN, WARNING_PATTERN,
+                                  classify_text, has_alcohol_warning, product_category)
+from x00_page_access import get_page_accessor
+
+# Preis mit zwei Nachkommastellen oder "-.99" / "1,-", optional mit Währung
+PRICE_PATTERN = re.compile(
+    r'(?<![\d.,])(?:\d{1,3}[.,]\d{2}|[-–]?[.,]\d{2}|\d{1,3}[.,][-–])(?:\s?(?:€|eur|zł|zl|kč|kc))?'
+    r'(?![\d%]|\s?%|[.,]\d|\s?(?:x|ml|cl|l|kg|g)\b)', re.IGNORECASE)
+# Grundpreis-Angaben im Umfeld eines Preises ("1 kg = 3,98", "je l", "100 g =", "Grundpreis")
+UNIT_PRICE_CONTEXT = re.compile(
+    r'(?:\d\s?(?:kg|g|l|ml|cl)\s?=|je\s?(?:kg|l|100)|/\s?(?:kg|l)\b|grundpreis|prix au (?:kg|litre)|cena za)',
+    re.IGNORECASE)
+DISCOUNT_PATTERN = re.compile(
+    r'(?:[-–]\s?\d{1,2}\s?%|\bstatt\b|\buvp\b|\baktion\b|\brabatt\b|\bsale\b|\bpromo\w*|\bsparen\b|\bgespart\b|'
+    r'\bspare\b|\boffre\b|\bremise\b|\bsoldes?\b|\brabat\w*|\bpromocja\b|\bsleva\b|\bakce\b|\bsoodus\w*)',
+    re.IGNORECASE)
+
+# Abstände relativ zur Seitengröße
+CLUSTER_DX, CLUSTER_DY = 0.12, 0.04       # Preise eines Produkts
+ALCOHOL_DX, ALCOHOL_DY = 0.18, 0.12       # Umfeld eines Preises für Alkohol-Stichwörter
+MIN_CHARS = 50
+MAX_PLAUSIBLE_PRODUCTS = 60
+IMAGE_HEAVY_SHARE = 0.3
+
+
+def _lines(words):
+    """Gruppiert die Wörter aus page.get_text('words') nach (Block, Zeile)."""
+    lines = {}
+    for x0, y0, x1, y1, text, block_no, line_no, _ in words:
+        lines.setdefault((block_no, line_no), []).append((x0, y0, x1, y1, text))
+    return lines.values()
+
+
+def _line_matches(words, pattern):
+    """
+    Sucht ein Muster zeilenweise, auch über Wortgrenzen hinweg ("1,99" "€", "0,7" "l").
+
+    Yields:
+        tuple: (Treffer, Zeilentext, Bounding-Box (x0, y0, x1, y1) des Treffers).
+    """
+    for line_words in _lines(words):
+        text, spans = "", []
+        for x0, y0, x1, y1, word in line_words:
+            start = len(text) + (1 if text else 0)
+            text = f"{text} {word}" if text else word
+            spans.append((start, start + len(word), (x0, y0, x1, y1)))
+        for match in pattern.finditer(text):
+            boxes = [box for start, end, box in spans if start < match.end() and end > match.start()]
+            yield match, text, (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def find_prices(words):
+    """
+    Findet Preise zeilenweise und markiert Grundpreise ("1 kg = 3,98", "je kg").
+
+    Returns:
+        list: (Bounding-Box, ist_grundpreis) je Preis.
+    """
+    prices = []
+    for match, text, box in _line_matches(words, PRICE_PATTERN):
+        context = text[max(0, match.start() - 15):match.end() + 6]
+        prices.append((box, bool(UNIT_PRICE_CONTEXT.search(context))))
+    return prices
+
+
+def drop_unit_prices(clusters):
+    """
+    Entfernt Grundpreise aus Clustern, in denen auch ein Verkaufspreis steht.
+
+    Bei loser Ware ("Bananen 1 kg = 1,29", "Schweinefilet je kg 7,99") ist der
+    Grundpreis der einzige Preis und zählt als Produkt.
+    """
+    kept = []
+    for cluster in clusters:
+        selling = [box for box, is_unit in cluster if not is_unit]
+        kept.append(selling or [box for box, _ in cluster])
+    return kept
+
+
+def _center(box):
+    return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+
+
+def cluster_prices(prices, width, height):
+    """
+    Fasst Preise, die nahe beieinander liegen, zu Produkten zusammen (Union-Find).
+
+    Die Einträge von prices sind (Bounding-Box, ist_grundpreis) aus find_prices().
+    """
+    parent = list(range(len(prices)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    centers = [_center(box) for box, _ in prices]
+    for i in range(len(prices)):
+        for j in range(i + 1, len(prices)):
+            if (abs(centers[i][0] - centers[j][0]) <= CLUSTER_DX * width
+                    and abs(centers[i][1] - centers[j][1]) <= CLUSTER_DY * height):
+                parent[find(i)] = find(j)
+
+    clusters = {}
+    for i, price in enumerate(prices):
+        clusters.setdefault(find(i), []).append(price)
+    return drop_unit_prices(clusters.values())
+
+
+def _near_alcohol(cluster, alcohol_boxes, width, height):
+    cx = sum(_center(box)[0] for box in cluster) / len(cluster)
+    cy = sum(_center(box)[1] for box in cluster) / len(cluster)
+    return any(abs(_center(box)[0] - cx) <= ALCOHOL_DX * width and abs(_center(box)[1] - cy) <= ALCOHOL_DY * height
+               for box in alcohol_boxes)
+
+
+def annotate_from_words(words, width, height, image_share=0.0):
+    """
+    Leitet die Annotation aus Wortpositionen ab.
+
+    Args:
+        words (list): Ergebnis von page.get_text('words').
+        width, height (float): Seitengröße in Punkten.
+        image_share (float): Anteil der Seitenfläche, der von Bildern bedeckt ist.
+
+    Returns:
+        tuple: (annotation dict, Liste der Gründe, warum die Textebene nicht
+            ausreicht; leer = Annotation verwendbar).
+    """
+    text = " ".join(word[4] for word in words)
+    reasons = []
+    if len(text.strip()) < MIN_CHARS:
+        return None, ["missing text layer"]
+
+    # Warnhinweise enthalten selbst "alcool"/"alkohol" und dürfen nicht als Zweifelsfall zählen
+    product_text = WARNING_PATTERN.sub(' ', text)
+    alcohol_class = classify_text(product_text)
+    if AMBIGUOUS_PATTERN.search(product_text):
+        reasons.append(f"ambiguous alcohol terms: {AMBIGUOUS_PATTERN.findall(product_text)[:3]}")
+
+    prices = find_prices(words)
+    clusters = cluster_prices(prices, width, height)
+    alcohol_boxes = [word[:4] for word in words if STRONG_PATTERN.fullmatch(word[4].strip('.,;:!()'))]
+    alcohol_products = sum(1 for cluster in clusters if _near_alcohol(cluster, alcohol_boxes, width, height))
+    # Flaschengröße oder "% vol" neben einem Preis, aber kein Stichwort ("Smirnoff 0,7 l 9,99 €")
+    hint_boxes = [box for _, _, box in _line_matches(words, DRINK_HINT_PATTERN)]
+    hinted_products = sum(1 for cluster in clusters if _near_alcohol(cluster, hint_boxes, width, height))
+
+    alc = 0
+    if alcohol_class == 'positive':
+        alc = 2 if has_alcohol_warning(text) else 1
+    annotation = {
+        'alc': alc,
+        'product': product_category(product_text) if alc else 0,
+        'child': 8,
+        'reduc': int(bool(DISCOUNT_PATTERN.search(text)) or any(len(cluster) > 1 for cluster in clusters)),
+        'prod_pp': len(clusters),
+        'prod_pp_alc': alcohol_products if alc else 0,
+    }
+
+    if not clusters and image_share >= IMAGE_HEAVY_SHARE:
+        reasons.append("no prices on image-heavy page")
+    if len(clusters) > MAX_PLAUSIBLE_PRODUCTS:
+        reasons.append(f"implausible product count {len(clusters)}")
+    if alc and clusters and not alcohol_products:
+        reasons.append("alcohol terms without nearby price")
+    if not alc and hinted_products:
+        reasons.append("possible alcohol without keyword")
+    return annotation, reasons
+
+
+def annotate_page_text_layer(page_ref):
+    """
+    Annotiert eine Seite (pdf_pfad, seitenindex) allein über die Textebene.
+
+    Returns:
+        tuple: (annotation oder None, Liste der Gründe für die Vision-Annotation).
+    """
+    try:
+        page = get_page_accessor().load_page(page_ref)
+        words = page.get_text("words")
+        rect = page.rect
+        page_area = rect.width * rect.height
+        image_area = sum(abs(info['bbox'][2] - info['bbox'][0]) * abs(info['bbox'][3] - info['bbox'][1])
+                         for info in page.get_image_info())
+    except Exception as e:
+        return None, [f"text layer failed: {e}"]
+    image_share = min(1.0, image_area / page_area) if page_area else 0.0
+    return annotate_from_words(words, rect.width, rect.height, image_share)
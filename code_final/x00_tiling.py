@@ -0,0 +1,246 @@
+"""
+Kachelung dichter Prospektseiten für die Bild-Annotation.
+
+Eine Seite wird in ein Raster überlappender Kacheln zerlegt (z.B. 2x2 mit 8 %
+Überlappung). Die Kacheln werden wie eigene Seiten nebenläufig annotiert und
+danach wieder zu einem Seitenergebnis zusammengeführt:
+
+    Flags (alc, warning, reduc, child)  -> 1, sobald eine Kachel 1 meldet
+    product (Kategorie 1-4)             -> eine Kategorie bzw. 4 bei mehreren
+    Zählwerte (prod_pp, prod_alc)       -> Produkte im eigenen Bereich jeder Kachel
+
+Produkte im Überlappungsbereich sieht mehr als eine Kachel. Jede Kachel meldet
+deshalb zusätzlich die Mittelpunkte ihrer Produkte ('products', Koordinaten
+relativ zur Kachel), und es zählen nur Produkte, deren Mittelpunkt in der
+Rasterzelle der Kachel liegt. Jedes Produkt wird so genau einmal gezählt.
+Meldet eine Kachel keine Positionen, geht ihr Zählwert unverändert ein.
+"""
+import time
+
+import pandas as pd
+
+from x00_page_access import AnnotationJob
+
+COUNT_FIELDS = ('prod_pp', 'prod_alc')
+CATEGORY_FIELDS = ('product',)
+SPECIAL_VALUES = (98, 99)
+MIXED_PRODUCT_CATEGORY = 4
+
+POSITIONS_FIELD = 'products'
+
+TILE_PROMPT_NOTE = (
+    "\n\nNOTE: The image shows only one section (tile) of a brochure page. "
+    "Classify and count only what is visible in this section. "
+    "Additionally return a key \"products\" with one entry per counted product with price: "
+    "{\"x\": <centre x>, \"y\": <centre y>, \"alc\": <1 if alcoholic else 0>}, "
+    "where x and y are fractions (0-1) of this section's width and height."
+)
+
+
+def tile_clips(grid=(2, 2), overlap=0.08):
+    """
+    Berechnet die Kachel-Ausschnitte als Seitenanteile (x0, y0, x1, y1).
+
+    Args:
+        grid (tuple): (zeilen, spalten).
+        overlap (float): Überlappung benachbarter Kacheln als Anteil der Seite.
+    """
+    rows, cols = grid
+    clips = []
+    for row in range(rows):
+        for col in range(cols):
+            clips.append((
+                max(0.0, col / cols - overlap / 2), max(0.0, row / rows - overlap / 2),
+                min(1.0, (col + 1) / cols + overlap / 2), min(1.0, (row + 1) / rows + overlap / 2),
+            ))
+    return clips
+
+
+def tile_owned_regions(grid=(2, 2)):
+    """
+    Rasterzelle jeder Kachel (x0, y0, x1, y1) ohne Überlappung, in Reihenfolge von tile_clips().
+
+    Die Zellen zerlegen die Seite lückenlos; jeder Punkt gehört genau einer Kachel.
+    """
+    return tile_clips(grid, overlap=0.0)
+
+
+def _owns(region, x, y):
+    # Halboffene Zellen, an den Seitenrändern geschlossen
+    return ((region[0] <= x < region[2] or x == region[2] == 1.0)
+            and (region[1] <= y < region[3] or y == region[3] == 1.0))
+
+
+def owned_counts(result, clip, region):
+    """
+    Zählt die Produkte einer Kachel, deren Mittelpunkt in ihrer Rasterzelle liegt.
+
+    Args:
+        result (dict): Kachelergebnis mit 'products' ([{"x", "y", "alc"}, ...] relativ zur Kachel).
+        clip (tuple): Ausschnitt der Kachel aus tile_clips().
+        region (tuple): Rasterzelle der Kachel aus tile_owned_regions().
+
+    Returns:
+        dict | None: {'prod_pp': n, 'prod_alc': n_alkohol}; None ohne gültige Positionen.
+    """
+    products = result.get(POSITIONS_FIELD)
+    if not isinstance(products, list):
+        return None
+    counts = {'prod_pp': 0, 'prod_alc': 0}
+    for product in products:
+        if not isinstance(product, dict):
+            return None
+        x, y = _numeric(product.get('x')), _numeric(product.get('y'))
+        if x is None or y is None:
+            return None
+        page_x = clip[0] + min(max(x, 0.0), 1.0) * (clip[2] - clip[0])
+        page_y = clip[1] + min(max(y, 0.0), 1.0) * (clip[3] - clip[1])
+        if _owns(region, page_x, page_y):
+            counts['prod_pp'] += 1
+            counts['prod_alc'] += int(_numeric(product.get('alc')) == 1)
+    return counts
+
+
+def tile_dpi(dpi, grid):
+    """Render-DPI der Kacheln: jede Kachel bekommt etwa die Pixelzahl einer ganzen Seite."""
+    return int(dpi * max(grid))
+
+
+def _numeric(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def merge_tile_results(tile_results, clips, regions):
+    """
+    Führt die Ergebnisse aller Kacheln einer Seite zusammen.
+
+    Args:
+        tile_results (list): Ergebnis-Dicts der Kacheln (in Reihenfolge von tile_clips()).
+        clips (list): Ausschnitte aus tile_clips().
+        regions (list): Rasterzellen aus tile_owned_regions().
+
+    Returns:
+        dict: Seitenergebnis; {"error": ...}, wenn keine Kachel ein Ergebnis lieferte.
+    """
+    valid = []
+    for result, clip, region in zip(tile_results, clips, regions):
+        if not isinstance(result, dict) or result.get("error"):
+            continue
+        # Zählwerte aus den Positionen ersetzen die gemeldeten Zählwerte der Kachel
+        owned = owned_counts(result, clip, region)
+        result = {field: value for field, value in result.items() if field != POSITIONS_FIELD}
+        if owned is not None:
+            result.update(owned)
+        valid.append(result)
+    if not valid:
+        errors = [result.get("error") for result in tile_results if isinstance(result, dict)]
+        return {"error": f"All tiles failed: {errors[0] if errors else 'no result'}"}
+
+    merged = {}
+    fields = {field for result in valid for field in result}
+    for field in fields:
+        values = [_numeric(result.get(field)) for result in valid]
+        known = [value for value in values if value is not None and value not in SPECIAL_VALUES]
+        if not known:
+            # Keine Kachel sicher: 99 (unsicher) vor 98 (fehlerhaft) übernehmen
+            specials = [value for value in values if value in SPECIAL_VALUES]
+            merged[field] = int(max(specials)) if specials else None
+        elif field in COUNT_FIELDS:
+            merged[field] = int(round(sum(known)))
+        elif field in CATEGORY_FIELDS:
+            categories = {int(value) for value in known if value > 0}
+            if not categories:
+                merged[field] = 0
+            elif len(categories) == 1:
+                merged[field] = categories.pop()
+            else:
+                merged[field] = MIXED_PRODUCT_CATEGORY
+        else:
+            merged[field] = int(max(known))
+    return merged
+
+
+def make_tile_jobs(job, clips, prompt_note=TILE_PROMPT_NOTE):
+    """Zerlegt einen Seiten-Job in Kachel-Jobs mit Schlüssel (seiten_key, kachel_nr)."""
+    return [AnnotationJob((job.key, tile_no), job.prompt + prompt_note, job.page_ref, clip)
+            for tile_no, clip in enumerate(clips)]
+
+
+def annotate_tiled(jobs, run_fn, grid=(2, 2), overlap=0.08, on_result=None):
+    """
+    Annotiert Seiten kachelweise und liefert zusammengeführte Seitenergebnisse.
+
+    Args:
+        jobs (list): Seiten-Jobs (AnnotationJob).
+        run_fn (callable): run_fn(tile_jobs, on_tile_result) -> (Ergebnisse, Statistik),
+            z.B. annotate_jobs() oder GeminiRunner.run().
+        grid (tuple): (zeilen, spalten).
+        overlap (float): Überlappung als Anteil der Seite.
+        on_result (callable, optional): on_result(seiten_key, ergebnis), sobald
+            alle Kacheln einer Seite fertig sind.
+
+    Returns:
+        tuple: ({seiten_key: ergebnis}, Statistik von run_fn).
+    """
+    clips = tile_clips(grid, overlap)
+    regions = tile_owned_regions(grid)
+    tile_jobs = [tile_job for job in jobs for tile_job in make_tile_jobs(job, clips)]
+    pending = {job.key: [None] * len(clips) for job in jobs}
+    remaining = {job.key: len(clips) for job in jobs}
+    results = {}
+
+    def on_tile_result(tile_key, result):
+        page_key, tile_no = tile_key
+        pending[page_key][tile_no] = result
+        remaining[page_key] -= 1
+        if remaining[page_key] == 0:
+            results[page_key] = merge_tile_results(pending.pop(page_key), clips, regions)
+            if on_result is not None:
+                on_result(page_key, results[page_key])
+
+    _, stats = run_fn(tile_jobs, on_tile_result)
+    return results, stats
+
+
+def tiling_comparison_report(df, variants, fields):
+    """
+    Latenz und Genauigkeit mehrerer Varianten (z.B. ganze Seite vs. Kacheln)
+    gegen die Goldstandard-Spalten ('<feld>_gold') in df.
+
+    Args:
+        df (pd.DataFrame): Subset mit Goldstandard; Ergebnisse sind über df.index verschlüsselt.
+        variants (dict): {name: (ergebnisse, sekunden)}.
+        fields (list): Auszuwertende Felder.
+
+    Returns:
+        pd.DataFrame: Eine Zeile pro Variante mit Sekunden pro Seite, Trefferquote
+            der Flags/Kategorien und MAE der Zählwerte.
+    """
+    rows = []
+    for name, (results, seconds) in variants.items():
+        row = {'variante': name, 'seiten': len(results), 'sekunden': round(seconds, 1),
+               'sek_pro_seite': round(seconds / len(results), 2) if results else float('nan')}
+        for field in fields:
+            gold_col = f"{field}_gold"
+            if gold_col not in df.columns:
+                continue
+            gold = pd.to_numeric(df[gold_col], errors='coerce')
+            pred = pd.to_numeric(pd.Series({index: (results.get(index) or {}).get(field) for index in df.index},
+                                           dtype='object'), errors='coerce')
+            valid = gold.notna() & ~gold.isin(SPECIAL_VALUES) & pred.notna()
+            if field in COUNT_FIELDS:
+                row[f'mae_{field}'] = round(float((pred[valid] - gold[valid]).abs().mean()), 3)
+            else:
+                row[f'acc_{field}'] = round(float((pred[valid] == gold[valid]).mean()), 4)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def timed(run, *args, **kwargs):
+    """Führt run(*args, **kwargs) aus und gibt (rückgabewert, sekunden) zurück."""
+    started = time.perf_counter()
+    value = run(*args, **kwargs)
+    return value, time.perf_counter() - started
@@ -6,9 +6,18 @@ Created on Sun Aug 31 10:56:13 2025
 @author: merlin
 """
 import os
+import hashlib
 import pandas as pd
 import fitz  # PyMuPDF
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from x00_page_access import make_page_id
+from x00_page_store import PageStore
+
+def _sorted_scandir(folder):
+    """Listet die Einträge eines Ordners per os.scandir, sortiert nach Namen."""
+    with os.scandir(folder) as entries:
+        return sorted(entries, key=lambda entry: entry.name)
 
 def create_dataset_from_specific_structure(root_folder, output_csv_path):
     """
@@ -24,47 +33,52 @@ def create_dataset_from_specific_structure(root_folder, output_csv_path):
     metadata_list = []
     
     # Ebene 1: Länder (z.B. fr, de)
-    for country_code in os.listdir(root_folder):
-        country_path = os.path.join(root_folder, country_code)
-        
-        if os.path.isdir(country_path):
-            # Ebene 2: Supermärkte (z.B. auchan, lidl)
-            for supermarket_name in os.listdir(country_path):
-                supermarket_path = os.path.join(country_path, supermarket_name)
-                
-                if os.path.isdir(supermarket_path):
-                    # Ebene 3: PDF-Dateien
-                    for filename in os.listdir(supermarket_path):
-                        if filename.lower().endswith('.pdf'):
-                            file_path = os.path.join(supermarket_path, filename)
-                            
-                            # Extrahiere Metadaten aus dem Dateinamen
-                            base_name = os.path.splitext(filename)[0]
-                            parts = base_name.split('_')
-                            
-                            # Validierung des Dateinamenschemas
-                            if len(parts) >= 3:
-                                date_stamp = parts[-1]
-                                
-                                if len(date_stamp) == 4 and date_stamp.isdigit():
-                                    day = date_stamp[:2]
-                                    month = date_stamp[2:]
-                                    year = '2025' # Festes Jahr
-                                    
-                                    date_str = f"{year}-{month}-{day}"
-                                    
-                                    metadata = {
-                                        'country': country_code,
-                                        'supermarket': supermarket_name,
-                                        'year': year,
-                                        'date': date_str,
-                                        'original_pdf_path': file_path
-                                    }
-                                    metadata_list.append(metadata)
-                                else:
-                                    print(f"Warnung: Datumsstempel im Dateinamen '{filename}' hat nicht das Format 'TTMM'.")
-                            else:
-                                print(f"Warnung: Dateiname '{filename}' entspricht nicht dem Schema 'name_land_TTMM.pdf'.")
+    for country_entry in _sorted_scandir(root_folder):
+        if not country_entry.is_dir():
+            continue
+        country_code = country_entry.name
+
+        # Ebene 2: Supermärkte (z.B. auchan, lidl)
+        for supermarket_entry in _sorted_scandir(country_entry.path):
+            if not supermarket_entry.is_dir():
+                continue
+            supermarket_name = supermarket_entry.name
+
+            # Ebene 3: PDF-Dateien
+            for file_entry in _sorted_scandir(supermarket_entry.path):
+                filename = file_entry.name
+                if not (file_entry.is_file() and filename.lower().endswith('.pdf')):
+                    continue
+
+                # Extrahiere Metadaten aus dem Dateinamen
+                base_name = os.path.splitext(filename)[0]
+                parts = base_name.split('_')
+
+                # Validierung des Dateinamenschemas
+                if len(parts) >= 3:
+                    date_stamp = parts[-1]
+
+                    if len(date_stamp) == 4 and date_stamp.isdigit():
+                        day = date_stamp[:2]
+                        month = date_stamp[2:]
+                        year = '2025' # Festes Jahr
+
+                        date_str = f"{year}-{month}-{day}"
+
+                        metadata = {
+                            'country': country_code,
+                            'supermarket': supermarket_name,
+                            'year': int(year),
+                            'date': date_str,
+                            'original_pdf_path': file_entry.path,
+                            # Dateigröße direkt beim Durchlauf erfassen (kein zweiter Scan nötig)
+                            'file_size': file_entry.stat().st_size
+                        }
+                        metadata_list.append(metadata)
+                    else:
+                        print(f"Warnung: Datumsstempel im Dateinamen '{filename}' hat nicht das Format 'TTMM'.")
+                else:
+                    print(f"Warnung: Dateiname '{filename}' entspricht nicht dem Schema 'name_land_TTMM.pdf'.")
 
     if not metadata_list:
         print("Warnung: Keine PDFs gefunden, die dem Schema entsprechen.")
@@ -75,53 +89,247 @@ def create_dataset_from_specific_structure(root_folder, output_csv_path):
     print(f"Initiales Dataset wurde unter {output_csv_path} gespeichert.")
     return df
 
-def split_pdfs_into_pages(metadata_csv_path, output_folder):
+def _split_single_pdf(task):
+    """
+    Worker für den Prozess-Pool: teilt eine einzelne PDF in Einzelseiten auf.
+
+    Im selben Durchlauf werden Seitenanzahl, Seitengröße (in pt) und das
+    Vorhandensein einer Textebene erfasst, damit die PDFs dafür nicht ein
+    zweites Mal gelesen werden müssen.
+
+    Args:
+        task (tuple): (index, row_dict, output_folder, write_pages) – Index der
+            Zeile im Metadaten-Dataset, die Metadaten der PDF, der Zielordner
+            und ob Einzelseiten-PDFs geschrieben werden sollen.
+
+    Returns:
+        tuple: (index, seiten_metadaten, fehler). Bei einem Fehler ist die
+            Seitenliste leer und 'fehler' enthält die Fehlermeldung, sonst None.
+    """
+    index, row_dict, output_folder, write_pages = task
+    original_path = row_dict['original_pdf_path']
+    base_filename = os.path.splitext(os.path.basename(original_path))[0]
+    pages = []
+
+    try:
+        with fitz.open(original_path) as doc:
+            page_count = len(doc)
+            for page_num in range(page_count):
+                page = doc.load_page(page_num)
+                page_metadata = {'page_id': make_page_id(original_path, page_num)}
+                page_metadata.update(row_dict)
+                page_metadata['page_number'] = page_num + 1
+                page_metadata['page_index'] = page_num
+                page_metadata['page_count'] = page_count
+                page_metadata['page_width'] = round(page.rect.width, 2)
+                page_metadata['page_height'] = round(page.rect.height, 2)
+                page_metadata['has_text_layer'] = bool(page.get_text("text").strip())
+
+                if write_pages:
+                    output_filename = f"{base_filename}_page_{page_num + 1}.pdf"
+                    output_path = os.path.join(output_folder, output_filename)
+
+                    with fitz.open() as new_doc:
+                        new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+                        new_doc.save(output_path)
+                    page_metadata['page_pdf_path'] = output_path
+                else:
+                    page_metadata['page_pdf_path'] = None
+
+                pages.append(page_metadata)
+    except Exception as e:
+        return index, [], f"{original_path}: {e}"
+
+    return index, pages, None
+
+def split_pdfs_into_pages(metadata_csv_path, output_folder, max_workers=None, write_pages=True):
     """
     Liest ein Dataset mit PDF-Pfaden, teilt jede PDF in einzelne Seiten auf
     und erstellt ein neues Dataset, das alle Metadaten enthält.
 
+    Die Prospekte werden in einem Prozess-Pool parallel aufgeteilt. Die Zeilen
+    des Ergebnisses sind unabhängig von der Anzahl der Prozesse immer gleich
+    sortiert (Reihenfolge des Metadaten-Datasets, dann Seitennummer).
+
+    Mit write_pages=False ("virtueller Split") werden keine Einzelseiten-PDFs
+    geschrieben. Jede Seite wird dann nur über 'original_pdf_path' und
+    'page_index' referenziert und über x00_page_access geladen.
+
     Args:
         metadata_csv_path (str): Pfad zur CSV-Datei aus Schritt 1.
         output_folder (str): Ordner zum Speichern der einzelnen PDF-Seiten.
-        
+        max_workers (int, optional): Anzahl der Prozesse. None = alle Kerne,
+            1 = sequenziell im aktuellen Prozess.
+        write_pages (bool): Einzelseiten-PDFs auf die Festplatte schreiben.
+
     Returns:
-        pd.DataFrame: Ein DataFrame mit den Metadaten der einzelnen Seiten.
+        tuple: (pd.DataFrame mit den Metadaten der einzelnen Seiten,
+                Liste der Fehlermeldungen pro fehlgeschlagener PDF).
     """
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-        
     df = pd.read_csv(metadata_csv_path)
-    split_pages_data = []
-    
-    for index, row in df.iterrows():
-        original_path = row['original_pdf_path']
-        
-        try:
-            doc = fitz.open(original_path)
-            for page_num in range(len(doc)):
-                new_doc = fitz.open()
-                new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
-                
-                base_filename = os.path.splitext(os.path.basename(original_path))[0]
-                output_filename = f"{base_filename}_page_{page_num + 1}.pdf"
-                output_path = os.path.join(output_folder, output_filename)
-                
-                new_doc.save(output_path)
-                new_doc.close()
-                
-                page_metadata = row.to_dict()
-                page_metadata['page_number'] = page_num + 1
-                page_metadata['page_pdf_path'] = output_path
-                split_pages_data.append(page_metadata)
-            doc.close()
-        except Exception as e:
-            print(f"Fehler bei der Verarbeitung von {original_path}: {e}")
-            
-    split_df = pd.DataFrame(split_pages_data)
+    split_df, errors, _ = _split_metadata_frame(df, output_folder, max_workers, write_pages)
+
     output_csv_path = 'split_pages_dataset.csv'
     split_df.to_csv(output_csv_path, index=False)
     print(f"Dataset der Einzelseiten wurde unter {output_csv_path} gespeichert.")
-    return split_df
+    return split_df, errors
+
+def _split_metadata_frame(df, output_folder, max_workers, write_pages):
+    """
+    Teilt alle PDFs eines Metadaten-DataFrames auf (siehe split_pdfs_into_pages).
+
+    Returns:
+        tuple: (DataFrame der Einzelseiten, Liste der Fehlermeldungen,
+                Menge der PDF-Pfade, die nicht aufgeteilt werden konnten).
+    """
+    if write_pages and not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    tasks = [(index, row.to_dict(), output_folder, write_pages) for index, row in df.iterrows()]
+
+    if max_workers == 1:
+        results = [_split_single_pdf(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # map() liefert die Ergebnisse in Eingabereihenfolge -> deterministisch
+            results = list(executor.map(_split_single_pdf, tasks))
+
+    split_pages_data = []
+    errors = []
+    failed_paths = set()
+    for index, pages, error in sorted(results, key=lambda result: result[0]):
+        split_pages_data.extend(pages)
+        if error is not None:
+            errors.append(error)
+            failed_paths.add(df.loc[index, 'original_pdf_path'])
+
+    return pd.DataFrame(split_pages_data), errors, failed_paths
+
+# --- Inkrementeller Aufbau ---
+MANIFEST_COLUMNS = ['original_pdf_path', 'size', 'mtime', 'sha256']
+
+def file_content_hash(file_path, chunk_size=1024 * 1024):
+    """Berechnet den SHA-256-Hash einer Datei blockweise."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """Lädt das Manifest als Dict {pfad: eintrag}. Fehlt es, ist es leer."""
+    if not os.path.exists(manifest_path):
+        return {}
+    # round_trip: mtime muss exakt dem gespeicherten Float entsprechen
+    manifest_df = pd.read_csv(manifest_path, float_precision='round_trip')
+    return {row['original_pdf_path']: row for row in manifest_df.to_dict('records')}
+
+def save_manifest(manifest, manifest_path):
+    """Speichert das Manifest als CSV (sortiert nach Pfad)."""
+    manifest_df = pd.DataFrame(list(manifest.values()), columns=MANIFEST_COLUMNS)
+    manifest_df.sort_values('original_pdf_path').to_csv(manifest_path, index=False)
+
+def detect_changed_brochures(paths, manifest):
+    """
+    Vergleicht die gefundenen PDFs mit dem Manifest.
+
+    Größe und Änderungszeit werden zuerst verglichen; nur wenn sie abweichen,
+    wird der Inhalts-Hash berechnet. Eine nur "berührte" Datei mit gleichem
+    Inhalt gilt daher nicht als geändert.
+
+    Args:
+        paths (list): Pfade der aktuell gefundenen PDFs.
+        manifest (dict): Manifest aus load_manifest().
+
+    Returns:
+        tuple: (Menge der neuen/geänderten Pfade, Dict mit den aktualisierten
+                Manifest-Einträgen aller gefundenen Pfade).
+    """
+    changed = set()
+    entries = {}
+    for path in paths:
+        stat = os.stat(path)
+        entry = {'original_pdf_path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': None}
+        known = manifest.get(path)
+
+        if known is not None and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            entry['sha256'] = known['sha256']
+        else:
+            entry['sha256'] = file_content_hash(path)
+            if known is None or known['sha256'] != entry['sha256']:
+                changed.add(path)
+        entries[path] = entry
+    return changed, entries
+
+# Zahlenspalten, die beim Zusammenführen von CSV-Zeilen und neuen Zeilen denselben Typ haben müssen
+NUMERIC_SPLIT_COLUMNS = ['year', 'file_size', 'page_number', 'page_index', 'page_count']
+
+def _normalize_split_dtypes(df):
+    """Vereinheitlicht die Zahlenspalten (CSV liefert int/float, neue Zeilen evtl. Strings)."""
+    for col in NUMERIC_SPLIT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+    return df
+
+def update_split_dataset_incrementally(root_folder, metadata_csv_path, split_csv_path, output_folder,
+                                       manifest_path='brochure_manifest.csv', max_workers=None,
+                                       write_pages=True, metadata_df=None):
+    """
+    Aktualisiert das Seiten-Dataset inkrementell anhand eines Manifests
+    (Pfad, Größe, Änderungszeit, SHA-256).
+
+    Nur neue oder inhaltlich geänderte Prospekte werden aufgeteilt; Seiten von
+    gelöschten Prospekten werden entfernt. Unveränderte Prospekte werden
+    übersprungen. PDFs, deren Aufteilung fehlschlägt, werden nicht ins
+    Manifest übernommen und beim nächsten Lauf erneut versucht.
+
+    Args:
+        root_folder (str): Hauptordner mit der Länder/Supermarkt-Struktur.
+        metadata_csv_path (str): Pfad für das initiale Dataset (Schritt 1).
+        split_csv_path (str): Pfad des bestehenden/neuen Seiten-Datasets.
+        output_folder (str): Ordner für die Einzelseiten-PDFs.
+        manifest_path (str): Pfad der Manifest-CSV.
+        max_workers (int, optional): Anzahl der Prozesse für das Aufteilen.
+        write_pages (bool): Einzelseiten-PDFs schreiben (False = virtueller Split).
+        metadata_df (pd.DataFrame, optional): Bereits erstelltes initiales Dataset
+            (Schritt 1); None = Ordnerstruktur hier neu durchlaufen.
+
+    Returns:
+        tuple: (pd.DataFrame des vollständigen Seiten-Datasets,
+                Liste der Fehlermeldungen).
+    """
+    if metadata_df is None:
+        metadata_df = create_dataset_from_specific_structure(root_folder, metadata_csv_path)
+    if metadata_df.empty:
+        return pd.DataFrame(), []
+
+    manifest = load_manifest(manifest_path)
+    changed, entries = detect_changed_brochures(metadata_df['original_pdf_path'].tolist(), manifest)
+    removed = set(manifest) - set(entries)
+    print(f"Inkrementeller Lauf: {len(changed)} neue/geänderte, {len(removed)} entfernte, "
+          f"{len(entries) - len(changed)} unveränderte Prospekte.")
+
+    if os.path.exists(split_csv_path) and manifest:
+        existing_df = pd.read_csv(split_csv_path)
+        existing_df = existing_df[~existing_df['original_pdf_path'].isin(changed | removed)]
+    else:
+        # Ohne Manifest ist unbekannt, welche Seiten aktuell sind -> alles neu aufteilen
+        existing_df = pd.DataFrame()
+        changed = set(entries)
+
+    to_split = metadata_df[metadata_df['original_pdf_path'].isin(changed)].reset_index(drop=True)
+    new_df, errors, failed_paths = _split_metadata_frame(to_split, output_folder, max_workers, write_pages)
+
+    split_df = _normalize_split_dtypes(pd.concat([existing_df, new_df], ignore_index=True))
+    if not split_df.empty:
+        split_df = split_df.sort_values(['original_pdf_path', 'page_number']).reset_index(drop=True)
+    split_df.to_csv(split_csv_path, index=False)
+
+    for path in failed_paths:
+        entries.pop(path, None)
+    save_manifest(entries, manifest_path)
+    print(f"Dataset der Einzelseiten wurde unter {split_csv_path} aktualisiert ({len(new_df)} neue Seiten).")
+    return split_df, errors
 
 def create_shuffled_subsets(full_dataset_path, subset_size, subsets_output_folder):
     """
@@ -166,9 +374,39 @@ if __name__ == "__main__":
         
         # 2. Teile die PDFs in einzelne Seiten auf
         SPLIT_PAGES_FOLDER = 'split_pages_v02'
-        split_df = split_pdfs_into_pages(OUTPUT_METADATA_CSV, SPLIT_PAGES_FOLDER)
+        WRITE_SINGLE_PAGE_PDFS = False # False = virtueller Split über (original_pdf_path, page_index)
+        INCREMENTAL = True # True = nur neue/geänderte Prospekte aufteilen (Manifest)
+        if INCREMENTAL:
+            split_df, split_errors = update_split_dataset_incrementally(
+                ROOT_BROCHURES_FOLDER, OUTPUT_METADATA_CSV, 'split_pages_dataset.csv',
+                SPLIT_PAGES_FOLDER, write_pages=WRITE_SINGLE_PAGE_PDFS, metadata_df=initial_df)
+        else:
+            split_df, split_errors = split_pdfs_into_pages(OUTPUT_METADATA_CSV, SPLIT_PAGES_FOLDER,
+                                                           write_pages=WRITE_SINGLE_PAGE_PDFS)
+        if split_errors:
+            print(f"\nWarnung: {len(split_errors)} PDF(s) konnten nicht aufgeteilt werden:")
+            for error in split_errors:
+                print(f"  - {error}")
         print("\nDie ersten Zeilen des Datasets der Einzelseiten:")
         print(split_df.head())
+
+        # Stammdaten zusätzlich in den Parquet-Seitenspeicher schreiben
+        PAGE_STORE_DIR = 'page_store'
+        if not split_df.empty:
+            PageStore(PAGE_STORE_DIR).write_pages(split_df)
+            print(f"Seitenspeicher (Parquet) wurde unter {PAGE_STORE_DIR} aktualisiert.")
+
+        # Seitenanzahl pro Prospekt aus dem Split übernehmen (ersetzt x01.2); Zeilen aus älteren
+        # CSVs ohne 'page_count' zählen ihre Seitenzeilen, fehlende Prospekte bleiben leer
+        if not split_df.empty:
+            OUTPUT_METADATA_WITH_PAGES_CSV = 'initial_dataset_new_v03.csv'
+            pages_per_pdf = split_df.groupby('original_pdf_path')
+            page_counts = pages_per_pdf.size()
+            if 'page_count' in split_df.columns:
+                page_counts = pages_per_pdf['page_count'].max().fillna(page_counts)
+            initial_df['seitenanzahl'] = initial_df['original_pdf_path'].map(page_counts).astype('Int64')
+            initial_df.to_csv(OUTPUT_METADATA_WITH_PAGES_CSV, index=False)
+            print(f"Initiales Dataset mit Seitenanzahl wurde unter {OUTPUT_METADATA_WITH_PAGES_CSV} gespeichert.")
         
         # 3. Teile alle Seiten in gemischte Subsets auf
         SUBSETS_OUTPUT_FOLDER = 'subsets_for_annotation'
@@ -1,8 +1,11 @@
 import pandas as pd
 import subprocess
 import os
+import tempfile
 import time
 
+from x00_page_access import get_page_accessor, page_ref_from_row
+
 # --- Konfiguration ---
 # Gib hier den Pfad zu dem Subset an, das du annotieren möchtest.
 CSV_FILE_TO_ANNOTATE = 'subsets_for_annotation/subset_3.csv'
@@ -58,75 +61,113 @@ def start_annotation_session(df, csv_file):
             if user_choice != 'j':
                 continue
 
-        pdf_path = row['page_pdf_path']
-        print(f"\n--- Seite {index + 1}/{len(df)}: {os.path.basename(pdf_path)} ---")
+        # Virtueller Split: ohne Einzelseiten-PDF wird die Seite in eine temporäre PDF geschrieben
+        pdf_path = row.get('page_pdf_path')
+        temp_path = None
+        if not isinstance(pdf_path, str) or not pdf_path:
+            source_path = row['original_pdf_path']
+            print(f"\n--- Seite {index + 1}/{len(df)}: {os.path.basename(source_path)} (Prospektseite {int(row['page_index']) + 1}) ---")
+            if not os.path.exists(source_path):
+                print(f"FEHLER: PDF nicht gefunden: {source_path}. Überspringe.")
+                continue
+            fd, temp_path = tempfile.mkstemp(suffix=f"_page_{int(row['page_index']) + 1}.pdf")
+            os.close(fd)
+            get_page_accessor().export_page(page_ref_from_row(row), temp_path)
+            pdf_path = temp_path
+        else:
+            print(f"\n--- Seite {index + 1}/{len(df)}: {os.path.basename(pdf_path)} ---")
 
         if not os.path.exists(pdf_path):
             print(f"FEHLER: PDF nicht gefunden: {pdf_path}. Überspringe.")
             continue
 
-        # PDF öffnen
         try:
-            if os.name == 'posix':  # macOS oder Linux
-                subprocess.Popen(['xdg-open', pdf_path])
-            elif os.name == 'nt':  # Windows
-                os.startfile(pdf_path)
-        except Exception as e:
-            print(f"FEHLER beim Öffnen der PDF: {e}")
-            continue
+            if not annotate_page(df, index, csv_file, pdf_path):
+                return
+        finally:
+            if temp_path is not None:
+                _remove_temp_file(temp_path)
+
+    print("\nAlle Seiten in diesem Subset wurden bearbeitet.")
 
-        annotations = {}
-        current_col_idx = 0
+
+def _remove_temp_file(path):
+    """Löscht die temporäre Einzelseiten-PDF (unter Windows evtl. noch vom Viewer geöffnet)."""
+    try:
+        os.remove(path)
+    except OSError as e:
+        print(f"WARNUNG: Temporäre PDF {path} konnte nicht gelöscht werden: {e}")
+
+
+def annotate_page(df, index, csv_file, pdf_path):
+    """
+    Öffnet eine Seite und fragt die Gold-Standard-Werte ab.
+
+    Returns:
+        bool: False, wenn die Session beendet werden soll ('q'), sonst True.
+    """
+    # PDF öffnen
+    try:
+        if os.name == 'posix':  # macOS oder Linux
+            subprocess.Popen(['xdg-open', pdf_path])
+        elif os.name == 'nt':  # Windows
+            os.startfile(pdf_path)
+    except Exception as e:
+        print(f"FEHLER beim Öffnen der PDF: {e}")
+        return True
+
+    annotations = {}
+    current_col_idx = 0
+    
+    while current_col_idx < len(GOLD_STANDARD_COLUMNS):
+        col = GOLD_STANDARD_COLUMNS[current_col_idx]
+        user_input = input(f"  -> {col}? ").strip().lower()
+
+        if user_input == 'q':
+            print("Session beendet. Dein Fortschritt ist gespeichert.")
+            return False
+        elif user_input == 's':
+            print("Seite übersprungen.")
+            annotations = None
+            break 
+        elif user_input == 'b':
+            if current_col_idx > 0:
+                current_col_idx -= 1
+                continue
+            else:
+                print("Du bist bereits bei der ersten Kategorie.")
+                continue
         
-        while current_col_idx < len(GOLD_STANDARD_COLUMNS):
-            col = GOLD_STANDARD_COLUMNS[current_col_idx]
-            user_input = input(f"  -> {col}? ").strip().lower()
+        # **NEU: Validiere und verarbeite die numerische Eingabe**
+        try:
+            # Shortcut: Leere Eingabe (Enter) wird zu 0
+            if user_input == '':
+                value = 0
+            else:
+                value = int(user_input)
 
-            if user_input == 'q':
-                print("Session beendet. Dein Fortschritt ist gespeichert.")
-                return
-            elif user_input == 's':
-                print("Seite übersprungen.")
-                annotations = None
-                break 
-            elif user_input == 'b':
-                if current_col_idx > 0:
-                    current_col_idx -= 1
-                    continue
-                else:
-                    print("Du bist bereits bei der ersten Kategorie.")
-                    continue
-            
-            # **NEU: Validiere und verarbeite die numerische Eingabe**
-            try:
-                # Shortcut: Leere Eingabe (Enter) wird zu 0
-                if user_input == '':
-                    value = 0
-                else:
-                    value = int(user_input)
-
-                # Prüfe, ob die Zahl im gültigen Bereich liegt
-                if not (0 <= value <= 99):
-                    print(f"FEHLER: Bitte eine Zahl zwischen 0 und 99 eingeben.")
-                    continue # Frage erneut für dieselbe Kategorie
-
-                # Speichere den validierten Wert
-                annotations[col] = value
-                current_col_idx += 1 # Gehe zur nächsten Kategorie
-
-            except ValueError:
-                # Fängt Fehler ab, wenn die Eingabe keine Zahl ist (z.B. "abc")
-                print("FEHLER: Ungültige Eingabe. Bitte eine ganze Zahl eingeben.")
+            # Prüfe, ob die Zahl im gültigen Bereich liegt
+            if not (0 <= value <= 99):
+                print(f"FEHLER: Bitte eine Zahl zwischen 0 und 99 eingeben.")
                 continue # Frage erneut für dieselbe Kategorie
 
-        if annotations is not None:
-            for col, value in annotations.items():
-                df.loc[index, col] = value
-            
-            df.to_csv(csv_file, index=False)
-            print(f"Annotation für Seite {index + 1} gespeichert!")
-            
-    print("\nAlle Seiten in diesem Subset wurden bearbeitet.")
+            # Speichere den validierten Wert
+            annotations[col] = value
+            current_col_idx += 1 # Gehe zur nächsten Kategorie
+
+        except ValueError:
+            # Fängt Fehler ab, wenn die Eingabe keine Zahl ist (z.B. "abc")
+            print("FEHLER: Ungültige Eingabe. Bitte eine ganze Zahl eingeben.")
+            continue # Frage erneut für dieselbe Kategorie
+
+    if annotations is not None:
+        for col, value in annotations.items():
+            df.loc[index, col] = value
+        
+        df.to_csv(csv_file, index=False)
+        print(f"Annotation für Seite {index + 1} gespeichert!")
+    return True
+
 
 # --- Hauptskript ausführen ---
 if __name__ == "__main__":
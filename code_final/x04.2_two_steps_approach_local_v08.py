@@ -1,28 +1,61 @@
 import pandas as pd
 import os
+import sys
 import time
 import base64
+import hashlib
 import json
 import requests
-import fitz  # PyMuPDF
-from PIL import Image
-from io import BytesIO
+from x00_page_access import AnnotationJob, page_id_from_row, page_label, page_ref_from_row
+from x00_page_store import PageStore
+from x00_render_cache import get_render_cache
+from x00_text_extract import extract_texts_to_sink
+from x00_result_journal import ResultJournal, apply_results, journal_path_for, load_journal
+from x00_cli import add_run_arguments, expand_subsets, make_parser, parse_run_arguments
+from x00_llm_cache import get_response_cache, response_cache_key
+from x00_annotation_backend import OllamaHTTPBackend
+from x00_ollama_residency import ModelResidencyManager
+from x00_alcohol_keywords import classify_texts, evaluate_prefilter
 
 # ==============================================================================
 # --- KONFIGURATION ---
 # ==============================================================================
 PROCESSING_CSV_FILE = 'annotations/subset_1_annotated_v08.csv'
 BASE_CSV_FILE = 'subsets/subset_1.csv'
-IMAGE_BATCH_SIZE = 3
+# Seiten pro Bild-Batch: Vielfaches von MAX_IN_FLIGHT, damit der asynchrone Runner alle Plätze füllt
+# (bei 3 Seiten pro Batch liefen nie mehr als 3 Anfragen gleichzeitig)
+IMAGE_BATCH_SIZE = 12
+# Gleichzeitig offene Bild-Anfragen (Server mit OLLAMA_NUM_PARALLEL >= diesem Wert starten)
+MAX_IN_FLIGHT = 4
 OLLAMA_ENDPOINT = "http://localhost:11434/api/generate"
 TEXT_MODEL = "deepseek-r1:1.5b"
 IMAGE_MODEL = "qwen2.5vl:3b"
-API_TIMEOUT = 660
+# Die Modelle werden vorab geladen (x00_ollama_residency); die Timeouts decken nur noch die Inferenz ab
+TEXT_TIMEOUT = 120
+API_TIMEOUT = 300
+# Wie lange Ollama ein Modell nach der letzten Anfrage geladen hält
+KEEP_ALIVE = "30m"
 TEXT_PROMPT_PATH = "term_paper_genai/prompts/01_text_annotation_prompt_v03.txt" 
+BATCH_TEXT_PROMPT_PATH = "term_paper_genai/prompts/01_text_classification_batch_prompt.txt"
+# Schritt 2: Seiten pro Text-Anfrage und geschätztes Token-Budget pro Batch
+TEXT_BATCH_MAX_PAGES = 16
+TEXT_BATCH_TOKEN_BUDGET = 6000
+# Reserve für die Antwort; num_ctx = Budget + Prompt + Reserve, sonst kürzt Ollama (Standard 2048/4096)
+# den Prompt-Anfang mit den Anweisungen
+TEXT_CONTEXT_HEADROOM = 1024
+# Eindeutige Fälle per Stichwort-Lexikon entscheiden, nur Zweifelsfälle an das LLM
+USE_KEYWORD_PREFILTER = True
 IMAGE_PROMPT_PATH = "term_paper_genai/prompts/02_image_annotation_prompt_v03.txt"
 IMAGE_DPI = 96
 IMAGE_GRAYSCALE = True
 IMAGE_QUALITY = 80
+# Parquet-Seitenspeicher aus x01 (None = extrahierte Texte wie bisher in der CSV halten)
+PAGE_STORE_DIR = 'page_store'
+TEXT_STAGE = 'text'
+# Prozesse für die Textextraktion (None = alle Kerne)
+TEXT_WORKERS = None
+# Lädt Text- und Bildmodell je einmal pro Lauf und misst Lade- und Inferenzzeit getrennt
+RESIDENCY = ModelResidencyManager(OLLAMA_ENDPOINT, keep_alive=KEEP_ALIVE)
 
 # ==============================================================================
 # --- HILFSFUNKTIONEN ---
@@ -33,17 +66,45 @@ def load_prompt(file_path):
     except FileNotFoundError:
         print(f"FATALER FEHLER: Prompt-Datei nicht gefunden: {file_path}"); return None
 
+def save_processing_csv(df):
+    """Speichert den Arbeitsstand. Mit Seitenspeicher liegen die Texte dort, nicht in der CSV."""
+    if PAGE_STORE_DIR:
+        df = df.drop(columns=['extracted_text'], errors='ignore')
+    df.to_csv(PROCESSING_CSV_FILE, index=False, encoding='utf-8-sig')
+
+def run_model_jobs(jobs, model, timeout, render_options=None, on_result=None, options=None):
+    """Jobs über das Ollama-Backend mit vorgeladenem Modell; Lade- und Inferenzzeiten landen in RESIDENCY."""
+    if not jobs:
+        return {}, None
+    RESIDENCY.ensure(model)
+    backend = OllamaHTTPBackend(model, endpoint=OLLAMA_ENDPOINT, timeout=timeout, keep_alive=KEEP_ALIVE,
+                                max_concurrency=MAX_IN_FLIGHT, render_options=render_options, options=options)
+    results, stats = backend.run(jobs, on_result)
+    for engine_stats in stats.engine_stats:
+        RESIDENCY.record(model, engine_stats)
+    return results, stats
+
 def call_ollama_api(prompt, model, image_bytes=None):
-    payload = {"model": model, "prompt": prompt, "format": "json", "stream": False}
+    cache = get_response_cache()
+    image_hash = hashlib.sha256(image_bytes).hexdigest() if image_bytes else None
+    cache_key = response_cache_key(model, prompt, None, image_hash)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    payload = {"model": model, "prompt": prompt, "format": "json", "stream": False, "keep_alive": KEEP_ALIVE}
     if image_bytes:
         payload["images"] = [base64.b64encode(image_bytes).decode('utf-8')]
+    RESIDENCY.ensure(model)
     try:
-        # Wir geben Text-Calls eine etwas längere Zeit, um den "Kaltstart" des Modells zu überleben.
-        timeout = 240 if image_bytes is None else API_TIMEOUT # Timeout leicht erhöht
+        timeout = TEXT_TIMEOUT if image_bytes is None else API_TIMEOUT
         response = requests.post(OLLAMA_ENDPOINT, json=payload, timeout=timeout)
         response.raise_for_status()
-        response_text = response.json().get('response', '{}')
-        return json.loads(response_text)
+        body = response.json()
+        RESIDENCY.record_response(model, body)
+        response_text = body.get('response', '{}')
+        result = json.loads(response_text)
+        cache.put(cache_key, model, result)
+        return result
     except (requests.RequestException, json.JSONDecodeError) as e:
         print(f"  -> API-Fehler oder JSON-Decode-Fehler: {e}"); return {"error": str(e)}
 
@@ -52,16 +113,31 @@ def call_ollama_api(prompt, model, image_bytes=None):
 # ==============================================================================
 def step1_extract_text(df):
     print("\n--- SCHRITT 1: Extrahiere Text aus allen PDF-Seiten ---")
-    texts = []
-    for index, row in df.iterrows():
-        print(f"  Verarbeite Text von Seite {index + 1}/{len(df)}...", end='\r')
-        try:
-            with fitz.open(row['page_pdf_path']) as doc:
-                texts.append(doc.load_page(0).get_text("text"))
-        except Exception as e:
-            print(f"  Fehler bei {row['page_pdf_path']}: {e}"); texts.append("")
-    df['extracted_text'] = texts
-    print(f"\nText-Extraktion für {len(df)} Seiten abgeschlossen.")
+    df['page_id'] = [page_id_from_row(row) for _, row in df.iterrows()]
+    store = PageStore(PAGE_STORE_DIR) if PAGE_STORE_DIR else None
+    texts = {}
+    if store is not None:
+        # Nur die benötigten Spalten lesen; bereits extrahierte Seiten überspringen
+        stored = store.read_results(TEXT_STAGE, columns=['extracted_text'])
+        texts = dict(zip(stored['page_id'], stored['extracted_text']))
+
+    items = [(row['page_id'], page_ref_from_row(row)) for _, row in df.iterrows() if row['page_id'] not in texts]
+
+    def sink(chunk):
+        # Fehlerhafte Seiten nicht speichern, damit sie beim nächsten Lauf erneut versucht werden
+        for message in chunk['error'].dropna():
+            print(f"  Fehler bei {message}")
+        ok = chunk[chunk['error'].isna()].drop(columns=['error']).rename(columns={'key': 'page_id'})
+        texts.update(zip(chunk['key'], chunk['extracted_text']))
+        if store is not None and not ok.empty:
+            store.append_results(TEXT_STAGE, ok)
+
+    totals = extract_texts_to_sink(
+        items, sink, max_workers=TEXT_WORKERS,
+        progress=lambda done: print(f"  Text extrahiert: {done}/{len(items)} Seiten...", end='\r'))
+    df['extracted_text'] = df['page_id'].map(texts).fillna("")
+    print(f"\nText-Extraktion für {len(df)} Seiten abgeschlossen "
+          f"({totals['pages']} neu extrahiert, {totals['errors']} Fehler).")
     return df
 
 # *** WICHTIGSTE ÄNDERUNG HIER ***
@@ -107,13 +183,123 @@ def step2_classify_text_sequentially(df):
     return df
 
 
-def step3_annotate_images_in_batches(df):
+def build_text_batches(items, max_pages, token_budget):
+    """
+    Packt (index, text)-Paare gierig in Batches mit höchstens max_pages Seiten
+    und höchstens token_budget geschätzten Tokens (ca. 4 Zeichen pro Token).
+    """
+    batches, current, current_tokens = [], [], 0
+    for index, text in items:
+        tokens = len(text) // 4 + 10  # +10 für ID und JSON-Struktur
+        if current and (len(current) >= max_pages or current_tokens + tokens > token_budget):
+            batches.append(current); current, current_tokens = [], 0
+        current.append((index, text)); current_tokens += tokens
+    if current: batches.append(current)
+    return batches
+
+def parse_batch_flags(result, n_items):
+    """
+    Liest die Flags aus einer Batch-Antwort {"results": [{"ID", "flag"}]}.
+    Gibt nur gültige Einträge zurück (ID im Bereich, flag 0 oder 1).
+    """
+    flags = {}
+    entries = result.get("results") if isinstance(result, dict) else None
+    if not isinstance(entries, list): return flags
+    for entry in entries:
+        if not isinstance(entry, dict): continue
+        try:
+            batch_id, flag = int(entry.get("ID")), int(entry.get("flag"))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= batch_id < n_items and flag in (0, 1):
+            flags[batch_id] = flag
+    return flags
+
+def step2_classify_text_batched(df):
+    """
+    Wie step2_classify_text_sequentially, aber mit mehreren Seiten pro Anfrage
+    (prompts/01_text_classification_batch_prompt.txt). Seiten, deren ID in der
+    Antwort fehlt oder ungültig ist, werden einzeln nachklassifiziert.
+
+    Mit USE_KEYWORD_PREFILTER entscheidet x00_alcohol_keywords eindeutige
+    Seiten vorab; nur Zweifelsfälle ('ambiguous') gehen an das LLM.
+    """
+    print("\n--- SCHRITT 2: Klassifiziere Texte auf Alkohol-Stichworte (Batch-Modus) ---")
+    batch_prompt_template = load_prompt(BATCH_TEXT_PROMPT_PATH)
+    text_prompt_template = load_prompt(TEXT_PROMPT_PATH)
+    if not batch_prompt_template or not text_prompt_template: return df
+
+    flags = pd.Series(0, index=df.index)
+    candidates = df['extracted_text'][df['extracted_text'].fillna('').str.strip().str.len() >= 10]
+    if USE_KEYWORD_PREFILTER:
+        decisions = classify_texts(df['extracted_text'])
+        df['alc_prefilter'] = decisions
+        flags[decisions == 'positive'] = 1
+        candidates = candidates[decisions[candidates.index] == 'ambiguous']
+        print(f"  Stichwortfilter: {(decisions == 'positive').sum()} eindeutig positiv, "
+              f"{(decisions == 'negative').sum()} eindeutig negativ, {len(candidates)} Zweifelsfälle für das LLM.")
+        if 'alc_gold' in df.columns:
+            print(f"  Stichwortfilter gegen Goldstandard: {evaluate_prefilter(decisions, df['alc_gold'])}")
+    items = [(index, text[:3000]) for index, text in candidates.items()]
+    batches = build_text_batches(items, TEXT_BATCH_MAX_PAGES, TEXT_BATCH_TOKEN_BUDGET)
+    # Kontextfenster für einen vollen Batch samt Prompt; gleicher Wert für die Einzel-Fallbacks,
+    # damit Ollama das Modell dazwischen nicht neu lädt
+    prompt_tokens = max(len(batch_prompt_template), len(text_prompt_template)) // 4
+    text_options = {'num_ctx': TEXT_BATCH_TOKEN_BUDGET + prompt_tokens + TEXT_CONTEXT_HEADROOM}
+
+    # Innerhalb eines Batches bekommen die Seiten die IDs 0..n-1 (wie im Prompt-Beispiel)
+    jobs = []
+    for batch_no, batch in enumerate(batches):
+        batch_of_texts = json.dumps([{"ID": i, "TEXT": text} for i, (_, text) in enumerate(batch)],
+                                    ensure_ascii=False, indent=0)
+        jobs.append(AnnotationJob(batch_no, batch_prompt_template.replace("{batch_of_texts}", batch_of_texts), None))
+    results, batch_stats = run_model_jobs(jobs, TEXT_MODEL, TEXT_TIMEOUT, options=text_options)
+
+    fallback_items = []
+    for batch_no, batch in enumerate(batches):
+        batch_flags = parse_batch_flags(results[batch_no], len(batch))
+        for i, (index, text) in enumerate(batch):
+            if i in batch_flags: flags[index] = batch_flags[i]
+            else: fallback_items.append((index, text))
+
+    # Fallback: fehlende/ungültige IDs einzeln klassifizieren
+    fallback_jobs = [AnnotationJob(index, text_prompt_template.replace("{page_text}", text), None)
+                     for index, text in fallback_items]
+    fallback_results, _ = run_model_jobs(fallback_jobs, TEXT_MODEL, TEXT_TIMEOUT, options=text_options)
+    api_errors = 0
+    for index, result in fallback_results.items():
+        if result.get("error"): api_errors += 1
+        else: flags[index] = 1 if result.get('flag', 0) == 1 else 0
+
+    df['alc_keyword_flag'] = flags
+    n_calls = len(jobs) + len(fallback_jobs)
+    n_text_pages = int((df['extracted_text'].fillna('').str.strip().str.len() >= 10).sum())
+    print(f"Text-Klassifizierung abgeschlossen: {n_calls} LLM-Aufrufe für {len(items)} Seiten "
+          f"({len(jobs)} Batches, {len(fallback_jobs)} Einzel-Fallbacks"
+          + (f"; Batches: {batch_stats.summary()})." if batch_stats else ")."))
+    print(f"Eingesparte Aufrufe gegenüber dem sequenziellen Modus: {n_text_pages - n_calls} von {n_text_pages}.")
+    if api_errors > 0:
+        print(f"WARNUNG: Es gab {api_errors} API-Fehler (z.B. Timeouts). Diese Seiten wurden als 'nicht relevant' (0) markiert.")
+    print(f"Insgesamt wurden {df['alc_keyword_flag'].sum()} von {len(df)} Seiten als relevant markiert.")
+    return df
+
+
+def step3_annotate_images_in_batches(df, resume=True):
     print("\n--- SCHRITT 3: Annotiere markierte Seiten (Batch-Modus) ---")
     image_prompt = load_prompt(IMAGE_PROMPT_PATH)
     if not image_prompt: return df
     annotation_cols = ['alc', 'product', 'warning', 'discount']
     for col in annotation_cols:
         if col not in df.columns: df[col] = pd.NA
+    # Arbeits-CSVs von vor dem Journal haben noch keine page_id (Schritt 1 wird dann übersprungen)
+    if 'page_id' not in df.columns:
+        df['page_id'] = [page_id_from_row(row) for _, row in df.iterrows()]
+    # Ergebnisse früherer (auch abgebrochener) Läufe aus dem Journal übernehmen
+    journal_path = journal_path_for(PROCESSING_CSV_FILE)
+    previous = load_journal(journal_path) if resume else {}
+    if previous:
+        restored = apply_results(df, df['page_id'], previous, annotation_cols)
+        print(f"{restored} Seiten aus dem Journal übernommen ({journal_path}).")
     needs_annotation_mask = (df['alc_keyword_flag'] == 1)
     already_annotated_mask = df['alc'].notna()
     to_process_indices = df[needs_annotation_mask & ~already_annotated_mask].index
@@ -121,77 +307,148 @@ def step3_annotate_images_in_batches(df):
         print("Alle als relevant markierten Seiten wurden bereits annotiert. Nichts zu tun.")
         return df
     print(f"Insgesamt {len(to_process_indices)} Seiten müssen noch annotiert werden.")
-    for i in range(0, len(to_process_indices), IMAGE_BATCH_SIZE):
-        batch_indices = to_process_indices[i : i + IMAGE_BATCH_SIZE]
-        num_batches = (len(to_process_indices) + IMAGE_BATCH_SIZE - 1) // IMAGE_BATCH_SIZE
-        current_batch_num = (i // IMAGE_BATCH_SIZE) + 1
-        print(f"\n--- Bearbeite Bild-Batch {current_batch_num} von {num_batches} (Seiten: {len(batch_indices)}) ---")
-        for index in batch_indices:
-            row = df.loc[index]
-            print(f"  Annotiere Bild: {os.path.basename(row['page_pdf_path'])}")
-            try:
-                with fitz.open(row['page_pdf_path']) as doc:
-                    pix = doc.load_page(0).get_pixmap(dpi=IMAGE_DPI, colorspace=fitz.csGRAY if IMAGE_GRAYSCALE else fitz.csRGB)
-                    img = Image.frombytes("L" if IMAGE_GRAYSCALE else "RGB", [pix.width, pix.height], pix.samples)
-                    buffer = BytesIO(); img.save(buffer, format="JPEG", quality=IMAGE_QUALITY)
-                    image_bytes = buffer.getvalue()
-            except Exception as e:
-                print(f"    -> Fehler beim Rendern des Bildes: {e}"); continue
-            annotation = call_ollama_api(image_prompt, IMAGE_MODEL, image_bytes=image_bytes)
-            if not annotation.get("error"):
-                for col in annotation_cols:
-                    df.loc[index, col] = annotation.get(col, pd.NA)
-                print(f"    -> Annotation erfolgreich.")
-            else:
-                print(f"    -> Fehler bei der Annotation vom LLM erhalten.")
-        print("\n-> Batch abgeschlossen. Speichere Zwischenergebnis...")
-        df.to_csv(PROCESSING_CSV_FILE, index=False, encoding='utf-8-sig')
-        print(f"   Erfolgreich in '{PROCESSING_CSV_FILE}' gespeichert.")
-        display_cols = ['page_pdf_path'] + annotation_cols
-        display_df = df.loc[batch_indices][display_cols].copy()
-        display_df['page_pdf_path'] = display_df['page_pdf_path'].apply(os.path.basename)
-        print("-> Ergebnisse dieses Batches:\n" + display_df.to_string())
-        if current_batch_num < num_batches:
-            user_input = input("\nDrücke Enter, um den nächsten Batch zu starten, oder 'q' zum Beenden: ")
-            if user_input.lower() == 'q':
-                print("Benutzer hat den Prozess beendet."); return df
+    with ResultJournal(journal_path) as journal:
+        # Jedes Ergebnis sofort ins Journal statt die Arbeits-CSV nach jedem Batch neu zu schreiben
+        on_result = lambda index, annotation: journal.append(df.loc[index, 'page_id'], annotation)
+        for i in range(0, len(to_process_indices), IMAGE_BATCH_SIZE):
+            batch_indices = to_process_indices[i : i + IMAGE_BATCH_SIZE]
+            num_batches = (len(to_process_indices) + IMAGE_BATCH_SIZE - 1) // IMAGE_BATCH_SIZE
+            current_batch_num = (i // IMAGE_BATCH_SIZE) + 1
+            print(f"\n--- Bearbeite Bild-Batch {current_batch_num} von {num_batches} (Seiten: {len(batch_indices)}) ---")
+            jobs = [AnnotationJob(index, image_prompt, page_ref_from_row(df.loc[index])) for index in batch_indices]
+            results, stats = run_model_jobs(
+                jobs, IMAGE_MODEL, API_TIMEOUT,
+                render_options={'dpi': IMAGE_DPI, 'grayscale': IMAGE_GRAYSCALE, 'quality': IMAGE_QUALITY},
+                on_result=on_result)
+            for index in batch_indices:
+                annotation = results[index]
+                print(f"  Bild: {page_label(page_ref_from_row(df.loc[index]))}")
+                if not annotation.get("error"):
+                    for col in annotation_cols:
+                        df.loc[index, col] = annotation.get(col, pd.NA)
+                    print(f"    -> Annotation erfolgreich.")
+                else:
+                    print(f"    -> Fehler bei der Annotation: {annotation['error']}")
+            print(f"-> Durchsatz: {stats.summary()}")
+            display_df = df.loc[batch_indices][annotation_cols].copy()
+            display_df.insert(0, 'page', [page_label(page_ref_from_row(df.loc[i])) for i in batch_indices])
+            print("-> Ergebnisse dieses Batches:\n" + display_df.to_string())
     print("\nAlle Bild-Batches wurden verarbeitet.")
+    print(f"Render-Cache: {get_render_cache().stats()}")
+    print(f"Antwort-Cache: {get_response_cache().stats()}")
     return df
 
 # ==============================================================================
-# --- HAUPTSKRIPT (Logik zum Laden verbessert) ---
+# --- HAUPTSKRIPT (ohne Rückfragen, per Kommandozeile steuerbar) ---
 # ==============================================================================
-if __name__ == "__main__":
+def prepare_subset(base_csv_file, processing_csv_file, resume=True):
+    """
+    Schritte 1 und 2 (Text-Extraktion, Text-Klassifizierung mit TEXT_MODEL) für ein Subset.
+
+    Returns:
+        pd.DataFrame oder None, wenn die Basis-CSV fehlt.
+    """
+    global PROCESSING_CSV_FILE
+    PROCESSING_CSV_FILE = processing_csv_file
     # Logik zum Laden der Daten:
     # 1. Versuche, die Arbeitsdatei zu laden, um den Fortschritt fortzusetzen.
-    # 2. Wenn sie nicht existiert, lade die ursprüngliche Basis-Datei.
-    #    -> Um einen sauberen Neustart zu erzwingen, löschen Sie die Datei 'annotations/subset_1_anno_v06.csv' manuell.
-    if os.path.exists(PROCESSING_CSV_FILE):
+    # 2. Wenn sie nicht existiert (oder --fresh), lade die ursprüngliche Basis-Datei.
+    if resume and os.path.exists(PROCESSING_CSV_FILE):
         print(f"Lade bestehende Arbeitsdatei zum Fortsetzen: '{PROCESSING_CSV_FILE}'")
         df = pd.read_csv(PROCESSING_CSV_FILE)
     else:
-        print(f"Keine Arbeitsdatei gefunden. Lade Basis-Datei: '{BASE_CSV_FILE}'")
+        print(f"Lade Basis-Datei: '{base_csv_file}'")
         try:
-            df = pd.read_csv(BASE_CSV_FILE)
+            df = pd.read_csv(base_csv_file)
         except FileNotFoundError:
-            print(f"FATALER FEHLER: Basis-CSV-Datei nicht gefunden: {BASE_CSV_FILE}"); exit()
+            print(f"FATALER FEHLER: Basis-CSV-Datei nicht gefunden: {base_csv_file}"); return None
 
     print("Starte Annotations-Workflow...")
     if 'extracted_text' not in df.columns:
+        # Mit Seitenspeicher werden bereits extrahierte Texte nur nachgeladen
         df = step1_extract_text(df)
-        df.to_csv(PROCESSING_CSV_FILE, index=False, encoding='utf-8-sig')
+        save_processing_csv(df)
     else:
         print("\n--- SCHRITT 1: Text-Extraktion bereits abgeschlossen. Überspringe. ---")
 
     if 'alc_keyword_flag' not in df.columns:
-        df = step2_classify_text_sequentially(df)
-        df.to_csv(PROCESSING_CSV_FILE, index=False, encoding='utf-8-sig')
+        df = step2_classify_text_batched(df)
+        save_processing_csv(df)
     else:
         print("\n--- SCHRITT 2: Text-Klassifizierung bereits abgeschlossen. Überspringe. ---")
-        
-    df_final = step3_annotate_images_in_batches(df)
-    
+    return df
+
+
+def annotate_subset(df, processing_csv_file, resume=True):
+    """Schritt 3 (Bild-Annotation mit IMAGE_MODEL) für ein vorbereitetes Subset."""
+    global PROCESSING_CSV_FILE
+    PROCESSING_CSV_FILE = processing_csv_file
+    df_final = step3_annotate_images_in_batches(df, resume=resume)
+    # Die Arbeits-CSV wird einmal am Ende aus dem DataFrame (inkl. Journal) geschrieben
+    save_processing_csv(df_final)
+
     print(f"\n==========================================================")
     print(f"Workflow abgeschlossen! Der finale Stand wurde gespeichert in:")
     print(PROCESSING_CSV_FILE)
-    print(f"==========================================================")
\ No newline at end of file
+    print(f"==========================================================")
+
+
+def run_workflow(subset_files, resume=True):
+    """
+    Führt den Workflow für mehrere Subsets nach Modell gruppiert aus: erst
+    Schritte 1-2 aller Subsets (Textmodell), dann Schritt 3 aller Subsets
+    (Bildmodell). So wird jedes Modell pro Lauf nur einmal geladen.
+
+    Args:
+        subset_files (list): (basis_csv, arbeits_csv)-Paare.
+
+    Returns:
+        int: Anzahl der Subsets, deren Basis-CSV fehlte.
+    """
+    prepared, failed = [], 0
+    for base_csv_file, processing_csv_file in subset_files:
+        df = prepare_subset(base_csv_file, processing_csv_file, resume=resume)
+        if df is None:
+            failed += 1
+        else:
+            prepared.append((df, processing_csv_file))
+    for df, processing_csv_file in prepared:
+        annotate_subset(df, processing_csv_file, resume=resume)
+    RESIDENCY.close()
+    print(f"\nModellzeiten:\n{RESIDENCY.report()}")
+    return failed
+
+
+def main(argv=None):
+    # Die Optionen ersetzen die Konfigurationswerte oben im Skript
+    global IMAGE_MODEL, TEXT_MODEL, IMAGE_PROMPT_PATH, MAX_IN_FLIGHT, IMAGE_DPI, KEEP_ALIVE
+    parser = add_run_arguments(
+        make_parser("Zweistufige lokale Annotation (Text-Filter, dann Bild-Annotation)"),
+        model=IMAGE_MODEL, prompt=IMAGE_PROMPT_PATH, subsets=BASE_CSV_FILE,
+        concurrency=MAX_IN_FLIGHT, dpi=IMAGE_DPI)
+    parser.add_argument('--text-model', default=TEXT_MODEL, help="Modell für die Text-Klassifizierung")
+    parser.add_argument('--output-folder', default=os.path.dirname(PROCESSING_CSV_FILE),
+                        help="Ordner der Arbeits-CSVs")
+    parser.add_argument('--keep-alive', default=KEEP_ALIVE,
+                        type=lambda value: int(value) if value.lstrip('-').isdigit() else value,
+                        help=f"Wie lange Ollama ein Modell geladen hält (Standard: {KEEP_ALIVE}, -1 = unbegrenzt)")
+    args = parse_run_arguments(parser, argv)
+    IMAGE_MODEL, TEXT_MODEL, IMAGE_PROMPT_PATH = args.model, args.text_model, args.prompt
+    MAX_IN_FLIGHT, IMAGE_DPI = args.concurrency, args.dpi
+    KEEP_ALIVE = RESIDENCY.keep_alive = args.keep_alive
+
+    subsets = expand_subsets(args.subsets)
+    if not subsets:
+        print(f"FATALER FEHLER: Keine Basis-CSV gefunden für '{args.subsets}'."); return 1
+    os.makedirs(args.output_folder, exist_ok=True)
+    subset_files = [
+        (base_csv_file, os.path.join(args.output_folder,
+                                     f"{os.path.splitext(os.path.basename(base_csv_file))[0]}_annotated_v08.csv"))
+        for base_csv_file in subsets
+    ]
+    failed = run_workflow(subset_files, resume=args.resume)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
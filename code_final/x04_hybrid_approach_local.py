@@ -1,12 +1,10 @@
 import pandas as pd
 import os
-import time
-import base64
-import json
-import requests
-import fitz  # PyMuPDF
-from PIL import Image
-from io import BytesIO
+from collections import Counter
+from x00_page_access import AnnotationJob, page_label, page_ref_from_row
+from x00_annotation_backend import OllamaHTTPBackend
+from x00_text_extract import extract_texts_to_sink
+from x00_text_layer import annotate_page_text_layer
 
 # Ollama Server im Terminal starten! 
 # ollama run gemma3:4b
@@ -28,6 +26,19 @@ MODEL_NAME = "qwen2.5vl:3b" # z.B. Mistral-basiertes Llava mit 4-bit Quantisieru
 # um eine text-basierte Annotation überhaupt zu versuchen?
 TEXT_MIN_CHARS = 50
 
+# Gleichzeitig offene Anfragen an Ollama (Server mit OLLAMA_NUM_PARALLEL >= diesem Wert starten)
+MAX_IN_FLIGHT = 4
+
+# Prozesse für die Textextraktion (None = alle Kerne)
+TEXT_WORKERS = None
+
+# Textebene zuerst: Seiten mit verwertbarer Textebene ohne Modell annotieren (x00_text_layer)
+USE_TEXT_LAYER = True
+# Alkoholseiten trotzdem per Bild prüfen (child und Warnhinweise sind oft nur visuell erkennbar)
+TEXT_LAYER_ALCOHOL_TO_VISION = True
+# Seiten, die die Textebene nicht klären kann, erst per Text-LLM versuchen (sonst direkt Bild)
+TEXT_LLM_FALLBACK = False
+
 # --- HILFSFUNKTIONEN ---
 
 def load_prompt(file_path):
@@ -38,51 +49,17 @@ def load_prompt(file_path):
         print(f"FEHLER: Prompt-Datei nicht gefunden: {file_path}")
         return None
 
-def extract_text_from_page(pdf_path):
-    """Extrahiert reinen Text von einer PDF-Seite."""
-    try:
-        with fitz.open(pdf_path) as doc:
-            page = doc.load_page(0)
-            return page.get_text("text")
-    except Exception as e:
-        print(f"Fehler beim Extrahieren von Text aus {pdf_path}: {e}")
-        return ""
-
-def render_page_as_image(pdf_path, dpi=100, grayscale=True):
-    """Rendert eine PDF-Seite bei Bedarf als optimiertes Bild im Speicher."""
-    try:
-        with fitz.open(pdf_path) as doc:
-            page = doc.load_page(0)
-            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB)
-            img = Image.frombytes("L" if grayscale else "RGB", [pix.width, pix.height], pix.samples)
-            
-            # Bild in Bytes umwandeln, um es direkt senden zu können
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=80)
-            return buffer.getvalue()
-    except Exception as e:
-        print(f"Fehler beim Rendern des Bildes von {pdf_path}: {e}")
-        return None
+def extract_page_texts(page_refs):
+    """Extrahiert die Texte aller Seiten mit mehreren Prozessen: {index: text}."""
+    texts = {}
 
-def call_ollama_api(prompt, image_bytes=None):
-    """Sendet eine Anfrage an die Ollama API."""
-    payload = {
-        "model": MODEL_NAME,
-        "prompt": prompt,
-        "format": "json",
-        "stream": False
-    }
-    if image_bytes:
-        payload["images"] = [base64.b64encode(image_bytes).decode('utf-8')]
+    def sink(chunk):
+        for message in chunk['error'].dropna():
+            print(f"Fehler beim Extrahieren von Text aus {message}")
+        texts.update(zip(chunk['key'], chunk['extracted_text']))
 
-    try:
-        response = requests.post(OLLAMA_ENDPOINT, json=payload, timeout=480)
-        response.raise_for_status()
-        response_text = response.json().get('response', '{}')
-        return json.loads(response_text)
-    except (requests.RequestException, json.JSONDecodeError) as e:
-        print(f"API-Fehler oder JSON-Decode-Fehler: {e}")
-        return {"error": str(e)}
+    extract_texts_to_sink(page_refs.items(), sink, max_workers=TEXT_WORKERS)
+    return texts
 
 # --- HAUPT-WORKFLOW ---
 
@@ -102,50 +79,72 @@ def main():
 
     print(f"Starte hybride Annotation für {len(df)} Seiten aus {SUBSET_TO_PROCESS}...")
 
-    for index, row in df.iterrows():
-        pdf_path = row['page_pdf_path']
-        print(f"\n[{index + 1}/{len(df)}] Verarbeite: {os.path.basename(pdf_path)}")
-        
-        # --- VERSUCH 1: TEXT-BASIERT ---
-        page_text = extract_text_from_page(pdf_path)
-        annotation = None
-
-        if len(page_text) > TEXT_MIN_CHARS:
-            print("-> Versuche schnelle, text-basierte Annotation...")
-            prompt = text_prompt_template.replace("{page_text}", page_text)
-            annotation = call_ollama_api(prompt)
-            
-            # Überprüfe, ob das LLM mehr Infos (ein Bild) braucht
-            if annotation.get("error") == "insufficient text":
-                print("-> Text nicht ausreichend, wechsle zur Bild-Annotation.")
-                annotation = None # Setze zurück, um Bild-Modus zu erzwingen
+    page_refs = {index: page_ref_from_row(row) for index, row in df.iterrows()}
+    # Ein Backend für Text- und Bild-Anfragen (gleiches Modell, gemeinsame Zeitmessung)
+    backend = OllamaHTTPBackend(MODEL_NAME, endpoint=OLLAMA_ENDPOINT, timeout=480, max_concurrency=MAX_IN_FLIGHT,
+                                render_options={'dpi': 100, 'grayscale': True, 'quality': 80})
+
+    # --- VERSUCH 0: TEXTEBENE OHNE MODELL ---
+    layer_results, layer_reasons = {}, {}
+    if USE_TEXT_LAYER:
+        for index, page_ref in page_refs.items():
+            annotation, reasons = annotate_page_text_layer(page_ref)
+            if annotation is not None and annotation['alc'] and TEXT_LAYER_ALCOHOL_TO_VISION:
+                reasons = reasons + ["alcohol page"]
+            if annotation is not None and not reasons:
+                layer_results[index] = annotation
             else:
-                 print("-> Text-Annotation erfolgreich!")
-
-        else:
-            print("-> Zu wenig Text auf der Seite, starte direkt mit Bild-Annotation.")
-
-        # --- VERSUCH 2: BILD-BASIERT (FALLBACK) ---
-        if not annotation:
-            print("-> Rendere Bild und starte multimodale Annotation...")
-            image_bytes = render_page_as_image(pdf_path)
-            if image_bytes:
-                annotation = call_ollama_api(image_prompt, image_bytes=image_bytes)
-                if not annotation.get("error"):
-                    print("-> Bild-Annotation erfolgreich!")
-                else:
-                    print(f"-> Fehler bei Bild-Annotation: {annotation.get('error')}")
-            else: # Falls das Rendern fehlschlägt
+                layer_reasons[index] = reasons
+        print(f"-> Textebene: {len(layer_results)} von {len(page_refs)} Seiten ohne Modell annotiert.")
+        reason_counts = Counter(reason.split(':')[0] for reasons in layer_reasons.values() for reason in reasons)
+        for reason, count in reason_counts.most_common():
+            print(f"   Vision nötig ({reason}): {count} Seiten")
+    open_refs = {index: page_ref for index, page_ref in page_refs.items() if index not in layer_results}
+
+    # --- VERSUCH 1: TEXT-BASIERT (alle Seiten mit genug Text, nebenläufig) ---
+    text_results = {}
+    if TEXT_LLM_FALLBACK or not USE_TEXT_LAYER:
+        page_texts = extract_page_texts(open_refs)
+        text_jobs = [
+            AnnotationJob(index, text_prompt_template.replace("{page_text}", page_text), None)
+            for index, page_text in page_texts.items() if len(page_text) > TEXT_MIN_CHARS
+        ]
+        print(f"-> {len(text_jobs)} Seiten mit genug Text, starte text-basierte Annotation...")
+        text_results, text_stats = backend.run(text_jobs)
+        print(f"-> Text-Durchsatz: {text_stats.summary()}")
+
+    # --- VERSUCH 2: BILD-BASIERT (FALLBACK) ---
+    # Überprüfe, ob das LLM mehr Infos (ein Bild) braucht oder gar kein Text-Versuch lief
+    image_indices = [
+        index for index in open_refs
+        if index not in text_results or text_results[index].get("error") == "insufficient text"
+    ]
+    image_jobs = [AnnotationJob(index, image_prompt, page_refs[index]) for index in image_indices]
+    print(f"-> {len(image_jobs)} Seiten benötigen die multimodale Annotation...")
+    image_results, image_stats = backend.run(image_jobs)
+    print(f"-> Bild-Durchsatz: {image_stats.summary()}")
+
+    for index, page_ref in page_refs.items():
+        if index in layer_results:
+            annotation = layer_results[index]
+            method = 'text_layer'
+        elif index in image_results:
+            annotation = image_results[index]
+            method = 'image'
+            if str(annotation.get("error", "")).startswith("Image rendering failed"):
+                # Falls das Rendern fehlschlägt
                 annotation = {key: 98 for key in ["alc", "product", "child", "reduc", "prod_pp", "prod_pp_alc"]}
-
+        else:
+            annotation = text_results[index]
+            method = 'text'
 
         # Füge Metadaten hinzu und speichere das Ergebnis
         if annotation and not annotation.get("error"):
-            annotation['filename'] = os.path.basename(pdf_path)
-            annotation['annotation_method'] = 'text' if len(page_text) > TEXT_MIN_CHARS and 'error' not in annotation else 'image'
+            annotation['filename'] = page_label(page_ref)
+            annotation['annotation_method'] = method
             all_annotations.append(annotation)
-        
-        time.sleep(1) # Kurze Pause, um die API nicht zu überlasten
+        else:
+            print(f"[{page_label(page_ref)}] Fehler bei der Annotation: {annotation.get('error')}")
 
     # Speichere alle Ergebnisse in einer CSV-Datei
     if all_annotations:
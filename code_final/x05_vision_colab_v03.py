@@ -1,64 +1,71 @@
-# 00 mount drive
-from google.colab import drive
-drive.mount('/content/drive')
+# 00 Colab-Einrichtung: nur im Notebook; als Skript (python x05_vision_colab_v03.py ...) übersprungen
+import subprocess
+import sys
+import time
 
-## 00 install missing dependencies
-!pip install ollama pandas pymupdf pillow tqdm
+try:
+    from google.colab import drive
+    IN_COLAB = True
+except ImportError:
+    IN_COLAB = False
 
-# 00 set up ollama in shell
-!curl -fsSL https://ollama.com/install.sh | sh
+if IN_COLAB:
+    # 00 mount drive
+    drive.mount('/content/drive')
 
-# 00 run ollama so that API is online
-import subprocess
-import time
+    ## 00 install missing dependencies
+    subprocess.run([sys.executable, '-m', 'pip', 'install', 'ollama', 'pandas', 'pymupdf', 'pillow', 'tqdm',
+                    'aiohttp'], check=True)
 
-# Start Ollama service in the background
-process = subprocess.Popen(['ollama', 'serve'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # 00 set up ollama in shell
+    subprocess.run('curl -fsSL https://ollama.com/install.sh | sh', shell=True, check=True)
 
-# Give Ollama a moment to start
-time.sleep(5)
+    # 00 run ollama so that API is online
+    # Start Ollama service in the background
+    process = subprocess.Popen(['ollama', 'serve'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-# Verify Ollama is running by listing models
-try:
-    result = subprocess.run(['ollama', 'list'], capture_output=True, text=True, check=True, timeout=30)
-    print("Ollama is running and accessible:")
-    print(result.stdout)
-except subprocess.CalledProcessError as e:
-    print(f"Error verifying Ollama: {e}")
-    print(f"Stderr: {e.stderr}")
-    # Try to read from the ollama serve process stderr to see if there are startup errors
+    # Give Ollama a moment to start
+    time.sleep(5)
+
+    # Verify Ollama is running by listing models
     try:
-        startup_errors = process.communicate(timeout=5)[1].decode('utf-8')
-        print(f"Ollama serve startup errors: {startup_errors}")
+        result = subprocess.run(['ollama', 'list'], capture_output=True, text=True, check=True, timeout=30)
+        print("Ollama is running and accessible:")
+        print(result.stdout)
+    except subprocess.CalledProcessError as e:
+        print(f"Error verifying Ollama: {e}")
+        print(f"Stderr: {e.stderr}")
+        # Try to read from the ollama serve process stderr to see if there are startup errors
+        try:
+            startup_errors = process.communicate(timeout=5)[1].decode('utf-8')
+            print(f"Ollama serve startup errors: {startup_errors}")
+        except subprocess.TimeoutExpired:
+            print("Could not retrieve startup errors from ollama serve process.")
+        except Exception as communicate_error:
+            print(f"Error communicating with ollama serve process: {communicate_error}")
+    except FileNotFoundError:
+        print("Ollama command not found. Make sure it's in the PATH.")
     except subprocess.TimeoutExpired:
-        print("Could not retrieve startup errors from ollama serve process.")
-    except Exception as communicate_error:
-        print(f"Error communicating with ollama serve process: {communicate_error}")
-except FileNotFoundError:
-    print("Ollama command not found. Make sure it's in the PATH.")
-except subprocess.TimeoutExpired:
-    print("Ollama list command timed out.")
-
-# 00 download models
-import subprocess
+        print("Ollama list command timed out.")
 
-try:
-    result = subprocess.run(
-        ['ollama', 'pull', 'llama3.2-vision:11b-instruct-fp16'],
-        capture_output=True,
-        text=True,
-        check=True
-    )
-    print("STDOUT:")
-    print(result.stdout)
-    print("STDERR:")
-    print(result.stderr)
-except subprocess.CalledProcessError as e:
-    print(f"Error pulling model: {e}")
-    print(f"STDOUT: {e.stdout}")
-    print(f"STDERR: {e.stderr}")
-except FileNotFoundError:
-    print("Ollama command not found. Make sure it's in the PATH.")
+    # 00 download models
+    try:
+        result = subprocess.run(
+            ['ollama', 'pull', 'llama3.2-vision:11b-instruct-fp16'],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        print("STDOUT:")
+        print(result.stdout)
+        print("STDERR:")
+        print(result.stderr)
+    except subprocess.CalledProcessError as e:
+        print(f"Error pulling model: {e}")
+        print(f"STDOUT: {e.stdout}")
+        print(f"STDERR: {e.stderr}")
+    except FileNotFoundError:
+        print("Ollama command not found. Make sure it's in the PATH.")
 
 
 ########################################################################
@@ -69,10 +76,6 @@ import pandas as pd
 import os
 import time
 import ollama  # NEU: Ollama-Bibliothek importiert
-import fitz  # PyMuPDF
-from PIL import Image
-from io import BytesIO
-import json
 from tqdm import tqdm
 import glob
 
@@ -81,16 +84,39 @@ import glob
 # --- KONFIGURATION ---
 # ===========================================================================================
 
-BASE_FOLDER = '/content/drive/MyDrive/term_paper_genai'
+# In Colab liegt das Projekt auf dem Drive, als Skript im Repository (Ordner über code_final)
+BASE_FOLDER = ('/content/drive/MyDrive/term_paper_genai' if IN_COLAB
+               else os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 SUBSET_INPUT_FOLDER = os.path.join(BASE_FOLDER, 'subsets_for_annotation')
 ANNOTATION_OUTPUT_FOLDER = os.path.join(BASE_FOLDER, 'annotations_ollama_llava:13b')
 PROMPT_FILE_PATH = os.path.join(BASE_FOLDER, "prompts/03_api_annotation_prompt_v01.md")
 
+# Gemeinsamer Seitenzugriff (x00_page_access.py) liegt im code_final-Ordner auf dem Drive
+import sys
+sys.path.insert(0, os.path.join(BASE_FOLDER, 'code_final'))
+from x00_page_access import AnnotationJob, page_id_from_row, page_ref_from_row
+from x00_result_journal import ResultJournal, apply_results, journal_path_for, load_journal
+from x00_render_cache import configure_render_cache
+from x00_llm_cache import configure_response_cache
+from x00_annotation_backend import OllamaClientBackend, OllamaHTTPBackend
+from x00_cli import add_run_arguments, add_tiling_arguments, expand_subsets, make_parser, parse_run_arguments
+from x00_adaptive_dpi import adaptive_tradeoff_report, annotate_adaptive
+from x00_tiling import annotate_tiled, tile_dpi, tiling_comparison_report, timed
+configure_render_cache(os.path.join(BASE_FOLDER, 'render_cache'))
+# Antworten auf dem Drive cachen, damit ein neuer Colab-Lauf bekannte Seiten nicht erneut anfragt
+configure_response_cache(os.path.join(BASE_FOLDER, 'llm_cache.sqlite'))
+
 
 # GEÄNDERT: Modell- und Host-Konfiguration für Ollama
 OLLAMA_MODEL = "llama3.2-vision:11b-instruct-fp16"
 # OLLAMA_HOST = "http://localhost:11434"
+OLLAMA_ENDPOINT = "http://localhost:11434/api/generate"
+
+# NEU: Gleichzeitig offene Anfragen (Ollama mit OLLAMA_NUM_PARALLEL >= diesem Wert starten)
+MAX_IN_FLIGHT = 4
+# Anbindung an Ollama (x00_annotation_backend): 'ollama-http' (/api/generate) oder 'ollama-client' (ollama.Client.chat)
+BACKEND = 'ollama-http'
 
 # NEU: Seed für reproduzierbare Ergebnisse setzen.
 # Ändern Sie die Zahl, um andere (aber konsistente) Ergebnisse zu erhalten.
@@ -106,6 +132,13 @@ GENERATION_CONFIG = {
 
 # Bild-Rendering-Einstellungen (bleiben unverändert)
 IMAGE_DPI = 96
+# Adaptive DPI: unsichere Seiten (99, fehlendes warning/prod_alc) mit dieser DPI wiederholen (None = aus)
+HIGH_DPI = None
+# Kachelung dichter Seiten: Raster (zeilen, spalten), z.B. (2, 2); None = ganze Seite
+TILE_GRID = None
+TILE_OVERLAP = 0.08
+# Vergleichslauf ganze Seite vs. Kacheln (Latenz und Genauigkeit gegen Goldstandard)
+COMPARE_TILING = False
 IMAGE_GRAYSCALE = True
 IMAGE_QUALITY = 75
 
@@ -171,54 +204,23 @@ def load_prompt_from_file(file_path):
 # --- HAUPTFUNKTIONEN ---
 # ==============================================================================
 
-# GEÄNDERT: Komplette Funktion zum Aufruf von Ollama statt Gemini
-def annotate_page_with_ollama(pdf_path, client, model_name, prompt_content, generation_options):
-    """
-    Rendert eine PDF-Seite als Bild, sendet sie an ein Ollama Vision-Modell
-    und gibt das Ergebnis-JSON zurück.
-    """
-    # 1. PDF-Seite als Bild rendern (Logik ist identisch)
-    try:
-        with fitz.open(pdf_path) as doc:
-            page = doc.load_page(0)
-            pix = page.get_pixmap(dpi=IMAGE_DPI, colorspace=fitz.csGRAY if IMAGE_GRAYSCALE else fitz.csRGB)
-            img = Image.frombytes("L" if IMAGE_GRAYSCALE else "RGB", [pix.width, pix.height], pix.samples)
+def make_backend(model, config):
+    """Ollama-Backend nach BACKEND mit den Render-Einstellungen dieses Skripts."""
+    settings = dict(options=config, max_concurrency=MAX_IN_FLIGHT,
+                    render_options={'dpi': IMAGE_DPI, 'grayscale': IMAGE_GRAYSCALE, 'quality': IMAGE_QUALITY})
+    if BACKEND == 'ollama-client':
+        return OllamaClientBackend(model, **settings)
+    return OllamaHTTPBackend(model, endpoint=OLLAMA_ENDPOINT, **settings)
 
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=IMAGE_QUALITY)
-            image_bytes = buffer.getvalue() # Wir benötigen die Bytes des Bildes
 
-    except Exception as e:
-        return {"error": f"Image rendering failed: {e}"}
-
-    # 2. Ollama API aufrufen
-    try:
-        response = client.chat(
-            model=model_name,
-            messages=[
-                {
-                    'role': 'user',
-                    'content': prompt_content,
-                    'images': [image_bytes] # Bild-Bytes direkt übergeben
-                }
-            ],
-            options=generation_options, # Optionen wie temperature und seed übergeben
-            format="json" # NEU: Ollama anweisen, direkt ein JSON-Objekt auszugeben
-        )
-
-        # Die Antwort von Ollama ist bereits ein JSON-String, wenn format="json" verwendet wird.
-        # Wir müssen ihn nur noch in ein Python-Dictionary umwandeln.
-        # Der JSON-String befindet sich in response['message']['content']
-        cleaned_response = response['message']['content']
-        return json.loads(cleaned_response)
-
-    except Exception as e:
-        return {"error": f"Ollama API call failed: {e}"}
-
-
-def process_subset(input_csv_path, output_csv_path, client, model, prompt, config):
+def process_subset(input_csv_path, output_csv_path, model, prompt, config, resume=True):
     """
     Führt den Annotations-Workflow für eine einzelne Subset-CSV-Datei aus.
+
+    Die Seiten werden nebenläufig über das Ollama-Backend (x00_annotation_backend)
+    annotiert: bis zu MAX_IN_FLIGHT Anfragen sind gleichzeitig offen, das
+    Rendern läuft parallel dazu im Hintergrund. Mit resume=False werden
+    Journal und vorhandene Annotationen ignoriert.
     """
     try:
         df = pd.read_csv(input_csv_path)
@@ -227,24 +229,36 @@ def process_subset(input_csv_path, output_csv_path, client, model, prompt, confi
         print(f"FEHLER: Eingabedatei nicht gefunden: {input_csv_path}")
         return
 
-    for index, row in tqdm(df.iterrows(), total=df.shape[0], desc=f"Annotiere {os.path.basename(input_csv_path)}"):
-        pdf_path = row['page_pdf_path']
+    # Ergebnisse früherer (auch abgebrochener) Läufe aus dem Journal übernehmen
+    page_ids = pd.Series([page_id_from_row(row) for _, row in df.iterrows()], index=df.index)
+    journal_path = journal_path_for(output_csv_path)
+    previous = load_journal(journal_path) if resume else {}
+    if previous:
+        restored = apply_results(df, page_ids, previous, ANNOTATION_COLS, ERROR_COL)
+        print(f"-> {restored} Seiten aus dem Journal übernommen ({journal_path}).")
+
+    jobs = []
+    for index, row in df.iterrows():
+        pdf_path, page_index = page_ref_from_row(row)
 
         # Pfade für Colab anpassen, falls sie relativ sind
         if not os.path.isabs(pdf_path):
              pdf_path = os.path.join(BASE_FOLDER, pdf_path)
 
-
-        if pd.notna(row.get(ANNOTATION_COLS[0])) and pd.isna(row.get(ERROR_COL)):
+        if resume and pd.notna(row.get(ANNOTATION_COLS[0])) and pd.isna(row.get(ERROR_COL)):
              continue
 
         if not os.path.exists(pdf_path):
             df.loc[index, ERROR_COL] = f"File not found: {pdf_path}"
             continue
 
-        # GEÄNDERT: Ruft die neue Ollama-Funktion auf
-        result = annotate_page_with_ollama(pdf_path, client, model, prompt, config)
+        jobs.append(AnnotationJob(index, prompt, (pdf_path, page_index)))
 
+    progress = tqdm(total=len(jobs), desc=f"Annotiere {os.path.basename(input_csv_path)}")
+
+    def store_result(index, result):
+        # Jedes Ergebnis sofort ins Journal, die CSV wird erst am Ende geschrieben
+        journal.append(page_ids[index], result)
         if "error" in result:
             df.loc[index, ERROR_COL] = result["error"]
         else:
@@ -252,31 +266,99 @@ def process_subset(input_csv_path, output_csv_path, client, model, prompt, confi
             for col in ANNOTATION_COLS:
                 df.loc[index, col] = result.get(col, pd.NA)
 
-        if (index + 1) % 50 == 0:
-            df.to_csv(output_csv_path, index=False, encoding='utf-8-sig')
+        progress.update(1)
+
+    backend = make_backend(model, config)
+
+    def run_pages(page_jobs, dpi, on_result=None, tiled=False, use_cache=True):
+        """Annotiert Seiten als Ganzes oder in Kacheln; liefert (Ergebnisse, Statistik)."""
+        run_backend = backend if use_cache else backend.without_cache()
+        if tiled:
+            grid = TILE_GRID or (2, 2)
+            tile_backend = run_backend.with_render_options(dpi=tile_dpi(dpi, grid))
+            return annotate_tiled(page_jobs, tile_backend.run, grid, TILE_OVERLAP, on_result)
+        return run_backend.with_render_options(dpi=dpi).run(page_jobs, on_result)
+
+    def annotate_at(dpi_jobs, dpi):
+        escalation = dpi != IMAGE_DPI
+        progress.reset(total=len(dpi_jobs))
+        progress.set_description(f"Annotiere {os.path.basename(input_csv_path)} ({dpi} DPI)")
+
+        def on_result(index, result):
+            # Fehlgeschlagene Wiederholungen überschreiben das Ergebnis mit niedriger DPI nicht
+            if escalation and result.get("error"):
+                progress.update(1)
+            else:
+                store_result(index, result)
+
+        results, stats = run_pages(dpi_jobs, dpi, on_result, tiled=bool(TILE_GRID))
+        print(f"-> Durchsatz ({dpi} DPI): {stats.summary()}")
+        return results
+
+    with ResultJournal(journal_path) as journal:
+        if HIGH_DPI and jobs:
+            results, low_results, dpi_used = annotate_adaptive(jobs, annotate_at, IMAGE_DPI, HIGH_DPI)
+            df.loc[list(dpi_used), 'image_dpi'] = pd.Series(dpi_used)
+        else:
+            annotate_at(jobs, IMAGE_DPI)
+    progress.close()
 
     df.to_csv(output_csv_path, index=False, encoding='utf-8-sig')
     print(f"-> Annotation für '{os.path.basename(input_csv_path)}' abgeschlossen.")
+    if HIGH_DPI and jobs and any(f"{col}_gold" in df.columns for col in ANNOTATION_COLS):
+        report = adaptive_tradeoff_report(df, low_results, results, dpi_used, IMAGE_DPI, HIGH_DPI, ANNOTATION_COLS)
+        print("-> Kosten/Genauigkeit (adaptive DPI, gegen Goldstandard):\n" + report.to_string(index=False))
+    if COMPARE_TILING and jobs:
+        # Beide Varianten ohne Antwort-Cache, damit die Laufzeiten vergleichbar sind
+        grid = TILE_GRID or (2, 2)
+        (whole, _), whole_seconds = timed(run_pages, jobs, IMAGE_DPI, tiled=False, use_cache=False)
+        (tiles, _), tiled_seconds = timed(run_pages, jobs, IMAGE_DPI, tiled=True, use_cache=False)
+        report = tiling_comparison_report(
+            df, {'ganze Seite': (whole, whole_seconds), f'Kacheln {grid[0]}x{grid[1]}': (tiles, tiled_seconds)},
+            ANNOTATION_COLS)
+        print("-> Latenz/Genauigkeit (ganze Seite vs. Kacheln):\n" + report.to_string(index=False))
     print(f"-> Ergebnisse gespeichert in: {output_csv_path}")
 
 # ==============================================================================
 # --- HAUPTSKRIPT (STEUERUNG) ---
 # ==============================================================================
-if __name__ == "__main__":
+def main(argv=None):
+    """Einstieg ohne Rückfragen: annotiert alle Subsets, die --subsets trifft."""
+    # Die Optionen ersetzen die Konfigurationswerte oben im Skript
+    global MAX_IN_FLIGHT, IMAGE_DPI, HIGH_DPI, TILE_GRID, COMPARE_TILING, BACKEND
+    parser = add_run_arguments(
+        make_parser("Prospekt-Annotation mit Ollama (Colab)"),
+        model=OLLAMA_MODEL, prompt=PROMPT_FILE_PATH,
+        subsets=os.path.join(SUBSET_INPUT_FOLDER, '*.csv'),
+        concurrency=MAX_IN_FLIGHT, dpi=IMAGE_DPI)
+    parser.add_argument('--output-folder', default=ANNOTATION_OUTPUT_FOLDER, help="Ordner für die Ergebnis-CSVs")
+    parser.add_argument('--high-dpi', type=int, default=HIGH_DPI,
+                        help="Adaptive DPI: unsichere Seiten mit dieser Auflösung wiederholen")
+    parser.add_argument('--backend', choices=['ollama-http', 'ollama-client'], default=BACKEND,
+                        help=f"Anbindung an Ollama (Standard: {BACKEND})")
+    add_tiling_arguments(parser, grid=TILE_GRID, compare=COMPARE_TILING)
+    # In Colab/Jupyter stehen Kernel-Argumente in sys.argv -> unbekannte ignorieren
+    args = parse_run_arguments(parser, argv, ignore_unknown=True)
+    MAX_IN_FLIGHT, IMAGE_DPI, HIGH_DPI = args.concurrency, args.dpi, args.high_dpi
+    TILE_GRID, COMPARE_TILING, BACKEND = args.tiles, args.compare_tiling, args.backend
+
     print("==========================================================")
     print("=== Prospekt-Annotation mit Ollama gestartet           ===")
     print("==========================================================")
 
-    # ENTFERNT: API-Key-Konfiguration
-
     # Lade den Prompt
-    prompt_content = load_prompt_from_file(PROMPT_FILE_PATH)
+    prompt_content = load_prompt_from_file(args.prompt)
     if prompt_content is None:
-        exit()
+        return 1
     print("Prompt erfolgreich geladen.")
 
+    subsets = expand_subsets(args.subsets)
+    if not subsets:
+        print(f"FEHLER: Keine Subsets gefunden für '{args.subsets}'.")
+        return 1
+
     prepare_all_csv_files(SUBSET_INPUT_FOLDER)
-    os.makedirs(ANNOTATION_OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(args.output_folder, exist_ok=True)
 
     # NEU: Initialisiere den Ollama-Client
     try:
@@ -285,65 +367,23 @@ if __name__ == "__main__":
         client = ollama.Client()
         # Ping den Server, um sicherzustellen, dass er erreichbar ist
         client.list()
-        print(f"Erfolgreich mit Ollama verbunden. Standardmodell: {OLLAMA_MODEL}")
+        print(f"Erfolgreich mit Ollama verbunden. Modell: {args.model}")
     except Exception as e:
         print(f"FATALER FEHLER: Konnte keine Verbindung zu Ollama herstellen.")
         print("Stellen Sie sicher, dass Ollama läuft (entweder lokal oder in Colab).")
         print(f"Fehlerdetails: {e}")
-        exit()
-
-
-    # Der Rest der Logik mit der Modus-Auswahl bleibt identisch.
-    while True:
-        print("\n--- Modus auswählen ---")
-        mode = input(
-            "Wählen Sie eine Option:\n"
-            "  1: Testlauf (annotiert eine einzelne, anzugebende Datei)\n"
-            "  2: Vollständiger Lauf (annotiert ALLE restlichen Dateien im Input-Ordner)\n"
-            "  x: Beenden\n"
-            "Ihre Wahl: "
-        )
+        return 1
 
-        if mode == '1':
-            test_filename = input("Geben Sie den Dateinamen des Test-Subsets an (z.B. subset_1.csv): ")
-            input_path = os.path.join(SUBSET_INPUT_FOLDER, test_filename)
-            output_filename = test_filename.replace('.csv', '_annotated_ollama.csv')
-            output_path = os.path.join(ANNOTATION_OUTPUT_FOLDER, output_filename)
-
-            if not os.path.exists(input_path):
-                print(f"FEHLER: Die Testdatei '{input_path}' wurde nicht gefunden.")
-                continue
-
-            print(f"\n--- Starte TESTLAUF für {test_filename} ---")
-            process_subset(input_path, output_path, client, OLLAMA_MODEL, prompt_content, GENERATION_CONFIG)
-            break
-
-        elif mode == '2':
-            print("\n--- Starte VOLLSTÄNDIGEN LAUF ---")
-            confirm = input(f"WARNUNG: Dies wird alle CSV-Dateien im Ordner '{SUBSET_INPUT_FOLDER}' verarbeiten. Fortfahren? (j/n): ")
-            if confirm.lower() != 'j':
-                print("Abgebrochen.")
-                continue
-
-            all_subsets = sorted(glob.glob(os.path.join(SUBSET_INPUT_FOLDER, '*.csv')))
-            if not all_subsets:
-                 print("Keine Subsets im Input-Ordner gefunden. Beende.")
-                 break
-
-            print(f"Gefunden: {len(all_subsets)} Subset-Dateien.")
-            for i, subset_path in enumerate(all_subsets):
-                print(f"\n--- Verarbeite Datei {i+1}/{len(all_subsets)} ---")
-                output_filename = os.path.basename(subset_path).replace('.csv', '_annotated_ollama.csv')
-                output_path = os.path.join(ANNOTATION_OUTPUT_FOLDER, output_filename)
-                process_subset(subset_path, output_path, client, OLLAMA_MODEL, prompt_content, GENERATION_CONFIG)
-            break
-
-        elif mode.lower() == 'x':
-            print("Skript beendet.")
-            break
-        else:
-            print("Ungültige Eingabe. Bitte wählen Sie 1, 2 oder x.")
+    print(f"Gefunden: {len(subsets)} Subset-Dateien.")
+    for i, subset_path in enumerate(subsets):
+        print(f"\n--- Verarbeite Datei {i+1}/{len(subsets)} ---")
+        output_filename = os.path.basename(subset_path).replace('.csv', '_annotated_ollama.csv')
+        output_path = os.path.join(args.output_folder, output_filename)
+        process_subset(subset_path, output_path, args.model, prompt_content, GENERATION_CONFIG, resume=args.resume)
+
+    print("==========================================================")
+    return 0
 
-    print(f"\n==========================================================")
-    print(f"Workflow abgeschlossen!")
-    print(f"==========================================================")
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,20 @@
 # import necessary stuff
 import pandas as pd
 import os
+import sys
 import time
 import google.generativeai as genai
-import fitz  # PyMuPDF
-from PIL import Image
-from io import BytesIO
-import json
 from tqdm import tqdm # Für eine schöne Fortschrittsanzeige
 from dotenv import load_dotenv
 import glob # Hinzugefügt, um einfach nach Dateien zu suchen
+from x00_page_access import AnnotationJob, page_id_from_row, page_ref_from_row
+from x00_result_journal import ResultJournal, apply_results, journal_path_for, load_journal
+from x00_render_cache import get_render_cache
+from x00_llm_cache import get_response_cache
+from x00_annotation_backend import GeminiBackend
+from x00_cli import add_run_arguments, add_tiling_arguments, expand_subsets, make_parser, parse_run_arguments
+from x00_adaptive_dpi import adaptive_tradeoff_report, annotate_adaptive
+from x00_tiling import annotate_tiled, tile_dpi, tiling_comparison_report, timed
 
 # ==============================================================================
 # --- KONFIGURATION ---
@@ -30,8 +35,22 @@ GENERATION_CONFIG = {
     "temperature": 0,
 }
 
+# Quoten und Nebenläufigkeit (an das eigene API-Kontingent anpassen)
+GEMINI_RPM = 15           # Anfragen pro Minute (Free Tier gemini-2.0-flash)
+GEMINI_TPM = 1_000_000    # Tokens pro Minute
+MAX_CONCURRENCY = 8       # Gleichzeitige Anfragen
+MAX_RETRIES = 5           # Wiederholungen pro Seite bei 429/5xx/Timeout
+
 # Bild-Rendering-Einstellungen (Kompromiss zwischen Qualität und Kosten)
 IMAGE_DPI = 96      # Niedrigere DPI = kleinere Dateigröße & Kosten
+# Adaptive DPI: unsichere Seiten (99, fehlendes warning/prod_alc) mit dieser DPI wiederholen (None = aus)
+HIGH_DPI = None
+# Kachelung dichter Seiten: Raster (zeilen, spalten), z.B. (2, 2); None = ganze Seite.
+# Achtung: jede Kachel ist eine eigene Anfrage und zählt gegen RPM/TPM.
+TILE_GRID = None
+TILE_OVERLAP = 0.08
+# Vergleichslauf ganze Seite vs. Kacheln (Latenz und Genauigkeit gegen Goldstandard)
+COMPARE_TILING = False
 IMAGE_GRAYSCALE = True # Graustufen sind für Texterkennung oft ausreichend
 IMAGE_QUALITY = 75  # JPEG-Qualität
 
@@ -109,46 +128,15 @@ def load_prompt_from_file(file_path):
 # --- HAUPTFUNKTIONEN ---
 # ==============================================================================
 
-def annotate_page_with_gemini(pdf_path, model, prompt_content, generation_config):
-    """
-    Rendert eine PDF-Seite als Bild, sendet sie an Gemini und gibt das Ergebnis-JSON zurück.
-    """
-    # 1. PDF-Seite als Bild rendern
-    try:
-        with fitz.open(pdf_path) as doc:
-            page = doc.load_page(0) # Annahme: jede PDF-Datei hat nur eine Seite
-            pix = page.get_pixmap(
-                dpi=IMAGE_DPI,
-                colorspace=fitz.csGRAY if IMAGE_GRAYSCALE else fitz.csRGB
-            )
-            img = Image.frombytes("L" if IMAGE_GRAYSCALE else "RGB", [pix.width, pix.height], pix.samples)
-
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=IMAGE_QUALITY)
-            image_for_api = Image.open(buffer)
-
-    except Exception as e:
-        return {"error": f"Image rendering failed: {e}"}
-
-    # 2. Gemini API aufrufen
-    try:
-        # --- ANGEPASST: Übergabe der generation_config mit temperature=0 ---
-        response = model.generate_content(
-            [prompt_content, image_for_api],
-            generation_config=generation_config
-        )
-
-        # Bereinigen der Antwort, um nur das JSON zu extrahieren
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "").strip()
-        return json.loads(cleaned_response)
-
-    except Exception as e:
-        return {"error": f"Gemini API call failed: {e}"}
-
-
-def process_subset(input_csv_path, output_csv_path, model, prompt, config):
+def process_subset(input_csv_path, output_csv_path, model, prompt, config, resume=True):
     """
     Führt den Annotations-Workflow für eine einzelne Subset-CSV-Datei aus.
+
+    Die Seiten werden nebenläufig über das Gemini-Backend annotiert
+    (x00_annotation_backend, x00_gemini_runner). Dabei werden
+    die RPM/TPM-Quoten eingehalten, und vorübergehende Fehler (z.B. 429)
+    werden mit Backoff wiederholt, bevor eine Seite als Fehler endet.
+    Mit resume=False werden Journal und vorhandene Annotationen ignoriert.
     """
     try:
         df = pd.read_csv(input_csv_path)
@@ -157,21 +145,35 @@ def process_subset(input_csv_path, output_csv_path, model, prompt, config):
         print(f"FEHLER: Eingabedatei nicht gefunden: {input_csv_path}")
         return
 
-    # tqdm sorgt für eine Fortschrittsanzeige
-    for index, row in tqdm(df.iterrows(), total=df.shape[0], desc=f"Annotiere {os.path.basename(input_csv_path)}"):
-        pdf_path = row['page_pdf_path']
+    # Ergebnisse früherer (auch abgebrochener) Läufe aus dem Journal übernehmen
+    page_ids = pd.Series([page_id_from_row(row) for _, row in df.iterrows()], index=df.index)
+    journal_path = journal_path_for(output_csv_path)
+    previous = load_journal(journal_path) if resume else {}
+    if previous:
+        restored = apply_results(df, page_ids, previous, ANNOTATION_COLS, ERROR_COL)
+        print(f"-> {restored} Seiten aus dem Journal übernommen ({journal_path}).")
+
+    jobs = []
+    for index, row in df.iterrows():
+        page_ref = page_ref_from_row(row)
+        pdf_path = page_ref[0]
 
         # Überspringe bereits erfolgreich annotierte Zeilen (optional, aber nützlich bei Wiederaufnahme)
-        if pd.notna(row.get(ANNOTATION_COLS[0])) and pd.isna(row.get(ERROR_COL)):
+        if resume and pd.notna(row.get(ANNOTATION_COLS[0])) and pd.isna(row.get(ERROR_COL)):
              continue
 
         if not os.path.exists(pdf_path):
             df.loc[index, ERROR_COL] = "File not found"
             continue
 
-        # API-Aufruf durchführen
-        result = annotate_page_with_gemini(pdf_path, model, prompt, config)
+        jobs.append(AnnotationJob(index, prompt, page_ref))
+
+    # tqdm sorgt für eine Fortschrittsanzeige
+    progress = tqdm(total=len(jobs), desc=f"Annotiere {os.path.basename(input_csv_path)}")
 
+    def store_result(index, result):
+        # Jedes Ergebnis sofort ins Journal, die CSV wird erst am Ende geschrieben
+        journal.append(page_ids[index], result)
         # Ergebnisse in den DataFrame schreiben
         if "error" in result:
             df.loc[index, ERROR_COL] = result["error"]
@@ -180,94 +182,126 @@ def process_subset(input_csv_path, output_csv_path, model, prompt, config):
             for col in ANNOTATION_COLS:
                 df.loc[index, col] = result.get(col, pd.NA)
 
-        # Optionale Zwischenspeicherung
-        if (index + 1) % 50 == 0:
-            df.to_csv(output_csv_path, index=False, encoding='utf-8-sig')
+        progress.update(1)
+
+    backend = GeminiBackend(
+        GEMINI_MODEL, generative_model=model, options=config,
+        render_options={'dpi': IMAGE_DPI, 'grayscale': IMAGE_GRAYSCALE, 'quality': IMAGE_QUALITY},
+        max_concurrency=MAX_CONCURRENCY, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_retries=MAX_RETRIES)
+
+    def run_pages(page_jobs, dpi, on_result=None, tiled=False, use_cache=True):
+        """Annotiert Seiten als Ganzes oder in Kacheln; liefert (Ergebnisse, Statistik)."""
+        run_backend = backend if use_cache else backend.without_cache()
+        if tiled:
+            grid = TILE_GRID or (2, 2)
+            tile_backend = run_backend.with_render_options(dpi=tile_dpi(dpi, grid))
+            return annotate_tiled(page_jobs, tile_backend.run, grid, TILE_OVERLAP, on_result)
+        return run_backend.with_render_options(dpi=dpi).run(page_jobs, on_result)
+
+    def annotate_at(dpi_jobs, dpi):
+        escalation = dpi != IMAGE_DPI
+        progress.reset(total=len(dpi_jobs))
+        progress.set_description(f"Annotiere {os.path.basename(input_csv_path)} ({dpi} DPI)")
+
+        def on_result(index, result):
+            # Fehlgeschlagene Wiederholungen überschreiben das Ergebnis mit niedriger DPI nicht
+            if escalation and result.get("error"):
+                progress.update(1)
+            else:
+                store_result(index, result)
+
+        results, stats = run_pages(dpi_jobs, dpi, on_result, tiled=bool(TILE_GRID))
+        print(f"-> Durchsatz ({dpi} DPI): {stats.summary()}")
+        return results
+
+    with ResultJournal(journal_path) as journal:
+        if HIGH_DPI and jobs:
+            results, low_results, dpi_used = annotate_adaptive(jobs, annotate_at, IMAGE_DPI, HIGH_DPI)
+            df.loc[list(dpi_used), 'image_dpi'] = pd.Series(dpi_used)
+        else:
+            annotate_at(jobs, IMAGE_DPI)
+    progress.close()
 
     # Finale Speicherung der Ergebnisse für diese Datei
     df.to_csv(output_csv_path, index=False, encoding='utf-8-sig')
     print(f"-> Annotation für '{os.path.basename(input_csv_path)}' abgeschlossen.")
+    if HIGH_DPI and jobs and any(f"{col}_gold" in df.columns for col in ANNOTATION_COLS):
+        report = adaptive_tradeoff_report(df, low_results, results, dpi_used, IMAGE_DPI, HIGH_DPI, ANNOTATION_COLS)
+        print("-> Kosten/Genauigkeit (adaptive DPI, gegen Goldstandard):\n" + report.to_string(index=False))
+    if COMPARE_TILING and jobs:
+        # Beide Varianten ohne Antwort-Cache, damit die Laufzeiten vergleichbar sind
+        grid = TILE_GRID or (2, 2)
+        (whole, _), whole_seconds = timed(run_pages, jobs, IMAGE_DPI, tiled=False, use_cache=False)
+        (tiles, _), tiled_seconds = timed(run_pages, jobs, IMAGE_DPI, tiled=True, use_cache=False)
+        report = tiling_comparison_report(
+            df, {'ganze Seite': (whole, whole_seconds), f'Kacheln {grid[0]}x{grid[1]}': (tiles, tiled_seconds)},
+            ANNOTATION_COLS)
+        print("-> Latenz/Genauigkeit (ganze Seite vs. Kacheln):\n" + report.to_string(index=False))
     print(f"-> Ergebnisse gespeichert in: {output_csv_path}")
+    print(f"-> Render-Cache: {get_render_cache().stats()}")
+    print(f"-> Antwort-Cache: {get_response_cache().stats()}")
 
 # ==============================================================================
 # --- HAUPTSKRIPT (STEUERUNG) ---
 # ==============================================================================
-if __name__ == "__main__":
+def main(argv=None):
+    """Kommandozeilen-Einstieg: annotiert alle Subsets ohne Rückfragen."""
+    # Die Optionen ersetzen die Konfigurationswerte oben im Skript
+    global GEMINI_MODEL, GEMINI_RPM, MAX_CONCURRENCY, IMAGE_DPI, HIGH_DPI, TILE_GRID, COMPARE_TILING
+    parser = add_run_arguments(
+        make_parser("Prospekt-Annotation mit der Gemini-API"),
+        model=GEMINI_MODEL, prompt=PROMPT_FILE_PATH,
+        subsets=os.path.join(SUBSET_INPUT_FOLDER, '*.csv'),
+        concurrency=MAX_CONCURRENCY, dpi=IMAGE_DPI)
+    parser.add_argument('--output-folder', default=ANNOTATION_OUTPUT_FOLDER, help="Ordner für die Ergebnis-CSVs")
+    parser.add_argument('--rpm', type=int, default=GEMINI_RPM, help="Anfragen pro Minute")
+    parser.add_argument('--high-dpi', type=int, default=HIGH_DPI,
+                        help="Adaptive DPI: unsichere Seiten mit dieser Auflösung wiederholen")
+    add_tiling_arguments(parser, grid=TILE_GRID, compare=COMPARE_TILING)
+    args = parse_run_arguments(parser, argv)
+    GEMINI_MODEL, GEMINI_RPM = args.model, args.rpm
+    MAX_CONCURRENCY, IMAGE_DPI, HIGH_DPI = args.concurrency, args.dpi, args.high_dpi
+    TILE_GRID, COMPARE_TILING = args.tiles, args.compare_tiling
+
     print("==========================================================")
-    print("=== Prospekt-Annotation mit Gemini 2.0 Flash gestartet ===")
+    print(f"=== Prospekt-Annotation mit {args.model} gestartet ===")
     print("==========================================================")
 
     # API-Key konfigurieren
     setup_api_key()
 
     # Lade den Prompt
-    prompt_content = load_prompt_from_file(PROMPT_FILE_PATH)
+    prompt_content = load_prompt_from_file(args.prompt)
     if prompt_content is None:
-        exit()
+        return 1
     print("Prompt erfolgreich geladen.")
 
+    subsets = expand_subsets(args.subsets)
+    if not subsets:
+        print(f"FEHLER: Keine Subsets gefunden für '{args.subsets}'.")
+        return 1
+
     # Bereite alle CSVs im Input-Ordner vor (füge Spalten hinzu, falls nötig)
     prepare_all_csv_files(SUBSET_INPUT_FOLDER)
 
     # Erstelle den Ausgabeordner, falls er nicht existiert
-    os.makedirs(ANNOTATION_OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(args.output_folder, exist_ok=True)
 
     # Initialisiere das Gemini-Modell
     model = genai.GenerativeModel(GEMINI_MODEL)
 
-    # --- NEU: Auswahl des Ausführungsmodus ---
-    while True:
-        print("\n--- Modus auswählen ---")
-        mode = input(
-            "Wählen Sie eine Option:\n"
-            "  1: Testlauf (annotiert eine einzelne, anzugebende Datei)\n"
-            "  2: Vollständiger Lauf (annotiert ALLE restlichen Dateien im Input-Ordner)\n"
-            "  x: Beenden\n"
-            "Ihre Wahl: "
-        )
-
-        if mode == '1':
-            # --- TESTLAUF ---
-            test_filename = input("Geben Sie den Dateinamen des Test-Subsets an (z.B. subset_1.csv): ")
-            input_path = os.path.join(SUBSET_INPUT_FOLDER, test_filename)
-            output_filename = test_filename.replace('.csv', '_annotated.csv')
-            output_path = os.path.join(ANNOTATION_OUTPUT_FOLDER, output_filename)
-
-            if not os.path.exists(input_path):
-                print(f"FEHLER: Die Testdatei '{input_path}' wurde nicht gefunden.")
-                continue
-
-            print(f"\n--- Starte TESTLAUF für {test_filename} ---")
-            process_subset(input_path, output_path, model, prompt_content, GENERATION_CONFIG)
-            break
-
-        elif mode == '2':
-            # --- VOLLSTÄNDIGER LAUF ---
-            print("\n--- Starte VOLLSTÄNDIGEN LAUF ---")
-            confirm = input(f"WARNUNG: Dies wird alle CSV-Dateien im Ordner '{SUBSET_INPUT_FOLDER}' verarbeiten. Fortfahren? (j/n): ")
-            if confirm.lower() != 'j':
-                print("Abgebrochen.")
-                continue
-
-            all_subsets = sorted(glob.glob(os.path.join(SUBSET_INPUT_FOLDER, '*.csv')))
-            if not all_subsets:
-                 print("Keine Subsets im Input-Ordner gefunden. Beende.")
-                 break
-            
-            print(f"Gefunden: {len(all_subsets)} Subset-Dateien.")
-            for i, subset_path in enumerate(all_subsets):
-                print(f"\n--- Verarbeite Datei {i+1}/{len(all_subsets)} ---")
-                output_filename = os.path.basename(subset_path).replace('.csv', '_annotated.csv')
-                output_path = os.path.join(ANNOTATION_OUTPUT_FOLDER, output_filename)
-                process_subset(subset_path, output_path, model, prompt_content, GENERATION_CONFIG)
-            break
-
-        elif mode.lower() == 'x':
-            print("Skript beendet.")
-            break
-        else:
-            print("Ungültige Eingabe. Bitte wählen Sie 1, 2 oder x.")
+    print(f"Gefunden: {len(subsets)} Subset-Dateien.")
+    for i, subset_path in enumerate(subsets):
+        print(f"\n--- Verarbeite Datei {i+1}/{len(subsets)} ---")
+        output_filename = os.path.basename(subset_path).replace('.csv', '_annotated.csv')
+        output_path = os.path.join(args.output_folder, output_filename)
+        process_subset(subset_path, output_path, model, prompt_content, GENERATION_CONFIG, resume=args.resume)
 
     print(f"\n==========================================================")
     print(f"Workflow abgeschlossen!")
-    print(f"==========================================================")
\ No newline at end of file
+    print(f"==========================================================")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
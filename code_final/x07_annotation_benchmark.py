@@ -0,0 +1,296 @@
+"""
+Durchsatz-Benchmark der Annotations-Pipelines ohne echtes Modell.
+
+Die Abläufe von x04, x04.2, x05 und x06 laufen gegen den lokalen Fake-Server
+(x00_mock_model_server) mit einstellbarer Latenz und Fehlerquote über einen
+synthetischen PDF-Korpus. Gemessen werden Seiten pro Sekunde und die Zeit je
+Schritt (extract, render, encode, request, parse, persist), sodass
+Verschlechterungen der Pipeline selbst sichtbar werden und nicht im Rauschen
+der Modell-Latenz untergehen.
+
+    python x07_annotation_benchmark.py --pages 200 --latency 0.05 --error-rate 0.02
+    python x07_annotation_benchmark.py --output benchmark.csv
+    python x07_annotation_benchmark.py --baseline benchmark.csv   # Exit-Code 1 bei Regression
+
+Antwort-Cache und Render-Cache werden pro Ablauf in einem leeren temporären
+Ordner angelegt, damit jeder Lauf kalt startet.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+import pandas as pd
+
+from x00_annotation_backend import GeminiBackend, OllamaClientBackend, OllamaHTTPBackend, StageTimings
+from x00_cli import make_parser, positive_int
+from x00_mock_model_server import MockModelServer
+from x00_page_access import AnnotationJob, page_label
+from x00_render_cache import configure_render_cache
+from x00_result_journal import ResultJournal
+from x00_text_extract import extract_texts_to_sink
+
+FLOWS = ('x04', 'x04.2', 'x05', 'x06')
+STAGES = ('extract', 'render', 'encode', 'request', 'parse', 'persist')
+# Wie in den Skripten: Mindesttext für die Text-Annotation (x04), Seiten pro Text-Batch (x04.2)
+TEXT_MIN_CHARS = 50
+TEXT_BATCH_MAX_PAGES = 16
+IMAGE_BATCH_SIZE = 12
+# Regression: Durchsatz mehr als TOLERANCE unter bzw. Schrittzeit mehr als TOLERANCE über der Baseline
+TOLERANCE = 0.15
+# Einstellungen, unter denen zwei Berichte vergleichbar sind
+SETTING_COLUMNS = ('latenz', 'fehlerquote', 'nebenlaeufig', 'dpi')
+
+PRODUCTS = ['Pils 0,5 l', 'Rotwein trocken 0,75 l', 'Wodka 0,7 l', 'Apfelsaft 1 l', 'Vollmilch 1 l',
+            'Bananen 1 kg', 'Kaffee 500 g', 'Schokolade 100 g', 'Sekt 0,75 l', 'Mineralwasser 1,5 l']
+
+
+# ==============================================================================
+# --- SYNTHETISCHER KORPUS ---
+# ==============================================================================
+
+def make_synthetic_corpus(folder, n_pages, pages_per_pdf=20, image_share=0.25, seed=0):
+    """
+    Erzeugt Prospekt-ähnliche PDFs: Raster aus Produktkästen mit Name und
+    Preis, ein Teil der Seiten nur aus Flächen ohne Textebene.
+
+    Args:
+        folder (str): Zielordner.
+        n_pages (int): Anzahl Seiten insgesamt.
+        pages_per_pdf (int): Seiten pro PDF.
+        image_share (float): Anteil der Seiten ohne Text (gehen in x04 an das Bildmodell).
+        seed (int): Seed für Inhalte und Layout.
+
+    Returns:
+        list: Seitenreferenzen (pdf_pfad, seitenindex).
+    """
+    rng = random.Random(seed)
+    page_refs = []
+    for pdf_no in range((n_pages + pages_per_pdf - 1) // pages_per_pdf):
+        pdf_path = os.path.join(folder, f"synthetic_{pdf_no:03d}.pdf")
+        doc = fitz.open()
+        for page_index in range(min(pages_per_pdf, n_pages - pdf_no * pages_per_pdf)):
+            page = doc.new_page(width=595, height=842)  # A4
+            text_page = rng.random() >= image_share
+            for row in range(4):
+                for col in range(3):
+                    x0, y0 = 20 + col * 190, 40 + row * 200
+                    shade = rng.uniform(0.3, 0.9)
+                    page.draw_rect(fitz.Rect(x0, y0, x0 + 180, y0 + 120), color=None, fill=(shade, shade * 0.8, 0.5))
+                    if text_page:
+                        page.insert_text((x0, y0 + 140), rng.choice(PRODUCTS), fontsize=11)
+                        euros, cents = rng.randint(0, 19), rng.choice([29, 49, 79, 99])
+                        page.insert_text((x0, y0 + 165), f"{euros},{cents} €", fontsize=16)
+                        if rng.random() < 0.3:
+                            page.insert_text((x0 + 100, y0 + 165), f"statt {euros + 1},{cents}", fontsize=8)
+            page_refs.append((pdf_path, page_index))
+        doc.save(pdf_path)
+        doc.close()
+    return page_refs
+
+
+# ==============================================================================
+# --- ABLÄUFE (wie in den Skripten, aber gegen den Fake-Server) ---
+# ==============================================================================
+
+def _journal_sink(journal, results):
+    """on_result wie in den Skripten: Ergebnis ins Journal und in den Ergebnis-Dict."""
+    def on_result(key, result):
+        journal.append(str(key), result)
+        results[key] = result
+    return on_result
+
+
+def _extract_texts(page_refs, timings):
+    texts = {}
+
+    def sink(chunk_df):
+        texts.update(zip(chunk_df['key'], chunk_df['extracted_text'].fillna('')))
+
+    with timings.measure('extract'):
+        extract_texts_to_sink(enumerate(page_refs), sink)
+    return texts
+
+
+def run_x04(page_refs, server, args, timings, journal):
+    """Hybrid: Text-Annotation für Seiten mit Textebene, Bild-Annotation für den Rest."""
+    backend = OllamaHTTPBackend('mock-vision', endpoint=f"{server.url}/api/generate", timeout=60,
+                                max_concurrency=args.concurrency, render_options={'dpi': args.dpi},
+                                use_cache=False, timings=timings)
+    results = {}
+    texts = _extract_texts(page_refs, timings)
+    text_jobs = [AnnotationJob(key, f"Annotate:\n{text}", None)
+                 for key, text in texts.items() if len(text) > TEXT_MIN_CHARS]
+    backend.run(text_jobs, _journal_sink(journal, results))
+    image_jobs = [AnnotationJob(key, "Annotate the image.", page_refs[key])
+                  for key in range(len(page_refs)) if key not in results]
+    _, stats = backend.run(image_jobs, _journal_sink(journal, results))
+    return results, stats.engine_stats
+
+
+def run_x04_2(page_refs, server, args, timings, journal):
+    """Zwei Schritte: Text-Klassifizierung in Batches, dann Bild-Annotation in Batches."""
+    text_backend = OllamaHTTPBackend('mock-text', endpoint=f"{server.url}/api/generate", timeout=60,
+                                     max_concurrency=args.concurrency, use_cache=False, timings=timings)
+    image_backend = OllamaHTTPBackend('mock-vision', endpoint=f"{server.url}/api/generate", timeout=60,
+                                      max_concurrency=args.concurrency, render_options={'dpi': args.dpi},
+                                      use_cache=False, timings=timings)
+    texts = _extract_texts(page_refs, timings)
+    items = [(key, text[:3000]) for key, text in texts.items() if len(text.strip()) >= 10]
+    batch_jobs = []
+    for batch_no, start in enumerate(range(0, len(items), TEXT_BATCH_MAX_PAGES)):
+        batch = items[start:start + TEXT_BATCH_MAX_PAGES]
+        batch_of_texts = json.dumps([{"ID": i, "TEXT": text} for i, (_, text) in enumerate(batch)], ensure_ascii=False)
+        batch_jobs.append(AnnotationJob(('batch', batch_no), f"Classify:\n{batch_of_texts}", None))
+    _, text_stats = text_backend.run(batch_jobs)
+
+    results = {}
+    image_jobs = [AnnotationJob(key, "Annotate the image.", page_ref) for key, page_ref in enumerate(page_refs)]
+    _, image_stats = image_backend.run(image_jobs, _journal_sink(journal, results), batch_size=IMAGE_BATCH_SIZE)
+    return results, text_stats.engine_stats + image_stats.engine_stats
+
+
+def run_x05(page_refs, server, args, timings, journal):
+    """Bild-Annotation aller Seiten über Ollama (HTTP oder Python-Client)."""
+    settings = dict(max_concurrency=args.concurrency, render_options={'dpi': args.dpi},
+                    options={'temperature': 0, 'seed': 42}, use_cache=False, timings=timings)
+    if args.ollama_client:
+        backend = OllamaClientBackend('mock-vision', host=server.url, **settings)
+    else:
+        backend = OllamaHTTPBackend('mock-vision', endpoint=f"{server.url}/api/generate", timeout=60, **settings)
+    results = {}
+    jobs = [AnnotationJob(key, "Annotate the image.", page_ref) for key, page_ref in enumerate(page_refs)]
+    _, stats = backend.run(jobs, _journal_sink(journal, results))
+    return results, stats.engine_stats
+
+
+def run_x06(page_refs, server, args, timings, journal):
+    """Bild-Annotation über die Gemini-REST-API mit RPM-Limit und Wiederholungen."""
+    backend = GeminiBackend('gemini-2.0-flash', base_url=server.url, api_key='fake', options={'temperature': 0},
+                            max_concurrency=args.concurrency, render_options={'dpi': args.dpi},
+                            rpm=args.rpm, use_cache=False, timings=timings)
+    results = {}
+    jobs = [AnnotationJob(key, "Annotate the image.", page_ref) for key, page_ref in enumerate(page_refs)]
+    _, stats = backend.run(jobs, _journal_sink(journal, results))
+    return results, stats.engine_stats
+
+
+FLOW_FUNCTIONS = {'x04': run_x04, 'x04.2': run_x04_2, 'x05': run_x05, 'x06': run_x06}
+
+
+def run_flow(flow, page_refs, args, work_dir):
+    """
+    Führt einen Ablauf mit frischem Fake-Server und kaltem Render-Cache aus.
+
+    Returns:
+        dict: Eine Berichtszeile (Seiten/s, Fehler, Anfragen, ms pro Seite je Schritt).
+    """
+    flow_dir = os.path.join(work_dir, flow)
+    configure_render_cache(os.path.join(flow_dir, 'render_cache'))
+    timings = StageTimings()
+    server = MockModelServer(latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    with server, ResultJournal(os.path.join(flow_dir, 'results.journal.jsonl')) as journal:
+        started = time.perf_counter()
+        results, engine_stats = FLOW_FUNCTIONS[flow](page_refs, server, args, timings, journal)
+        seconds = time.perf_counter() - started
+
+    n_pages = len(page_refs)
+    stages = timings.as_dict()
+    row = {
+        'ablauf': flow, 'latenz': args.latency, 'fehlerquote': args.error_rate,
+        'nebenlaeufig': args.concurrency, 'dpi': args.dpi, 'seiten': n_pages, 'sekunden': round(seconds, 2),
+        'seiten_pro_s': round(n_pages / seconds, 2) if seconds > 0 else float('nan'),
+        'fehler': sum(1 for result in results.values() if result.get("error")),
+        'anfragen': server.request_count,
+        'wiederholungen': sum(getattr(stats, 'retries', 0) for stats in engine_stats),
+    }
+    for stage in STAGES:
+        # ms pro Seite (nicht pro Aufruf), damit Abläufe mit Batches vergleichbar bleiben
+        row[f'{stage}_ms'] = round(stages[stage]['seconds'] / n_pages * 1000, 2) if stage in stages else 0.0
+    return row
+
+
+def compare_to_baseline(report, baseline, tolerance=TOLERANCE):
+    """
+    Vergleicht den Bericht mit einer früheren Messung.
+
+    Returns:
+        list: Beschreibungen der Regressionen (leer = keine).
+    """
+    regressions = []
+    baseline = baseline.set_index('ablauf')
+    for _, row in report.iterrows():
+        if row['ablauf'] not in baseline.index:
+            continue
+        before = baseline.loc[row['ablauf']]
+        changed = [column for column in SETTING_COLUMNS if column in before and before[column] != row[column]]
+        if changed:
+            regressions.append(f"{row['ablauf']}: nicht vergleichbar, andere Einstellungen ({', '.join(changed)})")
+            continue
+        if row['seiten_pro_s'] < before['seiten_pro_s'] * (1 - tolerance):
+            regressions.append(f"{row['ablauf']}: {row['seiten_pro_s']} statt {before['seiten_pro_s']} Seiten/s")
+        for stage in STAGES:
+            column = f'{stage}_ms'
+            # Sehr kleine Schrittzeiten schwanken stark und werden nicht bewertet
+            if column in before and before[column] >= 1.0 and row[column] > before[column] * (1 + tolerance):
+                regressions.append(f"{row['ablauf']}: {stage} {row[column]} statt {before[column]} ms/Seite")
+    return regressions
+
+
+def main(argv=None):
+    parser = make_parser("Durchsatz-Benchmark der Annotations-Pipelines gegen einen lokalen Fake-Server")
+    parser.add_argument('--flows', default=','.join(FLOWS), help=f"Abläufe, kommagetrennt (Standard: {','.join(FLOWS)})")
+    parser.add_argument('--pages', type=positive_int, default=120, help="Seiten im synthetischen Korpus")
+    parser.add_argument('--latency', type=float, default=0.05, help="Antwortzeit des Fake-Servers in Sekunden")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Anteil eingestreuter HTTP-500-Fehler")
+    parser.add_argument('--rpm', type=int, default=None, help="RPM-Limit des Gemini-Ablaufs (x06)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Gleichzeitige Anfragen")
+    parser.add_argument('--dpi', type=int, default=96, help="Render-Auflösung")
+    parser.add_argument('--ollama-client', action='store_true', help="x05 über ollama.Client statt HTTP")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=None, help="Ordner für Korpus, Caches und Journale (Standard: temporär)")
+    parser.add_argument('--output', default=None, help="Bericht als CSV speichern (z.B. als spätere Baseline)")
+    parser.add_argument('--baseline', default=None, help="Früherer Bericht; Regressionen führen zu Exit-Code 1")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="Erlaubte Abweichung zur Baseline")
+    args = parser.parse_args(argv)
+
+    flows = [flow.strip() for flow in args.flows.split(',') if flow.strip()]
+    unknown = [flow for flow in flows if flow not in FLOW_FUNCTIONS]
+    if unknown:
+        print(f"FEHLER: Unbekannte Abläufe {unknown}, erwartet: {', '.join(FLOWS)}")
+        return 1
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        corpus_dir = os.path.join(work_dir, 'corpus')
+        os.makedirs(corpus_dir, exist_ok=True)
+        page_refs = make_synthetic_corpus(corpus_dir, args.pages, seed=args.seed)
+        if not page_refs:
+            print("FEHLER: Der synthetische Korpus enthält keine Seiten.")
+            return 1
+        print(f"Synthetischer Korpus: {len(page_refs)} Seiten ({page_label(page_refs[0])} ...)")
+
+        rows = []
+        for flow in flows:
+            print(f"-> Ablauf {flow} ...")
+            rows.append(run_flow(flow, page_refs, args, work_dir))
+        report = pd.DataFrame(rows)
+
+    print("\nErgebnis (Schrittzeiten in ms pro Seite):\n" + report.to_string(index=False))
+    if args.output:
+        report.to_csv(args.output, index=False)
+        print(f"Bericht gespeichert in: {args.output}")
+    if args.baseline:
+        regressions = compare_to_baseline(report, pd.read_csv(args.baseline), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONEN gegenüber der Baseline:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nKeine Regression gegenüber der Baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
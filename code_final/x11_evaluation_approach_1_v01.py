@@ -1,7 +1,11 @@
+import os
+
 import pandas as pd
 from sklearn.metrics import cohen_kappa_score, classification_report, f1_score
 import warnings
 
+from x00_evaluation import evaluate_models
+
 # Deaktiviert Warnungen, die bei Klassen ohne Vorhersagen auftreten können
 warnings.filterwarnings('ignore', category=UserWarning)
 
@@ -85,35 +89,31 @@ def evaluate_model_from_csv(filepath: str, model_name: str):
     return pd.DataFrame(results)
 
 # --- Skript ausführen ---
-qwen_file = 'annotations_old/old_but_with_hybrid_results/subset_1_anno_v07_qwen2.5vl:3b.csv'
-llava_file = 'annotations_old/old_but_with_hybrid_results/subsets_1and2combined_qwen3:4b_x_llava:7b.csv'
-
-# Modelle evaluieren
-results_qwen = evaluate_model_from_csv(qwen_file, "Qwen 2.5VL")
-results_llava = evaluate_model_from_csv(llava_file, "LLaVA 7b")
-
-# --- Ergebnisse zusammenfassen ---
-if not results_qwen.empty and not results_llava.empty:
-    # Führe die Ergebnisse zusammen, um einen direkten Vergleich zu ermöglichen
-    summary_df = pd.merge(
-        results_qwen,
-        results_llava,
-        on='variable',
-        suffixes=('_qwen', '_llava')
-    )
-    
-    # Umbenennen der Spalten für bessere Lesbarkeit
-    summary_df.rename(columns={
-        'cohen_kappa_qwen': 'κ (Qwen)',
-        'f1_macro_qwen': 'F1-Macro (Qwen)',
-        'cohen_kappa_llava': 'κ (LLaVA)',
-        'f1_macro_llava': 'F1-Macro (LLaVA)'
-    }, inplace=True)
-
-    print("\n" + "=" * 80)
-    print("VERGLEICHENDE ZUSAMMENFASSUNG DER MODELLE")
-    print("=" * 80)
-    # Ausgabe als String für eine saubere Formatierung
-    print(summary_df[['variable', 'κ (Qwen)', 'κ (LLaVA)', 'F1-Macro (Qwen)', 'F1-Macro (LLaVA)']].to_string(index=False))
-else:
-    print("\nKonnte keine vergleichende Zusammenfassung erstellen, da die Ergebnisse für ein oder beide Modelle leer sind.")
\ No newline at end of file
+# Beliebig viele Modelle: Anzeigename -> Ergebnisdatei mit 'variable'- und 'variable_hum'-Spalten
+MODEL_FILES = {
+    "Qwen 2.5VL": 'annotations_old/old_but_with_hybrid_results/subset_1_anno_v07_qwen2.5vl:3b.csv',
+    "LLaVA 7b": 'annotations_old/old_but_with_hybrid_results/subsets_1and2combined_qwen3:4b_x_llava:7b.csv',
+}
+# Nur Seiten werten, die alle Modelle annotiert haben (gleiche Grundlage für den Vergleich)
+COMMON_PAGES_ONLY = False
+
+if __name__ == '__main__':
+    # Detaillierte Reports pro Modell
+    for model_name, filepath in MODEL_FILES.items():
+        evaluate_model_from_csv(filepath, model_name)
+
+    # --- Ergebnisse zusammenfassen ---
+    # Alle Modelle einmal über die Seiten-ID am gemeinsamen Goldstandard (_hum) ausrichten
+    if all(os.path.exists(path) for path in MODEL_FILES.values()):
+        summary_df = evaluate_models(MODEL_FILES, gold_suffix='_hum', missing_codes=(),
+                                     metric_variables=[], common_only=COMMON_PAGES_ONLY)
+        summary_df = summary_df[summary_df['n'] > 0]
+
+        print("\n" + "=" * 80)
+        print("VERGLEICHENDE ZUSAMMENFASSUNG DER MODELLE")
+        print("=" * 80)
+        # Ausgabe als String für eine saubere Formatierung
+        print(summary_df[['variable', 'model', 'n', 'cohen_kappa', 'f1_macro']]
+              .sort_values(['variable', 'model']).to_string(index=False))
+    else:
+        print("\nKonnte keine vergleichende Zusammenfassung erstellen, da Ergebnisdateien fehlen.")
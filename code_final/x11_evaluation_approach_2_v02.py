@@ -1,75 +1,81 @@
+import os
+
 import pandas as pd
-import numpy as np
-from sklearn.metrics import cohen_kappa_score, f1_score, mean_absolute_error, mean_squared_error
-import warnings
+
+from x00_bootstrap import bootstrap_evaluation, paired_model_tests
+from x00_evaluation import evaluate_models
 
 
 
 # ANGEPASST: MAE und RMSE für prod_pp und prod_alc
+# ANGEPASST: beliebig viele Modelle, über die Seiten-ID am Goldstandard ausgerichtet (x00_evaluation)
+# ANGEPASST: Bootstrap-Konfidenzintervalle und gepaarte Modellvergleiche (x00_bootstrap)
 
+# Anzahl Bootstrap-Replikate bzw. Permutationen (0 = nur Punktschätzer)
+BOOTSTRAP_REPLICATES = 10000
+# Prozesse für die Replikate (1 = ohne Pool)
+BOOTSTRAP_WORKERS = 1
 
 
-def evaluate_predictions(file_path):
-    try:
-        df = pd.read_csv(file_path)
-    except FileNotFoundError:
-        print(f"Fehler: Die Datei unter '{file_path}' wurde nicht gefunden.")
-        return
 
-    warnings.filterwarnings('ignore', category=UserWarning)
+def evaluate_predictions(model_files, gold_file=None, n_boot=BOOTSTRAP_REPLICATES):
+    """
+    Wertet alle Modelle gegen den Goldstandard aus und gibt eine Vergleichstabelle zurück.
 
-    # Identifizieren aller Variablen, die einen Goldstandard haben
-    base_variables = [col for col in df.columns if f"{col}_gold" in df.columns]
-    
-    # Definieren, welche Variablen metrisch sind
-    metric_variables = ['prod_pp', 'prod_alc']
+    Args:
+        model_files (dict): Modellname -> Ergebnis-CSV.
+        gold_file (str, optional): CSV mit '_gold'-Spalten; None = Goldspalten der Ergebnisdateien.
+        n_boot (int): Bootstrap-Replikate für Konfidenzintervalle und Modellvergleiche (0 = keine).
+
+    Returns:
+        pd.DataFrame | None: Eine Zeile pro (Modell, Variable), siehe evaluate_models().
+    """
+    for file_path in list(model_files.values()) + ([gold_file] if gold_file else []):
+        if not os.path.exists(file_path):
+            print(f"Fehler: Die Datei unter '{file_path}' wurde nicht gefunden.")
+            return None
 
     print("--- Start der systematischen Evaluation ---")
-    
-    for var in base_variables:
-        gold_col = f"{var}_gold"
-        pred_col = var
-        
-        # Temporären DataFrame erstellen und Filtern der speziellen Werte 98.0 und 99.0
-        temp_df = df[[gold_col, pred_col]].copy()
-        original_count = len(temp_df)
-        filtered_df = temp_df[~temp_df[gold_col].isin([98.0, 99.0])]
-        filtered_count = len(filtered_df)
-        
-        y_true = filtered_df[gold_col]
-        y_pred = filtered_df[pred_col]
-
-        if y_true.empty:
-            print(f"\nVariable: '{var}'")
+    results = evaluate_models(model_files, gold=gold_file)
+
+    for row in results.itertuples(index=False):
+        print(f"\nModell: '{row.model}', Variable: '{row.variable}'")
+        if row.n == 0:
             print("  -> Keine gültigen Daten für die Auswertung nach dem Filtern.")
             continue
-
-        print(f"\nVariable: '{var}'")
-        print(f"  Anzahl der ausgewerteten Zeilen: {filtered_count} (von {original_count})")
+        print(f"  Anzahl der ausgewerteten Zeilen: {row.n}")
 
         # UNTERSCHEIDUNG: Metrisch oder Kategorial?
-        if var in metric_variables:
-            # --- Auswertung für metrische Daten (Regression) ---
-            mae = mean_absolute_error(y_true, y_pred)
-            rmse = np.sqrt(mean_squared_error(y_true, y_pred))
-            
+        if row.typ == 'metrisch':
             print(f"  Typ: Metrisch (Regression)")
-            print(f"  MAE (Mean Absolute Error):    {mae:.4f}")
-            print(f"  RMSE (Root Mean Squared Error): {rmse:.4f}")
-            
+            print(f"  MAE (Mean Absolute Error):    {row.mae:.4f}")
+            print(f"  RMSE (Root Mean Squared Error): {row.rmse:.4f}")
         else:
-            # --- Auswertung für kategoriale Daten (Klassifikation) ---
-            # Für Kappa und F1 ist es sicherer, sicherzustellen, dass die Daten 
-            # als Kategorien behandelt werden, auch wenn sie als 0.0/1.0 gespeichert sind.
-            kappa = cohen_kappa_score(y_true, y_pred)
-            f1 = f1_score(y_true, y_pred, average='weighted', zero_division=0)
-            
             print(f"  Typ: Kategorial (Klassifikation)")
-            print(f"  Cohen's Kappa:     {kappa:.4f}")
-            print(f"  Weighted F1-Score: {f1:.4f}")
+            print(f"  Cohen's Kappa:     {row.cohen_kappa:.4f}")
+            print(f"  Weighted F1-Score: {row.f1_weighted:.4f}")
+
+    print("\n--- Vergleichstabelle ---")
+    with pd.option_context('display.float_format', '{:.4f}'.format):
+        print(results[results['n'] > 0].drop(columns=['f1_macro', 'accuracy']).to_string(index=False))
+    if n_boot:
+        intervals = bootstrap_evaluation(model_files, gold=gold_file, n_boot=n_boot, max_workers=BOOTSTRAP_WORKERS)
+        print(f"\n--- 95%-Bootstrap-Intervalle ({n_boot} Replikate) ---")
+        with pd.option_context('display.float_format', '{:.4f}'.format):
+            print(intervals.to_string(index=False))
+
+        if len(model_files) > 1:
+            tests = paired_model_tests(model_files, gold=gold_file, n_boot=n_boot, n_perm=n_boot,
+                                       max_workers=BOOTSTRAP_WORKERS)
+            print("\n--- Gepaarte Modellvergleiche (Differenz A - B, Permutationstest) ---")
+            with pd.option_context('display.float_format', '{:.4f}'.format):
+                print(tests.to_string(index=False))
 
     print("\n--- Evaluation abgeschlossen ---")
+    return results
 
 if __name__ == "__main__":
-    csv_file_path = 'annotations_colab/subsets_123_combined_annotated_llama3.2:11b.csv'
-    evaluate_predictions(csv_file_path)
\ No newline at end of file
+    model_files = {
+        'llama3.2:11b': 'annotations_colab/subsets_123_combined_annotated_llama3.2:11b.csv',
+    }
+    evaluate_predictions(model_files)
@@ -7,6 +7,10 @@ import seaborn as sns
 import glob
 import os
 import numpy as np
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from x00_figure_report import FigureJob, render_figures
 
 # --- Konfiguration ---
 CSV_FOLDER_PATH = 'annotations_api_gemini_2.0_flash'
@@ -34,47 +38,126 @@ COUNTRY_MAP = {
     'est': 'Estland'
 }
 
-def load_and_prepare_data(folder_path):
+# Analyse 2: Kinderprodukte im Umkreis von so vielen Seiten zählen als "benachbart"
+PROXIMITY_WINDOW = 1
+# Analyse 2: Laufzeit der vektorisierten Zählung mit der alten Schleife vergleichen (Faktor = Vervielfachung der Daten)
+BENCHMARK_PROXIMITY = False
+BENCHMARK_SCALE = 10
+# Grafiken: Auflösung, parallele Prozesse (None = alle Kerne) und Neuzeichnen trotz unveränderter Tabellen
+FIGURE_DPI = 300
+FIGURE_WORKERS = None
+FORCE_REDRAW = False
+
+# Einlesen: nur diese Spalten (plus '<spalte>_gold') mit festen Datentypen
+CORE_COLS = ['country', 'supermarket', 'page_number', 'original_pdf_path']
+DATA_COLS = ['alc', 'product', 'warning', 'reduc', 'child', 'prod_pp', 'prod_alc']
+READ_COLS = set(CORE_COLS + DATA_COLS + [f"{col}_gold" for col in DATA_COLS])
+CORE_DTYPES = {'country': str, 'supermarket': str, 'page_number': 'float64', 'original_pdf_path': str}
+READ_DTYPES = {**CORE_DTYPES, **{col: 'float64' for col in READ_COLS - set(CORE_COLS)}}
+LOAD_WORKERS = 8
+# Zusammengeführte Rohdaten als Pickle zwischenspeichern (None = ohne Cache)
+LOAD_CACHE_FOLDER = 'analysis_cache'
+
+def _files_fingerprint(files):
+    """Hash über Pfad, Größe und Änderungszeit aller CSV-Dateien, die gelesenen Spalten und die pandas-Version."""
+    digest = hashlib.sha256(repr((CORE_COLS, DATA_COLS, pd.__version__)).encode('utf-8'))
+    for file in sorted(files):
+        stat = os.stat(file)
+        digest.update(f"{os.path.abspath(file)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def _read_annotation_csv(file):
+    """
+    Liest nur die Kern-, Daten- und '_gold'-Spalten einer CSV mit festen Datentypen.
+
+    Returns:
+        tuple: (DataFrame oder None, Fehlermeldung oder None).
     """
-    Lädt alle CSV-Dateien robust, indem jede Datei einzeln verarbeitet wird,
-    um Unterschiede in der Spaltenstruktur zu bewältigen.
-    Wählt intelligent zwischen 'gold'- und Standardspalten und führt alles zusammen.
+    try:
+        try:
+            temp_df = pd.read_csv(file, usecols=lambda col: col in READ_COLS, dtype=READ_DTYPES)
+        except ValueError:
+            # Nicht-numerische Einträge in Datenspalten: ohne Typvorgabe lesen, Umwandlung folgt später
+            temp_df = pd.read_csv(file, usecols=lambda col: col in READ_COLS, dtype=CORE_DTYPES)
+        missing = [col for col in CORE_COLS if col not in temp_df.columns]
+        if missing:
+            return None, f"fehlende Spalten {missing}"
+        return temp_df, None
+    except Exception as e:
+        return None, e
+
+def load_annotations(folder_path, max_workers=LOAD_WORKERS, cache_folder=LOAD_CACHE_FOLDER):
+    """
+    Lädt alle CSV-Dateien eines Ordners parallel und führt sie zu einem DataFrame
+    mit CORE_COLS und DATA_COLS zusammen. Pro Datei gilt: Gibt es eine
+    '_gold'-Spalte, ersetzt sie die Modellspalte vollständig.
+
+    Das Ergebnis wird als Pickle unter cache_folder abgelegt (Schlüssel aus
+    Pfaden, Größen und Änderungszeiten der CSVs) und beim nächsten Lauf direkt
+    gelesen, solange sich keine Datei geändert hat.
+
+    Args:
+        folder_path (str): Ordner mit den Annotations-CSVs.
+        max_workers (int, optional): Threads zum Lesen.
+        cache_folder (str, optional): Ordner des Caches (None = ohne Cache).
+
+    Returns:
+        pd.DataFrame | None: Zusammengeführte Rohdaten oder None, wenn nichts gelesen werden konnte.
     """
-    if not os.path.exists(folder_path):
-        print(f"Fehler: Der Ordner '{folder_path}' wurde nicht gefunden.")
-        return None
-    
     all_files = glob.glob(os.path.join(folder_path, "*.csv"))
     if not all_files:
         print(f"Fehler: Keine CSV-Dateien im Ordner '{folder_path}' gefunden.")
         return None
 
-    clean_dfs = []
-    CORE_COLS = ['country', 'supermarket', 'page_number', 'original_pdf_path']
-    DATA_COLS = ['alc', 'product', 'warning', 'reduc', 'child', 'prod_pp', 'prod_alc']
+    cache_path = None
+    if cache_folder:
+        cache_path = os.path.join(cache_folder, f"annotations_{_files_fingerprint(all_files)}.pkl")
+        if os.path.exists(cache_path):
+            print(f"Lade zusammengeführte Annotationen aus dem Cache '{cache_path}'.")
+            return pd.read_pickle(cache_path)
 
-    for file in all_files:
-        try:
-            temp_df = pd.read_csv(file)
-            if temp_df.empty: continue
-            clean_df = temp_df[CORE_COLS].copy()
-            for col in DATA_COLS:
-                gold_col = f"{col}_gold"
-                if gold_col in temp_df.columns:
-                    clean_df[col] = temp_df[gold_col]
-                elif col in temp_df.columns:
-                    clean_df[col] = temp_df[col]
-                else:
-                    clean_df[col] = np.nan 
-            clean_dfs.append(clean_df)
-        except Exception as e:
-            print(f"Warnung: Konnte Datei {os.path.basename(file)} nicht verarbeiten. Fehler: {e}")
-
-    if not clean_dfs:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_read_annotation_csv, all_files))
+
+    frames = []
+    for file, (temp_df, error) in zip(all_files, results):
+        if error is not None:
+            print(f"Warnung: Konnte Datei {os.path.basename(file)} nicht verarbeiten. Fehler: {error}")
+        elif not temp_df.empty:
+            frames.append(temp_df)
+    if not frames:
+        return None
+
+    # Pro Zeile und Variable: Hat die Quelldatei eine '_gold'-Spalte?
+    has_gold = np.array([[f"{col}_gold" in frame.columns for col in DATA_COLS] for frame in frames])
+    row_has_gold = np.repeat(has_gold, [len(frame) for frame in frames], axis=0)
+    gold_cols = [f"{col}_gold" for col in DATA_COLS]
+    merged = pd.concat(frames, ignore_index=True).reindex(columns=CORE_COLS + DATA_COLS + gold_cols)
+    values = np.where(row_has_gold, merged[gold_cols].to_numpy(dtype=object), merged[DATA_COLS].to_numpy(dtype=object))
+    df = pd.concat([merged[CORE_COLS], pd.DataFrame(values, columns=DATA_COLS).infer_objects()], axis=1)
+
+    if cache_path:
+        os.makedirs(cache_folder, exist_ok=True)
+        for old_cache in glob.glob(os.path.join(cache_folder, "annotations_*.pkl")):
+            os.remove(old_cache)
+        df.to_pickle(f"{cache_path}.tmp")
+        os.replace(f"{cache_path}.tmp", cache_path)
+    return df
+
+def load_and_prepare_data(folder_path):
+    """
+    Lädt alle CSV-Dateien (siehe load_annotations), entfernt die Codes 98/99
+    für fehlende Werte und ergänzt lesbare Länder- und Produktnamen.
+    """
+    if not os.path.exists(folder_path):
+        print(f"Fehler: Der Ordner '{folder_path}' wurde nicht gefunden.")
+        return None
+
+    df = load_annotations(folder_path)
+    if df is None:
         print("Fehler: Es konnten keine Daten aus den CSV-Dateien geladen werden.")
         return None
 
-    df = pd.concat(clean_dfs, ignore_index=True)
     df.replace([98, 99], np.nan, inplace=True)
     df.dropna(subset=['alc', 'prod_pp', 'child'], inplace=True)
     for col in DATA_COLS:
@@ -97,7 +180,9 @@ def analyze_alcohol_share_by_country(df):
     if 'Mit Alkohol' not in country_share.columns: country_share['Mit Alkohol'] = 0
     country_share['Mit Alkohol'] *= 100
     print(country_share[['Mit Alkohol']].sort_values(by='Mit Alkohol', ascending=False))
+    return [FigureJob('1_anteil_alkohol_pro_land.png', plot_alcohol_share, country_share[['Mit Alkohol']])]
 
+def plot_alcohol_share(country_share, path):
     plt.figure(figsize=(12, 8))
     sns.barplot(x=country_share.index, y=country_share['Mit Alkohol'], hue=country_share.index, palette='viridis', legend=False)
     plt.title('Prozentualer Anteil der Prospektseiten mit Alkoholwerbung', fontsize=TITLE_FONT_SIZE)
@@ -106,16 +191,13 @@ def analyze_alcohol_share_by_country(df):
     plt.xticks(rotation=45, fontsize=TICK_FONT_SIZE)
     plt.yticks(fontsize=TICK_FONT_SIZE)
     plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_FOLDER, '1_anteil_alkohol_pro_land.png'), dpi=300)
+    plt.savefig(path, dpi=FIGURE_DPI)
     plt.close()
 
-def analyze_proximity_to_child_products(df):
-    """Analyse 2: Nähe von Alkohol zu Kinderprodukten."""
-    print("\n--- Analyse 2: Nähe von Alkohol zu Kinderprodukten ---")
+def _proximity_counts_loop(df):
+    """Bisherige Zählung per iterrows (nur noch als Referenz für benchmark_proximity)."""
     df_sorted = df.sort_values(by=['original_pdf_path', 'page_number']).reset_index()
     valid_countries = df['country_name'].dropna().unique()
-    if len(valid_countries) == 0: return
-
     proximity_counts = {country: {'same_page': 0, 'adjacent_page': 0, 'total_alc_pages': 0} for country in valid_countries}
     for index, row in df_sorted.iterrows():
         if row['alc'] == 1 and pd.notna(row['country_name']):
@@ -128,33 +210,110 @@ def analyze_proximity_to_child_products(df):
             if not is_adjacent and index < len(df_sorted) - 1 and df_sorted.loc[index + 1, 'original_pdf_path'] == row['original_pdf_path'] and df_sorted.loc[index + 1, 'child'] == 1:
                 is_adjacent = True
             if is_adjacent: proximity_counts[country]['adjacent_page'] += 1
+    return pd.DataFrame(proximity_counts).T
+
+def proximity_counts(df, window=PROXIMITY_WINDOW):
+    """
+    Zählt pro Land die Alkoholseiten sowie jene mit Kinderprodukten auf
+    derselben Seite bzw. auf einer der window vorherigen oder folgenden Seiten
+    desselben Prospekts.
+
+    Nachbarn sind die benachbarten Zeilen nach Sortierung über
+    (original_pdf_path, page_number) innerhalb eines PDFs, wie in der
+    bisherigen Schleife; mit window=1 sind die Zählungen identisch.
+
+    Returns:
+        pd.DataFrame: Spalten same_page, adjacent_page, total_alc_pages, ein Land pro Zeile.
+    """
+    df_sorted = df.sort_values(by=['original_pdf_path', 'page_number']).reset_index(drop=True)
+    child = df_sorted['child'].eq(1)
+    by_pdf = child.astype(int).groupby(df_sorted['original_pdf_path'], sort=False)
+    adjacent = pd.Series(False, index=df_sorted.index)
+    for offset in range(1, window + 1):
+        # shift() bleibt innerhalb eines PDFs; Zeilen ohne Nachbarn werden NaN und zählen nicht
+        adjacent |= by_pdf.shift(offset).eq(1) | by_pdf.shift(-offset).eq(1)
+
+    is_alc = df_sorted['alc'].eq(1) & df_sorted['country_name'].notna()
+    counts = pd.DataFrame({
+        'same_page': child[is_alc].astype(int),
+        'adjacent_page': adjacent[is_alc].astype(int),
+        'total_alc_pages': 1,
+    }).groupby(df_sorted.loc[is_alc, 'country_name']).sum()
+    # Länder ohne Alkoholseiten mit 0 aufführen (wie bisher)
+    return counts.reindex(df['country_name'].dropna().unique(), fill_value=0)
+
+def benchmark_proximity(df, window=1, scale=1, repeats=3):
+    """
+    Vergleicht Laufzeit und Ergebnis von Schleife und vektorisierter Zählung.
+
+    Args:
+        df (pd.DataFrame): Daten aus load_and_prepare_data().
+        window (int): Nachbarschaftsfenster der vektorisierten Zählung (Vergleich nur bei 1 identisch).
+        scale (int): Daten so oft mit eigenen PDF-Pfaden vervielfachen (simuliert mehrere Saisons).
+        repeats (int): Wiederholungen; gemeldet wird die schnellste.
+
+    Returns:
+        dict: Sekunden je Variante, Beschleunigung und ob die Zählungen übereinstimmen.
+    """
+    import time
+    data = pd.concat([df.assign(original_pdf_path=df['original_pdf_path'] + f"#{i}") for i in range(scale)],
+                     ignore_index=True)
+
+    def fastest(function, *args):
+        best = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = function(*args)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
 
-    proximity_df = pd.DataFrame(proximity_counts).T
+    loop_result, loop_seconds = fastest(_proximity_counts_loop, data)
+    vector_result, vector_seconds = fastest(proximity_counts, data, window)
+    columns = ['same_page', 'adjacent_page', 'total_alc_pages']
+    identical = loop_result[columns].astype(int).equals(vector_result[columns].astype(int))
+    summary = {'zeilen': len(data), 'schleife_s': round(loop_seconds, 4), 'vektorisiert_s': round(vector_seconds, 4),
+               'faktor': round(loop_seconds / vector_seconds, 1) if vector_seconds else float('inf'),
+               'identisch': identical}
+    print(f"Benchmark Nähe-Analyse: {summary}")
+    return summary
+
+def analyze_proximity_to_child_products(df, window=PROXIMITY_WINDOW):
+    """Analyse 2: Nähe von Alkohol zu Kinderprodukten."""
+    print("\n--- Analyse 2: Nähe von Alkohol zu Kinderprodukten ---")
+    if len(df['country_name'].dropna().unique()) == 0: return []
+
+    proximity_df = proximity_counts(df, window)
     proximity_df['same_page_perc'] = (proximity_df['same_page'] / proximity_df['total_alc_pages'].replace(0, 1) * 100).fillna(0)
     proximity_df['adjacent_page_perc'] = (proximity_df['adjacent_page'] / proximity_df['total_alc_pages'].replace(0, 1) * 100).fillna(0)
     print(proximity_df[['same_page_perc', 'adjacent_page_perc']].sort_values(by='same_page_perc', ascending=False))
 
     proximity_df_plot = proximity_df[proximity_df['total_alc_pages'] > 0]
-    if not proximity_df_plot.empty:
-        colors = ['#3b5998', '#a9a9a9']
-        ax = proximity_df_plot[['same_page_perc', 'adjacent_page_perc']].plot(
-            kind='bar', stacked=True, figsize=(14, 9), color=colors
-        )
-        ax.set_title('Nähe von Alkohol zu Kinderprodukten pro Land', fontsize=TITLE_FONT_SIZE)
-        ax.set_ylabel('Anteil der Alkoholseiten in %', fontsize=LABEL_FONT_SIZE)
-        ax.set_xlabel('Land', fontsize=LABEL_FONT_SIZE)
-        plt.xticks(rotation=45, fontsize=TICK_FONT_SIZE)
-        plt.yticks(fontsize=TICK_FONT_SIZE)
-        plt.legend(['Auf derselben Seite', 'Auf benachbarter Seite'], fontsize=LEGEND_FONT_SIZE)
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_FOLDER, '2_naehe_zu_kinderprodukten.png'), dpi=300)
-        plt.close()
+    if proximity_df_plot.empty: return []
+    return [FigureJob('2_naehe_zu_kinderprodukten.png', plot_proximity,
+                      proximity_df_plot[['same_page_perc', 'adjacent_page_perc']], {'window': window})]
+
+def plot_proximity(proximity_df_plot, path, window=1):
+    colors = ['#3b5998', '#a9a9a9']
+    ax = proximity_df_plot[['same_page_perc', 'adjacent_page_perc']].plot(
+        kind='bar', stacked=True, figsize=(14, 9), color=colors
+    )
+    ax.set_title('Nähe von Alkohol zu Kinderprodukten pro Land', fontsize=TITLE_FONT_SIZE)
+    ax.set_ylabel('Anteil der Alkoholseiten in %', fontsize=LABEL_FONT_SIZE)
+    ax.set_xlabel('Land', fontsize=LABEL_FONT_SIZE)
+    plt.xticks(rotation=45, fontsize=TICK_FONT_SIZE)
+    plt.yticks(fontsize=TICK_FONT_SIZE)
+    adjacent_label = 'Auf benachbarter Seite' if window == 1 else f'Im Umkreis von {window} Seiten'
+    plt.legend(['Auf derselben Seite', adjacent_label], fontsize=LEGEND_FONT_SIZE)
+    plt.tight_layout()
+    plt.savefig(path, dpi=FIGURE_DPI)
+    plt.close()
 
 def analyze_page_position_heatmap(df):
     """Analyse 3: Heatmap der Platzierung von Alkohol im Prospekt."""
     print("\n--- Analyse 3: Platzierung von Alkohol im Prospekt ---")
     df_alc = df[df['alc'] == 1].copy()
-    if df_alc.empty: return
+    if df_alc.empty: return []
 
     page_counts = df.groupby('original_pdf_path')['page_number'].max()
     df_alc['total_pages'] = df_alc['original_pdf_path'].map(page_counts)
@@ -166,29 +325,46 @@ def analyze_page_position_heatmap(df):
     heatmap_data = df_alc.groupby(['country_name', 'page_bin'], observed=True).size().unstack(fill_value=0)
     heatmap_data_normalized = heatmap_data.div(heatmap_data.sum(axis=1), axis=0).replace(np.nan, 0) * 100
 
-    if not heatmap_data_normalized.empty:
-        plt.figure(figsize=(16, 9))
-        sns.heatmap(heatmap_data_normalized, annot=True, fmt=".1f", cmap='YlGnBu', linewidths=.5, 
-                    annot_kws={"size": TICK_FONT_SIZE}) # Schriftgröße der Zahlen
-        plt.title('Heatmap: Relative Platzierung von Alkoholwerbung im Prospekt', fontsize=TITLE_FONT_SIZE)
-        plt.xlabel('Position im Prospekt (in % der Gesamtlänge)', fontsize=LABEL_FONT_SIZE)
-        plt.ylabel('Land', fontsize=LABEL_FONT_SIZE)
-        plt.xticks(fontsize=TICK_FONT_SIZE)
-        plt.yticks(fontsize=TICK_FONT_SIZE, rotation=0)
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_FOLDER, '3_platzierung_heatmap.png'), dpi=300)
-        plt.close()
+    if heatmap_data_normalized.empty: return []
+    return [FigureJob('3_platzierung_heatmap.png', plot_page_position_heatmap, heatmap_data_normalized)]
+
+def plot_page_position_heatmap(heatmap_data_normalized, path):
+    plt.figure(figsize=(16, 9))
+    sns.heatmap(heatmap_data_normalized, annot=True, fmt=".1f", cmap='YlGnBu', linewidths=.5, 
+                annot_kws={"size": TICK_FONT_SIZE}) # Schriftgröße der Zahlen
+    plt.title('Heatmap: Relative Platzierung von Alkoholwerbung im Prospekt', fontsize=TITLE_FONT_SIZE)
+    plt.xlabel('Position im Prospekt (in % der Gesamtlänge)', fontsize=LABEL_FONT_SIZE)
+    plt.ylabel('Land', fontsize=LABEL_FONT_SIZE)
+    plt.xticks(fontsize=TICK_FONT_SIZE)
+    plt.yticks(fontsize=TICK_FONT_SIZE, rotation=0)
+    plt.tight_layout()
+    plt.savefig(path, dpi=FIGURE_DPI)
+    plt.close()
 
 def analyze_lidl_comparison(df):
-    """Analyse 4: Detaillierter Vergleich von Lidl in verschiedenen Ländern."""
+    """Analyse 4: Lidl im Ländervergleich (Anteil, Alkoholarten, Rabatte)."""
     print("\n--- Analyse 4: Lidl im Ländervergleich ---")
     df_lidl = df[df['supermarket'] == 'lidl'].copy()
-    if df_lidl.empty: return
-        
+    if df_lidl.empty: return []
+
     # --- Plot 1: Anteil der Seiten mit Alkohol ---
     lidl_alc_share = df_lidl.groupby('country_name')['alc'].value_counts(normalize=True).unstack().fillna(0)
     lidl_alc_share['Mit Alkohol'] = lidl_alc_share.get(1.0, 0) * 100
-    
+    jobs = [FigureJob('4_lidl_vergleich_anteil.png', plot_lidl_alcohol_share, lidl_alc_share[['Mit Alkohol']])]
+
+    df_lidl_alc = df_lidl[df_lidl['alc'] == 1]
+    if not df_lidl_alc.empty:
+        # --- Plot 2: Verteilung der Alkoholarten ---
+        lidl_products = df_lidl_alc.groupby('country_name')['product_name'].value_counts(normalize=True).unstack().fillna(0) * 100
+        jobs.append(FigureJob('4_lidl_vergleich_arten.png', plot_lidl_product_types, lidl_products))
+
+        # --- Plot 3: Anteil der Alkoholwerbung mit Rabatt ---
+        lidl_reduc = df_lidl_alc.groupby('country_name')['reduc'].value_counts(normalize=True).unstack().fillna(0)
+        lidl_reduc['Mit Rabatt'] = lidl_reduc.get(1.0, 0) * 100
+        jobs.append(FigureJob('4_lidl_vergleich_rabatte.png', plot_lidl_discounts, lidl_reduc[['Mit Rabatt']]))
+    return jobs
+
+def plot_lidl_alcohol_share(lidl_alc_share, path):
     plt.figure(figsize=(10, 7))
     sns.barplot(x=lidl_alc_share.index, y=lidl_alc_share['Mit Alkohol'], hue=lidl_alc_share.index, palette='Blues', legend=False)
     plt.title('Lidl-Vergleich: Anteil der Prospektseiten mit Alkohol', fontsize=TITLE_FONT_SIZE)
@@ -197,49 +373,44 @@ def analyze_lidl_comparison(df):
     plt.xticks(fontsize=TICK_FONT_SIZE)
     plt.yticks(fontsize=TICK_FONT_SIZE)
     plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_FOLDER, '4_lidl_vergleich_anteil.png'), dpi=300)
+    plt.savefig(path, dpi=FIGURE_DPI)
+    plt.close()
+
+def plot_lidl_product_types(lidl_products, path):
+    ax = lidl_products.plot(kind='bar', stacked=True, figsize=(12, 8), colormap='Spectral')
+    ax.set_title('Lidl-Vergleich: Verteilung der beworbenen Alkoholarten', fontsize=TITLE_FONT_SIZE)
+    ax.set_ylabel('% der Alkoholanzeigen', fontsize=LABEL_FONT_SIZE)
+    ax.set_xlabel('Land', fontsize=LABEL_FONT_SIZE)
+    plt.xticks(rotation=45, fontsize=TICK_FONT_SIZE)
+    plt.yticks(fontsize=TICK_FONT_SIZE)
+    plt.legend(title='Produktart', bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=LEGEND_FONT_SIZE)
+    plt.tight_layout()
+    plt.savefig(path, dpi=FIGURE_DPI)
+    plt.close()
+
+def plot_lidl_discounts(lidl_reduc, path):
+    plt.figure(figsize=(10, 7))
+    sns.barplot(x=lidl_reduc.index, y=lidl_reduc['Mit Rabatt'], hue=lidl_reduc.index, palette='Greens', legend=False)
+    plt.title('Lidl-Vergleich: Anteil der Alkoholwerbung mit Rabatt', fontsize=TITLE_FONT_SIZE)
+    plt.ylabel('% der Alkoholanzeigen', fontsize=LABEL_FONT_SIZE)
+    plt.xlabel('Land', fontsize=LABEL_FONT_SIZE)
+    plt.xticks(fontsize=TICK_FONT_SIZE)
+    plt.yticks(fontsize=TICK_FONT_SIZE)
+    plt.tight_layout()
+    plt.savefig(path, dpi=FIGURE_DPI)
     plt.close()
-    
-    # --- Plot 2: Verteilung der Alkoholarten ---
-    df_lidl_alc = df_lidl[df_lidl['alc'] == 1]
-    if not df_lidl_alc.empty:
-        lidl_products = df_lidl_alc.groupby('country_name')['product_name'].value_counts(normalize=True).unstack().fillna(0) * 100
-        ax = lidl_products.plot(kind='bar', stacked=True, figsize=(12, 8), colormap='Spectral')
-        ax.set_title('Lidl-Vergleich: Verteilung der beworbenen Alkoholarten', fontsize=TITLE_FONT_SIZE)
-        ax.set_ylabel('% der Alkoholanzeigen', fontsize=LABEL_FONT_SIZE)
-        ax.set_xlabel('Land', fontsize=LABEL_FONT_SIZE)
-        plt.xticks(rotation=45, fontsize=TICK_FONT_SIZE)
-        plt.yticks(fontsize=TICK_FONT_SIZE)
-        plt.legend(title='Produktart', bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=LEGEND_FONT_SIZE)
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_FOLDER, '4_lidl_vergleich_arten.png'), dpi=300)
-        plt.close()
-    
-    # --- Plot 3: Anteil der Alkoholwerbung mit Rabatt ---
-    if not df_lidl_alc.empty:
-        lidl_reduc = df_lidl_alc.groupby('country_name')['reduc'].value_counts(normalize=True).unstack().fillna(0)
-        lidl_reduc['Mit Rabatt'] = lidl_reduc.get(1.0, 0) * 100
-        
-        plt.figure(figsize=(10, 7))
-        sns.barplot(x=lidl_reduc.index, y=lidl_reduc['Mit Rabatt'], hue=lidl_reduc.index, palette='Greens', legend=False)
-        plt.title('Lidl-Vergleich: Anteil der Alkoholwerbung mit Rabatt', fontsize=TITLE_FONT_SIZE)
-        plt.ylabel('% der Alkoholanzeigen', fontsize=LABEL_FONT_SIZE)
-        plt.xlabel('Land', fontsize=LABEL_FONT_SIZE)
-        plt.xticks(fontsize=TICK_FONT_SIZE)
-        plt.yticks(fontsize=TICK_FONT_SIZE)
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_FOLDER, '4_lidl_vergleich_rabatte.png'), dpi=300)
-        plt.close()
 
 def analyze_product_types_by_country(df):
     """Analyse 5: Verteilung der beworbenen Alkoholarten pro Land."""
     print("\n--- Analyse 5: Alkoholarten pro Land ---")
     df_alc = df[(df['alc'] == 1) & (df['product_name'].notna())].copy()
-    if df_alc.empty: return
+    if df_alc.empty: return []
 
     product_distribution = df_alc.groupby('country_name')['product_name'].value_counts(normalize=True).unstack().fillna(0) * 100
     print(product_distribution)
+    return [FigureJob('5_alkoholarten_pro_land.png', plot_product_types, product_distribution)]
 
+def plot_product_types(product_distribution, path):
     ax = product_distribution.plot(
         kind='bar', stacked=True, figsize=(14, 9), colormap='tab20b'
     )
@@ -250,22 +421,33 @@ def analyze_product_types_by_country(df):
     plt.yticks(fontsize=TICK_FONT_SIZE)
     plt.legend(title='Produktart', bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=LEGEND_FONT_SIZE)
     plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_FOLDER, '5_alkoholarten_pro_land.png'), dpi=300)
+    plt.savefig(path, dpi=FIGURE_DPI)
     plt.close()
 
+def build_figure_jobs(df):
+    """Berechnet alle Aggregat-Tabellen einmal und liefert die zugehörigen Grafiken als FigureJob-Liste."""
+    jobs = []
+    jobs += analyze_alcohol_share_by_country(df)
+    jobs += analyze_proximity_to_child_products(df)
+    if BENCHMARK_PROXIMITY:
+        benchmark_proximity(df, scale=BENCHMARK_SCALE)
+    jobs += analyze_page_position_heatmap(df)
+    jobs += analyze_lidl_comparison(df)
+    jobs += analyze_product_types_by_country(df)
+    return jobs
+
 def main():
     """Hauptfunktion zur Ausführung der Analyse."""
     if not os.path.exists(OUTPUT_FOLDER): os.makedirs(OUTPUT_FOLDER)
     df = load_and_prepare_data(CSV_FOLDER_PATH)
     if df is not None and not df.empty:
-        analyze_alcohol_share_by_country(df)
-        analyze_proximity_to_child_products(df)
-        analyze_page_position_heatmap(df)
-        analyze_lidl_comparison(df)
-        analyze_product_types_by_country(df)
+        jobs = build_figure_jobs(df)
+        # Schriftgrößen und DPI stecken im Hash, damit eine Änderung alle Grafiken neu zeichnet
+        render_figures(jobs, OUTPUT_FOLDER, max_workers=FIGURE_WORKERS, force=FORCE_REDRAW,
+                       salt=(BASE_FONT_SIZE, TITLE_FONT_SIZE, LABEL_FONT_SIZE, TICK_FONT_SIZE, LEGEND_FONT_SIZE, FIGURE_DPI))
         print(f"\nAnalyse abgeschlossen. Alle Grafiken wurden im Ordner '{OUTPUT_FOLDER}' gespeichert.")
     else:
         print("Daten konnten nicht geladen werden oder der DataFrame ist leer. Analyse wird abgebrochen.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()